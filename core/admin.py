@@ -511,6 +511,61 @@ class DeclarationAdmin(admin.ModelAdmin):
     )
 
 
+
+# ------- TEAM OUTPUT COUNTER -------
+@admin.register(TeamOutputCounter)
+class TeamOutputCounterAdmin(admin.ModelAdmin):
+    """
+    Read-only view of the dashboard counters (maintained from declarations,
+    fixed with the reconcile_output_counters command).
+    """
+    list_display = ("id", "date", "team_user", "operator", "routing_operation", "qty")
+    list_filter = ("date", "team_user")
+    search_fields = ("team_user__username", "operator__badge_num", "operator__name")
+    ordering = ("-date", "team_user__username")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+# ------- PRO OPERATION COUNTER (WIP) -------
+@admin.register(ProOperationCounter)
+class ProOperationCounterAdmin(admin.ModelAdmin):
+    """
+    Read-only view of the PRO WIP counters (maintained from declarations,
+    fixed with the reconcile_wip_counters command).
+    """
+    list_display = ("id", "pro", "routing_operation", "qty", "updated_at")
+    search_fields = ("pro__pro_name", "pro__sku")
+    list_select_related = ("pro", "routing_operation__operation")
+    ordering = ("pro__pro_name", "routing_operation_id")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+# ------- INTEGRITY ISSUE -------
+@admin.register(IntegrityIssue)
+class IntegrityIssueAdmin(admin.ModelAdmin):
+    """
+    Read-only list of the issues written by the scan_integrity command.
+    """
+    list_display = ("id", "kind", "day", "detail", "first_seen_at", "last_seen_at", "resolved_at")
+    list_filter = ("kind", ("resolved_at", admin.EmptyFieldListFilter))
+    search_fields = ("detail", "key")
+    ordering = ("-day", "kind", "id")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
 # ------- BREAK -------
 @admin.register(Break)
 class BreakAdmin(admin.ModelAdmin):
@@ -0,0 +1,195 @@
+# core/attendance.py
+"""
+Attendance per operator and day from LoginOperator sessions.
+
+An operator can have several sessions per day (different teams, re-login,
+manual edits) and they may overlap. Adding up session lengths counts the
+overlapping part twice, so sessions are merged into presence intervals:
+
+  net presence = length of the union of the session intervals
+  overlap      = sum of session lengths - net presence
+  gaps         = time between the merged intervals (first in -> last out)
+
+All sessions of the range come from one query, ordered by operator, login
+date and login time in the database (the only sort). Rows are read with
+iterator() and each (operator, login date) group is merged with a single
+sweep as soon as it is complete, so memory is bound by one group and the
+result can be streamed straight into an export.
+
+A session belongs to its login date; logoff on a later logoff_team_date
+ends on that day (night shift). Sessions with logoff <= login are reported
+as invalid, sessions without logoff as open. When `now` is given, an open
+session that is still running is counted up to `now`: a session of today,
+or of yesterday when its team's calendar shift is a night shift that has
+not ended yet. Older open sessions (never logged off) are only reported
+as open, not counted as presence.
+"""
+from datetime import datetime, timedelta
+from itertools import groupby
+
+from core.models import LoginOperator
+from core.shifts import get_shift
+
+
+ATTENDANCE_STATUSES = ["ACTIVE", "COMPLETED"]
+CHUNK_SIZE = 2000
+
+EXPORT_HEADER = [
+    "Date", "Badge", "Operator", "Teams", "Sessions", "First in", "Last out",
+    "Presence (min)", "Gross (min)", "Overlap (min)", "Gaps (min)", "Gap count",
+    "Intervals", "Open sessions", "Invalid sessions",
+]
+
+FIELDS = (
+    "id", "operator_id", "operator__badge_num", "operator__name", "team_user_id", "team_user__username",
+    "login_team_date", "login_team_time", "logoff_team_date", "logoff_team_time",
+)
+
+
+def session_queryset(date_from, date_to, team_user=None, operator=None):
+    """
+    Sessions of the range in sweep order. With `team_user`, all sessions of
+    the operators that worked in that team (other teams included, so
+    cross-team overlaps are still found).
+    """
+    qs = LoginOperator.objects.filter(
+        login_team_date__gte=date_from,
+        login_team_date__lte=date_to,
+        status__in=ATTENDANCE_STATUSES,
+    )
+    if operator:
+        qs = qs.filter(operator=operator)
+    if team_user:
+        qs = qs.filter(operator_id__in=(
+            LoginOperator.objects
+            .filter(
+                login_team_date__gte=date_from,
+                login_team_date__lte=date_to,
+                status__in=ATTENDANCE_STATUSES,
+                team_user=team_user,
+            )
+            .values("operator_id")
+        ))
+    return qs.order_by("operator_id", "login_team_date", "login_team_time", "id").values(*FIELDS)
+
+
+def _still_running(session, now):
+    """
+    Open session that can still be in progress at `now`: logged in today,
+    or yesterday in a night shift (calendar shift_end <= shift_start) that
+    has not ended yet.
+    """
+    day = session["login_team_date"]
+    if day == now.date():
+        return True
+    if day != now.date() - timedelta(days=1):
+        return False
+    shift = get_shift(session["team_user_id"], day)
+    return shift is not None and shift.shift_end <= shift.shift_start and now.time() < shift.shift_end
+
+
+def _interval(session, now=None):
+    """
+    (start, end) as naive datetimes; end None = open session, end <= start = invalid.
+    Only an open session that is still running (_still_running) runs up to `now`.
+    """
+    start = datetime.combine(session["login_team_date"], session["login_team_time"])
+    if session["logoff_team_time"] is None:
+        if now is not None and now > start and _still_running(session, now):
+            return start, now
+        return start, None
+    end = datetime.combine(session["logoff_team_date"] or session["login_team_date"], session["logoff_team_time"])
+    return start, end
+
+
+def _minutes(delta):
+    return delta.total_seconds() / 60
+
+
+def merge_sessions(sessions, now=None):
+    """
+    Sweep over the sessions of one operator / day (sorted by start):
+    merged intervals plus gross / overlap / gap totals.
+    """
+    intervals = []
+    gross = overlap = gaps = 0.0
+    open_count = invalid_count = 0
+    teams = []
+
+    for session in sessions:
+        team = session["team_user__username"]
+        if team not in teams:
+            teams.append(team)
+        start, end = _interval(session, now)
+        if end is None:
+            open_count += 1
+            continue
+        if end <= start:
+            invalid_count += 1
+            continue
+        gross += _minutes(end - start)
+
+        if intervals and start <= intervals[-1][1]:
+            last_start, last_end = intervals[-1]
+            overlap += _minutes(min(end, last_end) - start)
+            intervals[-1] = (last_start, max(last_end, end))
+        else:
+            if intervals:
+                gaps += _minutes(start - intervals[-1][1])
+            intervals.append((start, end))
+
+    presence = sum(_minutes(end - start) for start, end in intervals)
+    return {
+        "teams": teams,
+        "intervals": intervals,
+        "first_in": intervals[0][0] if intervals else None,
+        "last_out": intervals[-1][1] if intervals else None,
+        "presence_min": round(presence, 1),
+        "gross_min": round(gross, 1),
+        "overlap_min": round(overlap, 1),
+        "gap_min": round(gaps, 1),
+        "gap_count": max(len(intervals) - 1, 0),
+        "open_sessions": open_count,
+        "invalid_sessions": invalid_count,
+    }
+
+
+def attendance_days(date_from, date_to, team_user=None, operator=None, now=None, chunk_size=CHUNK_SIZE):
+    """
+    Yield one attendance dict per (operator, login date), in operator /
+    date order: merge_sessions() fields + "day", "operator_id", "badge",
+    "name", "sessions".
+    """
+    rows = session_queryset(date_from, date_to, team_user=team_user, operator=operator).iterator(chunk_size=chunk_size)
+    for (operator_id, day), group in groupby(rows, key=lambda s: (s["operator_id"], s["login_team_date"])):
+        sessions = list(group)
+        result = merge_sessions(sessions, now=now)
+        result.update(
+            day=day,
+            operator_id=operator_id,
+            badge=sessions[0]["operator__badge_num"],
+            name=sessions[0]["operator__name"],
+            sessions=len(sessions),
+        )
+        yield result
+
+
+def format_intervals(intervals):
+    """
+    "07:00–11:30, 12:00–15:00" (end on another day gets its date).
+    """
+    parts = []
+    for start, end in intervals:
+        end_text = end.strftime("%H:%M") if end.date() == start.date() else end.strftime("%d.%m. %H:%M")
+        parts.append(f"{start:%H:%M}–{end_text}")
+    return ", ".join(parts)
+
+
+def export_rows(days):
+    for a in days:
+        yield [
+            a["day"], a["badge"], a["name"], "; ".join(a["teams"]), a["sessions"],
+            a["first_in"], a["last_out"], a["presence_min"], a["gross_min"],
+            a["overlap_min"], a["gap_min"], a["gap_count"], format_intervals(a["intervals"]),
+            a["open_sessions"], a["invalid_sessions"],
+        ]
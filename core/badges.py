@@ -0,0 +1,94 @@
+# core/badges.py
+"""
+Badge -> operator resolver for the kiosk login path.
+
+All operators are kept in a per-process index keyed by the normalized
+(upper-case, stripped) badge number. The index is reloaded when the shared
+"badges" version stamp changes (Operator save/delete, operator sync), and a
+badge that is not in the index is looked up in the DB on the indexed
+`badge_norm` column.
+"""
+from collections import namedtuple
+
+from core.caching import VersionedStore
+from core.models import Operator, normalize_badge
+
+
+class BadgeEntry(namedtuple("BadgeEntry", ["id", "badge_num", "name", "act"])):
+    __slots__ = ()
+
+    def __str__(self):
+        # same label as Operator.__str__
+        return f"{self.badge_num} - {self.name}"
+
+
+def _load_index(_key):
+    return {
+        badge_norm: BadgeEntry(op_id, badge_num, name, act)
+        for op_id, badge_norm, badge_num, name, act in (
+            Operator.objects.values_list("id", "badge_norm", "badge_num", "name", "act")
+        )
+    }
+
+
+_store = VersionedStore("badges", loader=_load_index)
+
+
+def resolve_badge(badge_num, active_only=True):
+    """
+    Return BadgeEntry for the badge or None.
+    With active_only=True (default) inactive operators resolve to None.
+    """
+    key = normalize_badge(badge_num)
+    if not key:
+        return None
+
+    index = _store.get("index")
+    entry = index.get(key)
+
+    if entry is None:
+        # miss -> DB fallback (indexed exact match on badge_norm)
+        row = (
+            Operator.objects
+            .filter(badge_norm=key)
+            .values_list("id", "badge_num", "name", "act")
+            .first()
+        )
+        if row is None:
+            return None
+        entry = BadgeEntry(*row)
+        index[key] = entry
+
+    if active_only and not entry.act:
+        return None
+    return entry
+
+
+def resolve_badges(badge_nums, active_only=True):
+    """
+    Resolve many badges at once -> {normalized badge: BadgeEntry or None}.
+    Badges missing from the index are fetched with a single DB query.
+    """
+    keys = [k for k in (normalize_badge(b) for b in badge_nums) if k]
+    index = _store.get("index")
+
+    missing = [k for k in keys if k not in index]
+    if missing:
+        for badge_norm, op_id, badge_num, name, act in (
+            Operator.objects
+            .filter(badge_norm__in=missing)
+            .values_list("badge_norm", "id", "badge_num", "name", "act")
+        ):
+            index[badge_norm] = BadgeEntry(op_id, badge_num, name, act)
+
+    result = {}
+    for k in keys:
+        entry = index.get(k)
+        if entry is not None and active_only and not entry.act:
+            entry = None
+        result[k] = entry
+    return result
+
+
+def invalidate_badge_index():
+    _store.invalidate()
@@ -0,0 +1,94 @@
+# core/caching.py
+"""
+Process-level lookup caches with a shared version stamp.
+
+Each cache keeps its data in the memory of the worker process. A small
+version stamp is stored in the shared Django cache (settings.CACHES), so a
+write in any process (web worker, management command, scheduled task)
+invalidates the data in all other processes. A worker only reloads when
+the stamp it sees differs from the one its data was loaded with.
+"""
+import threading
+import time
+
+from django.core.cache import cache
+
+
+VERSION_KEY_PREFIX = "wip:version:"
+
+
+def get_version(name):
+    """
+    Current version stamp for `name` (created on first use).
+    """
+    key = VERSION_KEY_PREFIX + name
+    version = cache.get(key)
+    if version is None:
+        version = bump_version(name)
+    return version
+
+
+def bump_version(name):
+    """
+    Invalidate every process-level copy of cache `name`.
+    """
+    version = str(time.time_ns())
+    cache.set(VERSION_KEY_PREFIX + name, version, timeout=None)
+    return version
+
+
+class VersionedStore:
+    """
+    In-memory key -> value store that is dropped as a whole when the shared
+    version stamp changes.
+
+    - loader(key) is called on a miss and its result is remembered
+      (None results are remembered too, so "not found" is cached as well)
+    - max_entries caps memory for date-keyed data (oldest entries are dropped)
+    """
+
+    _MISSING = object()
+
+    def __init__(self, name, loader=None, max_entries=None):
+        self.name = name
+        self.loader = loader
+        self.max_entries = max_entries
+        self._data = {}
+        self._version = None
+        self._lock = threading.Lock()
+
+    def _sync(self):
+        version = get_version(self.name)
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._data = {}
+                    self._version = version
+
+    def get(self, key, loader=None):
+        self._sync()
+        value = self._data.get(key, self._MISSING)
+        if value is self._MISSING:
+            value = (loader or self.loader)(key)
+            self.set(key, value)
+        return value
+
+    def set(self, key, value):
+        with self._lock:
+            if self.max_entries and key not in self._data and len(self._data) >= self.max_entries:
+                # dict keeps insertion order -> drop the oldest entry
+                self._data.pop(next(iter(self._data)))
+            self._data[key] = value
+
+    def peek(self, key, default=None):
+        """
+        Read without calling the loader (still honours the version stamp).
+        """
+        self._sync()
+        return self._data.get(key, default)
+
+    def invalidate(self):
+        with self._lock:
+            self._data = {}
+            self._version = None
+        bump_version(self.name)
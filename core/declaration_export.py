@@ -0,0 +1,80 @@
+# core/declaration_export.py
+"""
+Planner declaration export (CSV / XLSX) for any date range.
+
+Declarations are read with QuerySet.iterator(chunk_size=...) (operators
+prefetched per chunk) and written row by row by the streaming writers in
+core.spreadsheets, so memory stays flat for multi-month exports. Operators
+of a declaration are flattened into one row (count, badges, names).
+"""
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from core.models import Declaration, Operator
+
+
+CHUNK_SIZE = 2000
+
+HEADER = [
+    "ID", "Date", "Team user", "Subdepartment", "PRO", "SKU", "Routing version",
+    "Operation", "Qty", "SMV", "SMV ITA", "Operator count", "Badges", "Operators",
+    "Created", "Updated",
+]
+
+
+def declaration_queryset(date_from=None, date_to=None, team_user=None, subdepartment=None, pro=None):
+    """
+    Declarations for the export filters (all optional); `pro` matches the
+    PRO name (contains, case-insensitive).
+    """
+    qs = Declaration.objects.all()
+    if date_from:
+        qs = qs.filter(decl_date__gte=date_from)
+    if date_to:
+        qs = qs.filter(decl_date__lte=date_to)
+    if team_user:
+        qs = qs.filter(teamuser=team_user)
+    if subdepartment:
+        qs = qs.filter(subdepartment=subdepartment)
+    if pro:
+        qs = qs.filter(pro__pro_name__icontains=pro)
+    return qs
+
+
+def _local(value):
+    return timezone.localtime(value).replace(tzinfo=None, microsecond=0) if value else None
+
+
+def declaration_rows(queryset, chunk_size=CHUNK_SIZE):
+    """
+    Yield one export row (list, HEADER order) per declaration.
+    """
+    qs = (
+        queryset
+        .select_related("teamuser", "subdepartment", "pro", "routing", "routing_operation__operation")
+        .prefetch_related(
+            Prefetch("operators", queryset=Operator.objects.only("id", "badge_num", "name").order_by("badge_num"))
+        )
+        .order_by("decl_date", "id")
+    )
+    for d in qs.iterator(chunk_size=chunk_size):
+        ops = list(d.operators.all())
+        ro = d.routing_operation
+        yield [
+            d.id,
+            d.decl_date,
+            d.teamuser.username,
+            d.subdepartment.subdepartment if d.subdepartment else "",
+            d.pro.pro_name,
+            d.routing.sku,
+            d.routing.version,
+            ro.operation.name if ro else "",
+            d.qty,
+            d.smv,
+            d.smv_ita,
+            len(ops),
+            "; ".join(op.badge_num for op in ops),
+            "; ".join(op.name for op in ops),
+            _local(d.created_at),
+            _local(d.updated_at),
+        ]
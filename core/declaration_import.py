@@ -0,0 +1,258 @@
+# core/declaration_import.py
+"""
+Planner bulk import of declarations from an XLSX (streamed, read_only) or
+CSV file.
+
+Columns (header row, case-insensitive, any order):
+  date, team, pro, routing, operation, qty, operators
+
+- team:      team user username
+- routing:   routing version (may be empty if the PRO has one ready routing)
+- operation: operation name (may be empty if the routing has one operation)
+- operators: badge numbers separated by ";" or "," (OPERATOR type routings)
+
+Rows are validated with the same rules as the planner declaration wizard
+(DeclarationWizardPlannerView / DeclarationSavePlannerView): active team
+user with a subdepartment, calendar entry for the date, active PRO linked
+to the subdepartment, ready routing of the PRO SKU for the subdepartment,
+operation of the routing, qty >= 1 and operators logged in to the team on
+that date.
+
+Lookups (team users, PROs, shifts and logins per date, routing catalog,
+badge index) are built once per file. Valid rows are inserted in chunks
+with bulk_create. Every row gets a client_key derived from the file hash
+and the row number, so uploading the same file again skips rows that are
+already imported.
+"""
+from datetime import date, datetime
+
+from django.db import transaction
+
+from core.badges import resolve_badges
+from core.declarations import DECLARABLE_LOGIN_STATUSES, client_key_ids, insert_declarations
+from core.models import Declaration, LoginOperator, Pro, TeamUser, normalize_badge
+from core.routing_catalog import ready_routings
+from core.shifts import load_shifts
+from core.spreadsheets import file_digest, iter_rows
+from core.wip import over_limit_rows
+
+
+CHUNK_SIZE = 500
+
+# header aliases -> column name
+COLUMN_ALIASES = {
+    "date": "date",
+    "work date": "date",
+    "decl_date": "date",
+    "team": "team",
+    "team user": "team",
+    "teamuser": "team",
+    "pro": "pro",
+    "routing": "routing",
+    "version": "routing",
+    "operation": "operation",
+    "routing operation": "operation",
+    "qty": "qty",
+    "quantity": "qty",
+    "operators": "operators",
+    "badges": "operators",
+}
+REQUIRED_COLUMNS = ["date", "team", "pro", "qty"]
+
+DATE_FORMATS = ["%Y-%m-%d", "%d.%m.%Y", "%d/%m/%Y"]
+
+
+# ---------- validation ----------
+
+def _parse_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _parse_qty(value):
+    try:
+        qty = int(str(value))
+    except ValueError:
+        return None
+    return qty if qty > 0 else None
+
+
+class DeclarationImportLookups:
+    """
+    In-memory lookup maps for one import file.
+    """
+
+    def __init__(self):
+        self.teams = {
+            tu.username.lower(): tu
+            for tu in TeamUser.objects.filter(is_active=True, subdepartment__isnull=False)
+        }
+
+        # PRO name -> (pro_id, sku, {active subdepartment ids})
+        self.pros = {}
+        for pro_id, pro_name, sku, subdep_id in (
+            Pro.objects
+            .filter(status=True, pro_subdepartments__active=True)
+            .values_list("id", "pro_name", "sku", "pro_subdepartments__subdepartment_id")
+        ):
+            entry = self.pros.setdefault(pro_name.strip().upper(), (pro_id, sku, set()))
+            entry[2].add(subdep_id)
+
+        self._logins = {}
+
+    def shift(self, team_user, day):
+        return load_shifts(day).get(team_user.pk)
+
+    def logged_in(self, team_user, day):
+        """
+        Operator ids logged in (ACTIVE / COMPLETED) to a team on a date;
+        one query per distinct date of the file.
+        """
+        if day not in self._logins:
+            by_team = {}
+            for team_user_id, operator_id in (
+                LoginOperator.objects
+                .filter(login_team_date=day, status__in=DECLARABLE_LOGIN_STATUSES)
+                .values_list("team_user_id", "operator_id")
+            ):
+                by_team.setdefault(team_user_id, set()).add(operator_id)
+            self._logins[day] = by_team
+        return self._logins[day].get(team_user.pk, set())
+
+
+def _pick(entries, value, key):
+    """
+    Entry whose key(entry) matches value (case-insensitive); the only entry
+    when value is empty.
+    """
+    if not value:
+        return entries[0] if len(entries) == 1 else None
+    value = str(value).strip().lower()
+    return next((e for e in entries if str(key(e) or "").strip().lower() == value), None)
+
+
+def validate_row(lookups, values):
+    """
+    (errors, cleaned) for one file row.
+    """
+    errors = []
+
+    day = _parse_date(values.get("date", ""))
+    if day is None:
+        errors.append("Invalid date.")
+
+    team_user = lookups.teams.get(str(values.get("team", "")).strip().lower())
+    if team_user is None:
+        errors.append("Unknown or inactive team user.")
+    elif day is not None and lookups.shift(team_user, day) is None:
+        errors.append("No calendar entry for this date.")
+
+    pro_entry = lookups.pros.get(str(values.get("pro", "")).strip().upper())
+    if pro_entry is None or (team_user is not None and team_user.subdepartment_id not in pro_entry[2]):
+        errors.append("PRO not found, not active or not linked to the team subdepartment.")
+        pro_entry = None
+
+    routing = None
+    if pro_entry is not None and team_user is not None:
+        routing = _pick(ready_routings(pro_entry[1], team_user.subdepartment_id), values.get("routing"), lambda r: r.version)
+        if routing is None:
+            errors.append("No matching ready routing for this PRO and subdepartment.")
+
+    operation = None
+    if routing is not None:
+        operation = _pick(routing.operations, values.get("operation"), lambda op: op.name)
+        if operation is None:
+            errors.append("Operation not found in the routing.")
+
+    qty = _parse_qty(values.get("qty", ""))
+    if qty is None:
+        errors.append("Invalid quantity.")
+
+    operator_ids = []
+    if routing is not None and routing.is_operator_type:
+        badges = [b.strip() for b in str(values.get("operators", "")).replace(",", ";").split(";") if b.strip()]
+        if not badges:
+            errors.append("Declaration requires operators but none given.")
+        else:
+            entries = resolve_badges(badges, active_only=False)
+            unknown = [b for b in badges if entries.get(normalize_badge(b)) is None]
+            if unknown:
+                errors.append(f"Unknown badge(s): {', '.join(unknown)}.")
+            else:
+                operator_ids = sorted({entries[normalize_badge(b)].id for b in badges})
+                if day is not None and team_user is not None and not set(operator_ids) <= lookups.logged_in(team_user, day):
+                    errors.append("Operators are not logged in to this team on that date.")
+
+    if errors:
+        return errors, None
+
+    return [], {
+        "decl_date": day,
+        "teamuser_id": team_user.pk,
+        "subdepartment_id": team_user.subdepartment_id,
+        "pro_id": pro_entry[0],
+        "routing_id": routing.id,
+        "routing_operation_id": operation.id,
+        "smv": operation.smv,
+        "smv_ita": operation.smv_ita,
+        "qty": qty,
+        "operator_ids": operator_ids,
+    }
+
+
+# ---------- import ----------
+
+def _row_no(key):
+    return int(key.rsplit("-", 1)[1])
+
+
+def _flush(chunk, result):
+    with transaction.atomic():
+        existing = client_key_ids(Declaration, list(chunk))
+        rows = {k: v for k, v in chunk.items() if (v["teamuser_id"], k) not in existing}
+        over_limit = over_limit_rows(rows)
+        insert_declarations(rows)
+    result["created"] += len(rows)
+    result["over_limit"].extend((_row_no(key), message) for key, message in over_limit.items())
+    result["skipped"] += len(chunk) - len(rows)
+
+
+def import_declarations(uploaded_file, chunk_size=CHUNK_SIZE):
+    """
+    Import declarations from an uploaded file.
+
+    Returns {"rows", "created", "skipped", "errors": [(row number, [messages])],
+    "over_limit": [(row number, message)]} where "skipped" counts rows already
+    imported from the same file and "over_limit" lists imported rows that take
+    an operation over the PRO qty + tolerance (imported anyway, paper data).
+    Raises ImportFileError when the file can't be read.
+    """
+    key_prefix = f"imp-{file_digest(uploaded_file)}-"
+    lookups = DeclarationImportLookups()
+    result = {"rows": 0, "created": 0, "skipped": 0, "errors": [], "over_limit": []}
+
+    chunk = {}
+    for row_no, values in iter_rows(uploaded_file, COLUMN_ALIASES, REQUIRED_COLUMNS):
+        result["rows"] += 1
+        errors, cleaned = validate_row(lookups, values)
+        if errors:
+            result["errors"].append((row_no, errors))
+            continue
+
+        chunk[f"{key_prefix}{row_no}"] = cleaned
+        if len(chunk) >= chunk_size:
+            _flush(chunk, result)
+            chunk = {}
+
+    if chunk:
+        _flush(chunk, result)
+
+    return result
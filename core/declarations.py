@@ -0,0 +1,494 @@
+# core/declarations.py
+"""
+Team declaration / downtime declaration writes shared by the team terminal
+views (wizard, one-page declaration, offline queue ingest).
+
+- TeamDeclarationValidator: same rules as the one-page declaration save,
+  with per-request lookup caches so a batch costs a constant number of
+  queries per distinct PRO / date.
+- create_team_declaration: single declaration (+ operators, counters),
+  guarded against declaring more than the PRO qty (core.wip.reserve_qty).
+- create_downtime_declarations: one downtime for many operators (bulk).
+- insert_declarations: bulk insert keyed by client_key (ingest, file import).
+- ingest_team_batch: idempotent bulk insert keyed by client_key.
+"""
+from datetime import date, timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.db import IntegrityError, transaction
+from django.db.models import Min
+from django.utils import timezone
+
+from core.models import (
+    Declaration, Downtime, DowntimeDeclaration, LoginOperator, Pro, Routing, RoutingOperation,
+)
+from core.downtime_report import invalidate_downtime_report
+from core.output_counters import add_declarations
+from core.wip import add_declarations as add_wip_declarations, over_limit_rows, reserve_qty
+from core.routing_catalog import get_routing_operation, ready_routings
+
+
+# offline terminals may flush entries from the previous days
+INGEST_MAX_AGE_DAYS = 7
+
+# operators / logins that can be used for declarations of a team on a day
+DECLARABLE_LOGIN_STATUSES = ["ACTIVE", "COMPLETED"]
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def declarable_logins(team_user, day):
+    """
+    LoginOperator rows of a team for a day that declarations / downtime can use.
+    """
+    return LoginOperator.objects.filter(
+        team_user=team_user,
+        login_team_date=day,
+        status__in=DECLARABLE_LOGIN_STATUSES,
+    )
+
+
+def create_team_declaration(team_user, pro, routing, routing_operation, qty, operator_ids,
+                            smv=None, smv_ita=None, decl_date=None, client_key=None):
+    """
+    Persist a team declaration (declaration + operators + team output counters
+    in one transaction). SMV defaults to the routing operation values.
+
+    Raises OverDeclarationError (core.wip) when qty does not fit in the PRO
+    qty of the operation; nothing is written then.
+    """
+    with transaction.atomic():
+        reserve_qty(pro, routing_operation, qty)
+        decl = Declaration.objects.create(
+            decl_date=decl_date or timezone.localdate(),
+            teamuser=team_user,
+            subdepartment=team_user.subdepartment,
+            pro=pro,
+            routing=routing,
+            routing_operation=routing_operation,
+            qty=qty,
+            smv=(smv or (routing_operation.smv if routing_operation else None)),
+            smv_ita=(smv_ita or (routing_operation.smv_ita if routing_operation else None)),
+            client_key=client_key or None,
+        )
+        if operator_ids:
+            decl.operators.add(*operator_ids)
+    return decl
+
+
+class TeamDeclarationValidator:
+    """
+    Validates declaration / downtime payloads of one team user.
+
+    Lookups are cached for the lifetime of the validator (one request):
+    PROs per id, declarable operators / logins per date, downtimes of the
+    subdepartment; routings and operations come from the routing catalog.
+    """
+
+    def __init__(self, team_user):
+        self.team_user = team_user
+        self.subdepartment_id = team_user.subdepartment_id
+        self._pros = {}
+        self._logins = {}
+        self._downtimes = None
+
+    # ---------- lookups ----------
+
+    def preload_pros(self, pro_ids):
+        ids = {i for i in (_to_int(p) for p in pro_ids) if i is not None} - set(self._pros)
+        if not ids:
+            return
+        found = {
+            p.id: p
+            for p in Pro.objects.filter(
+                pk__in=ids,
+                status=True,
+                pro_subdepartments__subdepartment_id=self.subdepartment_id,
+                pro_subdepartments__active=True,
+            ).distinct()
+        }
+        for i in ids:
+            self._pros[i] = found.get(i)
+
+    def pro(self, pro_id):
+        pro_id = _to_int(pro_id)
+        if pro_id is None:
+            return None
+        if pro_id not in self._pros:
+            self.preload_pros([pro_id])
+        return self._pros[pro_id]
+
+    def logins(self, day):
+        """
+        {operator_id: first LoginOperator id} of the team for a day.
+        """
+        if day not in self._logins:
+            self._logins[day] = dict(
+                declarable_logins(self.team_user, day)
+                .values("operator_id")
+                .annotate(first_id=Min("id"))
+                .values_list("operator_id", "first_id")
+            )
+        return self._logins[day]
+
+    def downtime(self, downtime_id):
+        if self._downtimes is None:
+            self._downtimes = {
+                dt.id: dt for dt in Downtime.objects.filter(subdepartment_id=self.subdepartment_id)
+            }
+        return self._downtimes.get(_to_int(downtime_id))
+
+    def parse_date(self, value, errors):
+        today = timezone.localdate()
+        if not value:
+            return today
+        try:
+            day = date.fromisoformat(str(value))
+        except ValueError:
+            errors.append("Invalid date.")
+            return None
+        if day > today or day < today - timedelta(days=INGEST_MAX_AGE_DAYS):
+            errors.append(f"Date must be within the last {INGEST_MAX_AGE_DAYS} days.")
+            return None
+        return day
+
+    # ---------- declaration ----------
+
+    def validate_declaration(self, data, day=None):
+        """
+        (errors, cleaned) for a declaration payload:
+          pro, routing, routing_operation, qty, operators (list), decl_date (optional)
+        """
+        errors = []
+        day = day or self.parse_date(data.get("decl_date"), errors)
+
+        pro = self.pro(data.get("pro"))
+        if pro is None:
+            errors.append("Select an active PRO of your subdepartment.")
+
+        routing_id = _to_int(data.get("routing"))
+        routing_entry = None
+        if pro is not None:
+            routing_entry = next(
+                (r for r in ready_routings(pro.sku, self.subdepartment_id) if r.id == routing_id),
+                None,
+            )
+            if routing_entry is None:
+                errors.append("Select a ready routing of this PRO for your subdepartment.")
+
+        op_entry = None
+        if routing_entry is not None:
+            op_entry = get_routing_operation(routing_entry.id, data.get("routing_operation"))
+            if op_entry is None:
+                errors.append("Select an operation of this routing.")
+
+        qty = _to_int(data.get("qty"))
+        if qty is None or qty <= 0:
+            errors.append("Invalid quantity.")
+
+        operator_ids = []
+        operators = data.get("operators") or []
+        if not isinstance(operators, (list, tuple)):
+            errors.append("Operators must be a list of operator ids.")
+        elif routing_entry is not None and routing_entry.is_operator_type:
+            operator_ids = sorted({i for i in (_to_int(x) for x in operators) if i is not None})
+            if not operator_ids:
+                errors.append("Please select at least one operator.")
+            elif day is not None and not set(operator_ids) <= set(self.logins(day)):
+                errors.append("Selected operators are not logged in to this team on that day.")
+
+        if errors:
+            return errors, None
+
+        return [], {
+            "decl_date": day,
+            "pro": pro,
+            "routing_id": routing_entry.id,
+            "routing_operation_id": op_entry.id,
+            "smv": op_entry.smv,
+            "smv_ita": op_entry.smv_ita,
+            "qty": qty,
+            "operator_ids": operator_ids,
+        }
+
+    def load_declaration_objects(self, cleaned):
+        """
+        Routing / RoutingOperation instances for a cleaned declaration.
+        """
+        routing = Routing.objects.get(pk=cleaned["routing_id"])
+        routing_operation = RoutingOperation.objects.get(pk=cleaned["routing_operation_id"])
+        return routing, routing_operation
+
+    # ---------- downtime ----------
+
+    def validate_downtime(self, data, day=None):
+        """
+        (errors, cleaned) for a downtime payload:
+          operator, downtime, downtime_value (non fixed), repetition (fixed), date (optional)
+        Same value rules as the team downtime wizard step 3.
+        """
+        errors = []
+        day = day or self.parse_date(data.get("date"), errors)
+
+        login_operator_id = None
+        operator_id = _to_int(data.get("operator"))
+        if day is not None:
+            login_operator_id = self.logins(day).get(operator_id)
+            if login_operator_id is None:
+                errors.append("Operator is not logged in to this team on that day.")
+
+        dt = self.downtime(data.get("downtime"))
+        if dt is None:
+            errors.append("Select a downtime of your subdepartment.")
+            return errors, None
+
+        try:
+            if dt.fixed_duration:
+                downtime_value = Decimal(dt.downtime_value)
+                repetition = _to_int(data.get("repetition") or 1)
+            else:
+                downtime_value = Decimal(str(data.get("downtime_value")))
+                repetition = 1
+            if not downtime_value.is_finite():
+                # "NaN" / "Infinity" parse, but can't be compared or stored
+                downtime_value = None
+        except (InvalidOperation, TypeError):
+            downtime_value, repetition = None, None
+
+        if downtime_value is None or downtime_value <= 0:
+            errors.append("Downtime value must be greater than 0.")
+        if repetition is None or repetition <= 0:
+            errors.append("Repetition must be at least 1.")
+
+        if errors:
+            return errors, None
+
+        return [], {
+            "login_operator_id": login_operator_id,
+            "downtime_id": dt.id,
+            "downtime_value": downtime_value,
+            "repetition": repetition,
+        }
+
+
+# ---------- bulk writes ----------
+
+def build_downtime_declaration(login_operator_id, downtime_id, downtime_value, repetition, client_key=None):
+    """
+    Unsaved DowntimeDeclaration with downtime_total set
+    (bulk_create does not call DowntimeDeclaration.save()).
+    """
+    downtime_value = Decimal(downtime_value)
+    repetition = int(repetition)
+    return DowntimeDeclaration(
+        login_operator_id=login_operator_id,
+        downtime_id=downtime_id,
+        downtime_value=downtime_value,
+        repetition=repetition,
+        downtime_total=downtime_value * repetition,
+        client_key=client_key or None,
+    )
+
+
+def create_downtime_declarations(login_operator_ids, downtime_id, downtime_value, repetition):
+    """
+    Same downtime for many logged in operators in one bulk_create (one
+    transaction). Returns the number of created DowntimeDeclaration rows
+    (bulk_create returns no ids on backends without RETURNING, and server
+    side rows have no client_key to find them by).
+    """
+    objs = [
+        build_downtime_declaration(lo_id, downtime_id, downtime_value, repetition)
+        for lo_id in login_operator_ids
+    ]
+    if not objs:
+        return 0
+
+    with transaction.atomic():
+        DowntimeDeclaration.objects.bulk_create(objs, batch_size=200)
+    invalidate_downtime_report()
+    return len(objs)
+
+
+# client keys are unique per team: the team of a downtime declaration is
+# the team of its login session
+CLIENT_KEY_TEAM = {
+    Declaration: "teamuser_id",
+    DowntimeDeclaration: "login_operator__team_user_id",
+}
+
+
+def client_key_ids(model, keys, team_user=None):
+    """
+    {(team user id, client_key): id} of stored rows with the given keys
+    (of one team user, or of any team).
+    """
+    if not keys:
+        return {}
+    team_field = CLIENT_KEY_TEAM[model]
+    qs = model.objects.filter(client_key__in=list(keys))
+    if team_user is not None:
+        qs = qs.filter(**{team_field: team_user.pk})
+    return {(team_id, key): pk for team_id, key, pk in qs.order_by().values_list(team_field, "client_key", "id")}
+
+
+def insert_declarations(decl_rows, batch_size=200):
+    """
+    Bulk insert cleaned declarations keyed by client_key (no existence check,
+    call inside a transaction). Each row needs teamuser_id, subdepartment_id,
+    decl_date, pro (or pro_id), routing_id, routing_operation_id, qty, smv,
+    smv_ita, operator_ids.
+
+    Writes the declarations, their operator rows and the team output
+    counters. Returns {key: declaration id}.
+    """
+    if not decl_rows:
+        return {}
+
+    objs = Declaration.objects.bulk_create([
+        Declaration(
+            decl_date=c["decl_date"],
+            teamuser_id=c["teamuser_id"],
+            subdepartment_id=c["subdepartment_id"],
+            pro_id=c["pro"].pk if c.get("pro") is not None else c["pro_id"],
+            routing_id=c["routing_id"],
+            routing_operation_id=c["routing_operation_id"],
+            qty=c["qty"],
+            smv=c["smv"],
+            smv_ita=c["smv_ita"],
+            client_key=key,
+        )
+        for key, c in decl_rows.items()
+    ], batch_size=batch_size)
+
+    if all(obj.pk for obj in objs):
+        decl_ids = {obj.client_key: obj.pk for obj in objs}
+    else:
+        # backend without RETURNING on bulk insert -> ids by (team, key)
+        stored = client_key_ids(Declaration, list(decl_rows))
+        decl_ids = {key: stored[(c["teamuser_id"], key)] for key, c in decl_rows.items()}
+
+    Through = Declaration.operators.through
+    Through.objects.bulk_create([
+        Through(declaration_id=decl_ids[key], operator_id=op_id)
+        for key, c in decl_rows.items()
+        for op_id in c["operator_ids"]
+    ], batch_size=500)
+
+    created = list(Declaration.objects.filter(pk__in=decl_ids.values()))
+    add_declarations(created, {decl_ids[key]: c["operator_ids"] for key, c in decl_rows.items()})
+    add_wip_declarations(created)
+    return decl_ids
+
+
+def _insert_batch(team_user, decl_rows, downtime_rows):
+    """
+    Insert rows whose client_key does not exist yet. One transaction.
+    Returns ({key: declaration id}, {key: downtime id}, {key: over-limit message}).
+    """
+    with transaction.atomic():
+        existing = client_key_ids(Declaration, list(decl_rows), team_user)
+        decl_rows = {
+            k: dict(v, teamuser_id=team_user.pk, subdepartment_id=team_user.subdepartment_id)
+            for k, v in decl_rows.items() if (team_user.pk, k) not in existing
+        }
+        existing = client_key_ids(DowntimeDeclaration, list(downtime_rows), team_user)
+        downtime_rows = {k: v for k, v in downtime_rows.items() if (team_user.pk, k) not in existing}
+
+        over_limit = over_limit_rows(decl_rows)
+        decl_ids = insert_declarations(decl_rows)
+
+        objs = DowntimeDeclaration.objects.bulk_create([
+            build_downtime_declaration(client_key=key, **c)
+            for key, c in downtime_rows.items()
+        ], batch_size=200)
+
+        if all(obj.pk for obj in objs):
+            downtime_ids = {obj.client_key: obj.pk for obj in objs}
+        else:
+            downtime_ids = {
+                key: pk for (_, key), pk in client_key_ids(DowntimeDeclaration, list(downtime_rows), team_user).items()
+            }
+
+    if downtime_rows:
+        invalidate_downtime_report()
+    return decl_ids, downtime_ids, over_limit
+
+
+def ingest_team_batch(team_user, declarations=(), downtimes=()):
+    """
+    Idempotent bulk ingest for the terminal offline queue.
+
+    Every item carries a client generated "key". Items whose key is already
+    stored for this team are reported as "duplicate" (with the stored id)
+    and not inserted again, so a terminal can safely resend its whole queue.
+
+    Offline data is not rejected for going over the PRO qty: created rows
+    that take an operation over the limit (core.wip.qty_limit) are stored
+    and get the message in "warnings".
+
+    Returns a list of {"key", "type", "status", "id", "errors", "warnings"}
+    with status one of: created, duplicate, error.
+    """
+    validator = TeamDeclarationValidator(team_user)
+    validator.preload_pros([d.get("pro") for d in declarations])
+
+    results = []
+    decl_rows = {}
+    downtime_rows = {}
+
+    for kind, items, rows, validate in (
+        ("declaration", declarations, decl_rows, validator.validate_declaration),
+        ("downtime", downtimes, downtime_rows, validator.validate_downtime),
+    ):
+        for item in items:
+            key = str(item.get("key") or "").strip()[:64]
+            row = {"key": key, "type": kind, "status": "error", "id": None, "errors": [], "warnings": []}
+            results.append(row)
+
+            if not key:
+                row["errors"] = ["Missing key."]
+                continue
+            if key in rows:
+                row["status"] = "duplicate"
+                continue
+
+            errors, cleaned = validate(item)
+            if errors:
+                row["errors"] = errors
+                continue
+            rows[key] = cleaned
+
+    # keys are looked up within the team only (another terminal may use the same key)
+    existing_decl = {key: pk for (_, key), pk in client_key_ids(Declaration, list(decl_rows), team_user).items()}
+    existing_dt = {key: pk for (_, key), pk in client_key_ids(DowntimeDeclaration, list(downtime_rows), team_user).items()}
+
+    try:
+        decl_ids, downtime_ids, over_limit = _insert_batch(team_user, decl_rows, downtime_rows)
+    except IntegrityError:
+        # same keys flushed concurrently by a retry -> insert what is still missing
+        decl_ids, downtime_ids, over_limit = _insert_batch(team_user, decl_rows, downtime_rows)
+
+    for row in results:
+        if row["errors"] or not row["key"]:
+            continue
+        existing = existing_decl if row["type"] == "declaration" else existing_dt
+        created = decl_ids if row["type"] == "declaration" else downtime_ids
+        if row["key"] in existing:
+            row.update(status="duplicate", id=existing[row["key"]])
+        elif row["key"] in created:
+            if row["status"] != "duplicate":
+                row["status"] = "created"
+                if row["type"] == "declaration" and row["key"] in over_limit:
+                    row["warnings"] = [over_limit[row["key"]]]
+            row["id"] = created[row["key"]]
+        else:
+            # inserted by a concurrent request between the checks
+            row["status"] = "duplicate"
+
+    return results
@@ -0,0 +1,165 @@
+# core/downtime_report.py
+"""
+Downtime analytics for a date range: Pareto by downtime type, split per
+team and per subdepartment, daily trend.
+
+All figures come from one grouped query over DowntimeDeclaration joined
+through login_operator (session date, team) and downtime (type), grouped
+by type x team x day. The grouped rows are small (types x teams x days),
+Pareto / splits / trend are folded from them in Python.
+
+The report is kept in the shared cache per range (and subdepartment
+filter). Any downtime declaration, downtime type or login session
+(grouping date / team) write bumps the "downtime_report" version
+(core.signals, bulk paths call invalidate_downtime_report), which drops
+all cached ranges at once.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Count, Sum
+
+from core.caching import bump_version, get_version
+from core.models import DowntimeDeclaration
+
+
+VERSION_NAME = "downtime_report"
+CACHE_TIMEOUT = 24 * 60 * 60
+
+# types shown as separate series in the daily trend (rest = "Other")
+TREND_TYPES = 5
+
+
+def invalidate_downtime_report():
+    bump_version(VERSION_NAME)
+
+
+def _grouped_rows(date_from, date_to, subdepartment_id=None):
+    qs = DowntimeDeclaration.objects.filter(
+        login_operator__login_team_date__gte=date_from,
+        login_operator__login_team_date__lte=date_to,
+    )
+    if subdepartment_id:
+        qs = qs.filter(login_operator__team_user__subdepartment_id=subdepartment_id)
+    return list(
+        qs
+        .order_by()
+        .values(
+            "downtime_id",
+            "downtime__downtime_name",
+            "downtime__subdepartment__subdepartment",
+            "login_operator__team_user_id",
+            "login_operator__team_user__username",
+            "login_operator__team_user__subdepartment__subdepartment",
+            "login_operator__login_team_date",
+        )
+        .annotate(minutes=Sum("downtime_total"), events=Count("id"))
+    )
+
+
+def _share(value, total):
+    return round(value * 100 / total, 1) if total else Decimal("0.0")
+
+
+def _ranked(totals, events, total):
+    """
+    [{"label", "minutes", "events", "share"}] sorted by minutes, desc.
+    """
+    return [
+        {
+            "label": label,
+            "minutes": round(minutes, 1),
+            "events": events[label],
+            "share": _share(minutes, total),
+        }
+        for label, minutes in sorted(totals.items(), key=lambda item: (-item[1], item[0]))
+    ]
+
+
+def build_report(date_from, date_to, subdepartment_id=None):
+    """
+    {"total_minutes", "total_events", "pareto", "teams", "subdepartments",
+     "trend": {"labels", "total", "series": [{"label", "data"}]}}.
+
+    pareto rows carry "cumulative" (%) as well; minutes are Decimal.
+    """
+    by_type = defaultdict(Decimal)
+    by_team = defaultdict(Decimal)
+    by_subdep = defaultdict(Decimal)
+    by_day_type = defaultdict(Decimal)
+    events_type = defaultdict(int)
+    events_team = defaultdict(int)
+    events_subdep = defaultdict(int)
+
+    for row in _grouped_rows(date_from, date_to, subdepartment_id):
+        minutes = Decimal(row["minutes"] or 0)
+        downtime = f'{row["downtime__downtime_name"]} ({row["downtime__subdepartment__subdepartment"]})'
+        team = row["login_operator__team_user__username"]
+        subdep = row["login_operator__team_user__subdepartment__subdepartment"] or "N/A"
+
+        by_type[downtime] += minutes
+        by_team[team] += minutes
+        by_subdep[subdep] += minutes
+        by_day_type[(row["login_operator__login_team_date"], downtime)] += minutes
+        events_type[downtime] += row["events"]
+        events_team[team] += row["events"]
+        events_subdep[subdep] += row["events"]
+
+    total = sum(by_type.values(), Decimal("0"))
+
+    pareto = _ranked(by_type, events_type, total)
+    cumulative = Decimal("0")
+    for row in pareto:
+        cumulative += by_type[row["label"]]
+        row["cumulative"] = _share(cumulative, total)
+
+    # daily trend: every day of the range, top types + "Other"
+    days = []
+    day = date_from
+    while day <= date_to:
+        days.append(day)
+        day += timedelta(days=1)
+    top = [row["label"] for row in pareto[:TREND_TYPES]]
+    series = {label: [Decimal("0")] * len(days) for label in top}
+    other = [Decimal("0")] * len(days)
+    day_index = {d: i for i, d in enumerate(days)}
+    for (d, downtime), minutes in by_day_type.items():
+        i = day_index[d]
+        if downtime in series:
+            series[downtime][i] += minutes
+        else:
+            other[i] += minutes
+    day_totals = [sum(values, Decimal("0")) for values in zip(other, *series.values())]
+    trend_series = [{"label": label, "data": [float(v) for v in series[label]]} for label in top]
+    if any(other):
+        trend_series.append({"label": "Other", "data": [float(v) for v in other]})
+
+    return {
+        "total_minutes": round(total, 1),
+        "total_events": sum(events_type.values()),
+        "pareto": pareto,
+        "teams": _ranked(by_team, events_team, total),
+        "subdepartments": _ranked(by_subdep, events_subdep, total),
+        "trend": {
+            "labels": [d.isoformat() for d in days],
+            "total": [float(v) for v in day_totals],
+            "series": trend_series,
+        },
+    }
+
+
+def downtime_report(date_from, date_to, subdepartment_id=None):
+    """
+    build_report through the shared cache (key = range + filter + version).
+    """
+    key = (
+        f"{VERSION_NAME}:{get_version(VERSION_NAME)}:{get_version('teamusers')}:"
+        f"{date_from.isoformat()}:{date_to.isoformat()}:{subdepartment_id or ''}"
+    )
+    report = cache.get(key)
+    if report is None:
+        report = build_report(date_from, date_to, subdepartment_id)
+        cache.set(key, report, CACHE_TIMEOUT)
+    return report
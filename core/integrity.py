@@ -0,0 +1,294 @@
+# core/integrity.py
+"""
+Data-integrity scanner for login sessions and declarations.
+
+Checks (IntegrityIssue.kind):
+
+  stale_active              ACTIVE session with a login date before today
+  logoff_before_login       logoff date / time not after the login
+  no_calendar               session without a Calendar entry for its team / date
+  session_overlap           session that starts before an earlier session of
+                            the same operator ended (any team)
+  operator_without_session  operator on a declaration without an ACTIVE /
+                            COMPLETED session on the declaration date
+
+Every check is one set-based query: plain filters, NOT EXISTS anti-joins
+(no_calendar, operator_without_session) or a running MAX window over the
+sessions of each operator (session_overlap). Python only formats the found
+rows.
+
+scan() writes the results to IntegrityIssue keyed by kind + row ids: new
+problems are inserted, problems found again get last_seen_at (and are
+reopened when they were resolved), problems no longer found get
+resolved_at. Runs over the full history by default, so it can be scheduled
+nightly (scan_integrity management command).
+"""
+from django.db import transaction
+from django.db.models import CharField, Exists, F, Max, OuterRef, Q, RowRange, Value, Window
+from django.db.models.functions import Cast, Coalesce, Concat, LPad
+from django.utils import timezone
+
+from core.models import Calendar, Declaration, IntegrityIssue, LoginOperator
+
+
+KINDS = [kind for kind, _ in IntegrityIssue.KIND_CHOICES]
+
+SCANNED_STATUSES = ["ACTIVE", "COMPLETED"]
+
+# pk__in chunks stay below the MSSQL parameter limit
+CHUNK_SIZE = 1000
+
+SESSION_FIELDS = (
+    "id", "login_team_date", "login_team_time", "logoff_team_date", "logoff_team_time",
+    "operator__badge_num", "team_user__username",
+)
+
+
+def _sessions(date_from=None):
+    qs = LoginOperator.objects.filter(status__in=SCANNED_STATUSES)
+    if date_from:
+        qs = qs.filter(login_team_date__gte=date_from)
+    return qs.order_by()
+
+
+def _session_label(row):
+    return f'{row["operator__badge_num"]} @ {row["team_user__username"]} {row["login_team_date"]:%d.%m.%Y} {row["login_team_time"]:%H:%M}'
+
+
+def _logoff_label(row):
+    if row["logoff_team_time"] is None:
+        return "—"
+    day = row["logoff_team_date"] or row["login_team_date"]
+    return f'{day:%d.%m.%Y} {row["logoff_team_time"]:%H:%M}'
+
+
+# ---------- checks ----------
+
+def stale_active(date_from=None, today=None):
+    today = today or timezone.localdate()
+    rows = _sessions(date_from).filter(status="ACTIVE", login_team_date__lt=today).values(*SESSION_FIELDS)
+    for row in rows.iterator():
+        yield {
+            "key": f"stale_active:{row['id']}",
+            "day": row["login_team_date"],
+            "login_operator_id": row["id"],
+            "detail": f"{_session_label(row)} is still ACTIVE",
+        }
+
+
+def logoff_before_login(date_from=None):
+    same_day = Q(logoff_team_date__isnull=True) | Q(logoff_team_date=F("login_team_date"))
+    rows = (
+        _sessions(date_from)
+        .filter(logoff_team_time__isnull=False)
+        .filter(
+            Q(logoff_team_date__lt=F("login_team_date"))
+            | (same_day & Q(logoff_team_time__lte=F("login_team_time")))
+        )
+        .values(*SESSION_FIELDS)
+    )
+    for row in rows.iterator():
+        yield {
+            "key": f"logoff_before_login:{row['id']}",
+            "day": row["login_team_date"],
+            "login_operator_id": row["id"],
+            "detail": f"{_session_label(row)} logged off {_logoff_label(row)}",
+        }
+
+
+def no_calendar(date_from=None):
+    calendar = Calendar.objects.filter(team_user_id=OuterRef("team_user_id"), date=OuterRef("login_team_date"))
+    rows = _sessions(date_from).filter(~Exists(calendar)).values(*SESSION_FIELDS)
+    for row in rows.iterator():
+        yield {
+            "key": f"no_calendar:{row['id']}",
+            "day": row["login_team_date"],
+            "login_operator_id": row["id"],
+            "detail": f"{_session_label(row)}: no calendar entry for {row['team_user__username']}",
+        }
+
+
+class _EarlierRows(RowRange):
+    """
+    ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING (RowRange takes a
+    negative end only from Django 5.1).
+    """
+
+    def window_frame_start_end(self, connection, start, end):
+        return connection.ops.UNBOUNDED_PRECEDING, f"1 {connection.ops.PRECEDING}"
+
+
+def _moment(day, moment):
+    """
+    "YYYY-MM-DD HH:MM:SS..." text of a date + time pair; sorts like the
+    moment on every backend (both parts have a fixed width per backend).
+    """
+    return Concat(
+        Cast(day, CharField(max_length=10)),
+        Value(" "),
+        Cast(moment, CharField(max_length=16)),
+        output_field=CharField(),
+    )
+
+
+def session_overlap(date_from=None):
+    """
+    Session that starts before an earlier session of the same operator
+    ended: running MAX over the ends of all earlier sessions (login date /
+    time order), so a session inside a long one is found even when a short
+    session lies between them. Each end carries its session id ("#" +
+    zero padded id), the max tells which session owns the latest end.
+    Sessions without logoff are compared as ending at their login (an open
+    session is reported by stale_active).
+    """
+    order = [F("login_team_date").asc(), F("login_team_time").asc(), F("id").asc()]
+    end_key = Concat(
+        _moment(Coalesce("logoff_team_date", "login_team_date"), Coalesce("logoff_team_time", "login_team_time")),
+        Value("#"),
+        LPad(Cast("id", CharField(max_length=12)), 12, Value("0")),
+        output_field=CharField(),
+    )
+    # "~" sorts after the digits: an end equal to the start is not an overlap
+    start_key = Concat(_moment("login_team_date", "login_team_time"), Value("#~"), output_field=CharField())
+
+    rows = list(
+        _sessions(date_from)
+        .annotate(
+            prev_end=Window(
+                Max(end_key),
+                partition_by=[F("operator_id")],
+                order_by=order,
+                frame=_EarlierRows(),
+            ),
+            start_key=start_key,
+        )
+        .filter(prev_end__isnull=False, prev_end__gt=F("start_key"))
+        .values(*SESSION_FIELDS, "prev_end")
+    )
+    for row in rows:
+        row["owner_id"] = int(row["prev_end"].rsplit("#", 1)[1])
+
+    owners = {}
+    for ids in _chunks({row["owner_id"] for row in rows}):
+        owners.update(
+            (owner["id"], owner)
+            for owner in LoginOperator.objects.filter(pk__in=ids).values(*SESSION_FIELDS)
+        )
+
+    for row in rows:
+        owner = owners[row["owner_id"]]
+        yield {
+            "key": f"session_overlap:{owner['id']}:{row['id']}",
+            "day": row["login_team_date"],
+            "login_operator_id": row["id"],
+            "detail": (
+                f"{_session_label(row)} starts before session #{owner['id']} @ {owner['team_user__username']} "
+                f"ends ({_logoff_label(owner)})"
+            ),
+        }
+
+
+def operator_without_session(date_from=None):
+    Through = Declaration.operators.through
+    session = LoginOperator.objects.filter(
+        operator_id=OuterRef("operator_id"),
+        login_team_date=OuterRef("declaration__decl_date"),
+        status__in=SCANNED_STATUSES,
+    )
+    qs = Through.objects.all()
+    if date_from:
+        qs = qs.filter(declaration__decl_date__gte=date_from)
+    rows = (
+        qs
+        .filter(~Exists(session))
+        .order_by()
+        .values(
+            "declaration_id", "operator_id", "declaration__decl_date",
+            "operator__badge_num", "declaration__teamuser__username",
+        )
+    )
+    for row in rows.iterator():
+        yield {
+            "key": f"operator_without_session:{row['declaration_id']}:{row['operator_id']}",
+            "day": row["declaration__decl_date"],
+            "declaration_id": row["declaration_id"],
+            "detail": (
+                f"Declaration #{row['declaration_id']} ({row['declaration__teamuser__username']}, "
+                f"{row['declaration__decl_date']:%d.%m.%Y}) lists {row['operator__badge_num']} without a session"
+            ),
+        }
+
+
+CHECKS = {
+    "stale_active": stale_active,
+    "logoff_before_login": logoff_before_login,
+    "no_calendar": no_calendar,
+    "session_overlap": session_overlap,
+    "operator_without_session": operator_without_session,
+}
+
+
+# ---------- issues table ----------
+
+def _chunks(items, size=CHUNK_SIZE):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def store_issues(kind, found, date_from=None, now=None):
+    """
+    Sync the issues of one check with the rows found by a scan.
+    Returns (found, new, resolved) counts.
+    """
+    now = now or timezone.now()
+    found = {row["key"]: row for row in found}
+
+    existing = IntegrityIssue.objects.filter(kind=kind)
+    if date_from:
+        existing = existing.filter(day__gte=date_from)
+
+    with transaction.atomic():
+        existing_ids = {}
+        for keys in _chunks(found):
+            existing_ids.update(
+                IntegrityIssue.objects.filter(key__in=keys).values_list("key", "id")
+            )
+
+        for ids in _chunks(existing_ids.values()):
+            IntegrityIssue.objects.filter(pk__in=ids).update(last_seen_at=now, resolved_at=None)
+
+        IntegrityIssue.objects.bulk_create([
+            IntegrityIssue(
+                kind=kind,
+                key=key,
+                day=row.get("day"),
+                login_operator_id=row.get("login_operator_id"),
+                declaration_id=row.get("declaration_id"),
+                detail=row["detail"][:255],
+                first_seen_at=now,
+                last_seen_at=now,
+            )
+            for key, row in found.items()
+            if key not in existing_ids
+        ], batch_size=500)
+
+        resolved = (
+            existing
+            .filter(resolved_at__isnull=True, last_seen_at__lt=now)
+            .update(resolved_at=now)
+        )
+
+    return len(found), len(found) - len(existing_ids), resolved
+
+
+def scan(kinds=None, date_from=None):
+    """
+    Run the checks (all by default) and store the issues.
+    Returns {kind: (found, new, resolved)}.
+    """
+    now = timezone.now()
+    result = {}
+    for kind in kinds or KINDS:
+        result[kind] = store_issues(kind, CHECKS[kind](date_from), date_from=date_from, now=now)
+    return result
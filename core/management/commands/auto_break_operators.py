@@ -5,7 +5,8 @@ from django.db import transaction
 from datetime import timedelta
 import os
 
-from core.models import LoginOperator, Calendar
+from core.models import LoginOperator
+from core.shifts import get_shift
 
 
 LOG_FILE = os.path.join(settings.BASE_DIR, "log", "AutoBreak30.txt")
@@ -48,10 +49,7 @@ def run_auto_break(today=None, stdout=None):
 
     for lo in qs:
         try:
-            cal = Calendar.objects.filter(
-                team_user=lo.team_user,
-                date=lo.login_team_date
-            ).first()
+            cal = get_shift(lo.team_user_id, lo.login_team_date)
 
             if not cal:
                 skipped += 1
@@ -1,7 +1,8 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 
-from core.models import LoginOperator, Calendar
+from core.models import LoginOperator
+from core.shifts import load_shifts
 
 
 class Command(BaseCommand):
@@ -33,6 +34,8 @@ class Command(BaseCommand):
         )
 
         total = sessions_qs.count()
+        # all team shifts for today in one query
+        shifts = load_shifts(today)
         updated = 0
         skipped_no_calendar = 0
         skipped_shift_not_finished = 0
@@ -48,10 +51,7 @@ class Command(BaseCommand):
             subdep_name = subdep.subdepartment if subdep else "NO_SUBDEP"
 
             # Calendar entry
-            calendar_entry = Calendar.objects.filter(
-                team_user=session.team_user,
-                date=today,
-            ).first()
+            calendar_entry = shifts.get(session.team_user_id)
 
             if not calendar_entry:
                 skipped_no_calendar += 1
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import Pro
+from core.pro_completion import COMPLETION_MODES, completion_mode, refresh_completion
+
+
+class Command(BaseCommand):
+    help = (
+        "Mark PRO subdepartments done / PROs completed when the final operation "
+        "output reached PRO qty (PRO_COMPLETION_MODE=deactivate also switches them off)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pro", action="append", help="PRO name (repeatable, default: all PROs).")
+        parser.add_argument("--mode", choices=COMPLETION_MODES, help="Override PRO_COMPLETION_MODE.")
+
+    def handle(self, *args, **options):
+        pro_ids = None
+        if options["pro"]:
+            pro_ids = list(Pro.objects.filter(pro_name__in=options["pro"]).values_list("id", flat=True))
+
+        mode = options["mode"] or completion_mode()
+        with transaction.atomic():
+            completed, reopened = refresh_completion(pro_ids, mode=mode)
+
+        for pro in completed:
+            self.stdout.write(f"+ {pro.pro_name} completed" + (" (set inactive)" if mode == "deactivate" else ""))
+        for pro in reopened:
+            self.stdout.write(f"- {pro.pro_name} below qty again")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Done ({mode}). Completed {len(completed)}, reopened {len(reopened)}."
+        ))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.routings import recompute_ready, refresh_pro_routing_flags
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute routing readiness (operation / final operation counts, ready) "
+        "and the PRO x subdepartment 'has routing' flags from the current data."
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            changed = recompute_ready()
+            links = refresh_pro_routing_flags()
+
+        ready = sum(1 for value in changed.values() if value)
+        self.stdout.write(
+            f"Routings updated: {len(changed)} ({ready} ready, {len(changed) - ready} not ready)."
+        )
+        self.stdout.write(f"PRO subdepartment links updated: {links}.")
+        self.stdout.write(self.style.SUCCESS("Routing readiness is up to date."))
@@ -0,0 +1,51 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.output_counters import compare_counters, rebuild_counters
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare team output counters (dashboard) with the raw declarations "
+        "and optionally rebuild them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--date-from", help="YYYY-MM-DD (default: today - days)")
+        parser.add_argument("--date-to", help="YYYY-MM-DD (default: today)")
+        parser.add_argument("--days", type=int, default=0, help="Number of past days to include (default 0 = today only).")
+        parser.add_argument("--fix", action="store_true", help="Rebuild counters of the range from the declarations.")
+
+    def handle(self, *args, **options):
+        try:
+            date_to = date.fromisoformat(options["date_to"]) if options["date_to"] else timezone.localdate()
+            date_from = (
+                date.fromisoformat(options["date_from"]) if options["date_from"]
+                else date_to - timedelta(days=options["days"])
+            )
+        except ValueError as e:
+            raise CommandError(f"Invalid date: {e}")
+
+        if date_from > date_to:
+            raise CommandError("date-from must be before date-to.")
+
+        self.stdout.write(f"Checking team output counters {date_from} - {date_to}...")
+
+        diffs = compare_counters(date_from, date_to)
+        for (team_user_id, day, operator_id, ro_id), stored, raw in diffs:
+            self.stdout.write(
+                f"- team_user={team_user_id} date={day} operator={operator_id} "
+                f"routing_operation={ro_id}: counter={stored} declarations={raw}"
+            )
+
+        if not diffs:
+            self.stdout.write(self.style.SUCCESS("Counters match the declarations."))
+            return
+
+        self.stdout.write(self.style.WARNING(f"{len(diffs)} counter(s) differ."))
+
+        if options["fix"]:
+            written = rebuild_counters(date_from, date_to)
+            self.stdout.write(self.style.SUCCESS(f"Counters rebuilt ({written} rows)."))
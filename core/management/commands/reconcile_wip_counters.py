@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Pro
+from core.wip import compare_counters, rebuild_counters
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare PRO WIP counters (qty per PRO / routing operation) with the raw "
+        "declarations and optionally rebuild them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pro", action="append", help="PRO name (repeatable, default: all PROs).")
+        parser.add_argument("--fix", action="store_true", help="Rebuild counters from the declarations.")
+
+    def handle(self, *args, **options):
+        pro_ids = None
+        if options["pro"]:
+            pro_ids = list(Pro.objects.filter(pro_name__in=options["pro"]).values_list("id", flat=True))
+            self.stdout.write(f"Checking WIP counters of {len(pro_ids)} PRO(s)...")
+        else:
+            self.stdout.write("Checking WIP counters of all PROs...")
+
+        diffs = compare_counters(pro_ids)
+        for (pro_id, ro_id), stored, raw in diffs:
+            self.stdout.write(
+                f"- pro={pro_id} routing_operation={ro_id}: counter={stored} declarations={raw}"
+            )
+
+        if not diffs:
+            self.stdout.write(self.style.SUCCESS("Counters match the declarations."))
+            return
+
+        self.stdout.write(self.style.WARNING(f"{len(diffs)} counter(s) differ."))
+
+        if options["fix"]:
+            written = rebuild_counters(pro_ids)
+            self.stdout.write(self.style.SUCCESS(f"Counters rebuilt ({written} rows)."))
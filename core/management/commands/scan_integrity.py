@@ -0,0 +1,37 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.integrity import KINDS, scan
+
+
+class Command(BaseCommand):
+    help = (
+        "Scan login sessions and declarations for data problems (stale ACTIVE "
+        "sessions, logoff before login, missing calendar, overlapping sessions, "
+        "declared operators without session) and store them as integrity issues."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--check", action="append", choices=KINDS, help="Check to run (repeatable, default: all).")
+        parser.add_argument("--since", help="Only rows from this date (YYYY-MM-DD, default: full history).")
+
+    def handle(self, *args, **options):
+        date_from = None
+        if options["since"]:
+            try:
+                date_from = datetime.strptime(options["since"], "%Y-%m-%d").date()
+            except ValueError:
+                raise CommandError("--since must be YYYY-MM-DD.")
+
+        result = scan(kinds=options["check"], date_from=date_from)
+
+        total = 0
+        for kind, (found, new, resolved) in result.items():
+            total += found
+            self.stdout.write(f"- {kind}: {found} open ({new} new, {resolved} resolved)")
+
+        if total:
+            self.stdout.write(self.style.WARNING(f"{total} open issue(s)."))
+        else:
+            self.stdout.write(self.style.SUCCESS("No issues found."))
@@ -3,6 +3,7 @@
 from django.core.management.base import BaseCommand
 from django.db import connections
 
+from core.badges import invalidate_badge_index
 from core.models import Operator
 
 
@@ -52,6 +53,9 @@ class Command(BaseCommand):
                     else:
                         updated += 1
 
+            # web workers reload the badge index on next scan
+            invalidate_badge_index()
+
             self.stdout.write(
                 f"Sync finished. Created {created} operator(s), updated {updated} operator(s)."
             )
@@ -36,7 +36,8 @@ class Command(BaseCommand):
         now = timezone.localtime()
         safe_log(f"[{now}] --- PRO sync task started ---")
 
-        pros_qs = Pro.objects.filter(status=True)
+        # zavrseni PRO-ovi (core.pro_completion) se vise ne sinhronizuju
+        pros_qs = Pro.objects.filter(status=True, completed_at__isnull=True)
 
         total = pros_qs.count()
         updated = 0
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.13 on 2026-10-19 13:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0028_downtimedeclaration'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='operator',
+            name='badge_norm',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=50, verbose_name='Badge Number (normalized)'),
+        ),
+        # backfill for existing operators (same rule as core.models.normalize_badge)
+        migrations.RunSQL(
+            sql="UPDATE core_operator SET badge_norm = UPPER(LTRIM(RTRIM(badge_num)))",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.0.13 on 2026-10-19 13:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def backfill_counters(apps, schema_editor):
+    # same aggregation as core.output_counters.raw_counters, for all dates
+    Declaration = apps.get_model('core', 'Declaration')
+    TeamOutputCounter = apps.get_model('core', 'TeamOutputCounter')
+
+    rows = (
+        Declaration.objects
+        .values('teamuser_id', 'decl_date', 'operators__id', 'routing_operation_id')
+        .annotate(total_qty=Sum('qty'))
+        .order_by()
+    )
+    TeamOutputCounter.objects.bulk_create([
+        TeamOutputCounter(
+            team_user_id=r['teamuser_id'],
+            date=r['decl_date'],
+            operator_id=r['operators__id'],
+            routing_operation_id=r['routing_operation_id'],
+            qty=r['total_qty'],
+        )
+        for r in rows
+        if r['total_qty']
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0029_operator_badge_norm'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TeamOutputCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('qty', models.IntegerField(default=0, verbose_name='Quantity')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('operator', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='output_counters', to='core.operator', verbose_name='Operator')),
+                ('routing_operation', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='output_counters', to='core.routingoperation', verbose_name='Routing operation')),
+                ('team_user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='output_counters', to=settings.AUTH_USER_MODEL, verbose_name='Team user')),
+            ],
+            options={
+                'verbose_name': 'Team output counter',
+                'verbose_name_plural': 'Team output counters',
+                'ordering': ['-date', 'team_user'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='teamoutputcounter',
+            constraint=models.UniqueConstraint(fields=('team_user', 'date', 'operator', 'routing_operation'), name='unique_team_output_counter'),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
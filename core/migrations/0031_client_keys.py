@@ -0,0 +1,23 @@
+# Generated by Django 5.0.13 on 2026-10-19 13:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0030_team_output_counter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='declaration',
+            name='client_key',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, unique=True, verbose_name='Client key'),
+        ),
+        migrations.AddField(
+            model_name='downtimedeclaration',
+            name='client_key',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, unique=True, verbose_name='Client key'),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.0.13 on 2026-10-19 13:39
+
+from django.db import migrations, models
+from django.db.models import Count, Exists, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_readiness(apps, schema_editor):
+    # same values as core.routings.recompute_ready / refresh_pro_routing_flags
+    Routing = apps.get_model('core', 'Routing')
+    RoutingOperation = apps.get_model('core', 'RoutingOperation')
+    ProSubdepartment = apps.get_model('core', 'ProSubdepartment')
+
+    def op_count(**filters):
+        return Coalesce(
+            Subquery(
+                RoutingOperation.objects
+                .filter(routing=OuterRef('pk'), **filters)
+                .order_by()
+                .values('routing')
+                .annotate(c=Count('id'))
+                .values('c'),
+                output_field=IntegerField(),
+            ),
+            Value(0),
+        )
+
+    Routing.objects.update(
+        operation_count=op_count(),
+        final_operation_count=op_count(final_operation=True),
+    )
+
+    routing_exists = Routing.objects.filter(
+        sku=OuterRef('pro__sku'),
+        subdepartment=OuterRef('subdepartment'),
+    )
+    links = [
+        link
+        for link in ProSubdepartment.objects.annotate(found=Exists(routing_exists))
+        if link.found
+    ]
+    for link in links:
+        link.has_routing = True
+    ProSubdepartment.objects.bulk_update(links, ['has_routing'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0031_client_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prosubdepartment',
+            name='has_routing',
+            field=models.BooleanField(db_index=True, default=False, editable=False, verbose_name='Has routing'),
+        ),
+        migrations.AddField(
+            model_name='routing',
+            name='final_operation_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Final operations'),
+        ),
+        migrations.AddField(
+            model_name='routing',
+            name='operation_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Operations'),
+        ),
+        migrations.RunPython(backfill_readiness, migrations.RunPython.noop),
+    ]
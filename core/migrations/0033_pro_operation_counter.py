@@ -0,0 +1,58 @@
+# Generated by Django 5.0.13 on 2026-10-19 13:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def backfill_counters(apps, schema_editor):
+    # same aggregation as core.wip.raw_counters, for all PROs
+    Declaration = apps.get_model('core', 'Declaration')
+    ProOperationCounter = apps.get_model('core', 'ProOperationCounter')
+
+    rows = (
+        Declaration.objects
+        .filter(routing_operation__isnull=False)
+        .values('pro_id', 'routing_operation_id')
+        .annotate(total_qty=Sum('qty'))
+        .order_by()
+    )
+    ProOperationCounter.objects.bulk_create([
+        ProOperationCounter(
+            pro_id=r['pro_id'],
+            routing_operation_id=r['routing_operation_id'],
+            qty=r['total_qty'],
+        )
+        for r in rows
+        if r['total_qty']
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0032_routing_readiness'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProOperationCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('qty', models.IntegerField(default=0, verbose_name='Quantity')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('pro', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='operation_counters', to='core.pro', verbose_name='PRO')),
+                ('routing_operation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pro_counters', to='core.routingoperation', verbose_name='Routing operation')),
+            ],
+            options={
+                'verbose_name': 'PRO operation counter',
+                'verbose_name_plural': 'PRO operation counters',
+                'ordering': ['pro', 'routing_operation'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='prooperationcounter',
+            constraint=models.UniqueConstraint(fields=('pro', 'routing_operation'), name='unique_pro_operation_counter'),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
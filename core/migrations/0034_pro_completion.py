@@ -0,0 +1,64 @@
+# Generated by Django 5.0.13 on 2026-10-19 13:46
+
+from django.db import migrations, models
+from django.db.models import Sum
+from django.utils import timezone
+
+
+def backfill_completion(apps, schema_editor):
+    # same rule as core.pro_completion.refresh_completion (flag only, PRO status is not changed)
+    Pro = apps.get_model('core', 'Pro')
+    ProSubdepartment = apps.get_model('core', 'ProSubdepartment')
+    ProOperationCounter = apps.get_model('core', 'ProOperationCounter')
+
+    output = {
+        (r['pro_id'], r['routing_operation__routing__subdepartment_id']): r['total']
+        for r in (
+            ProOperationCounter.objects
+            .filter(routing_operation__final_operation=True)
+            .order_by()
+            .values('pro_id', 'routing_operation__routing__subdepartment_id')
+            .annotate(total=Sum('qty'))
+        )
+    }
+
+    links = []
+    links_done = {}
+    for link in ProSubdepartment.objects.select_related('pro'):
+        link.completed_qty = output.get((link.pro_id, link.subdepartment_id), 0)
+        link.done = bool(link.pro.qty) and link.completed_qty >= link.pro.qty
+        links.append(link)
+        if link.active:
+            links_done[link.pro_id] = links_done.get(link.pro_id, True) and link.done
+    ProSubdepartment.objects.bulk_update(links, ['completed_qty', 'done'], batch_size=500)
+
+    complete_ids = [pro_id for pro_id, done in links_done.items() if done]
+    now = timezone.now()
+    for i in range(0, len(complete_ids), 1000):
+        Pro.objects.filter(pk__in=complete_ids[i:i + 1000]).update(completed_at=now)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0033_pro_operation_counter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pro',
+            name='completed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Completed at'),
+        ),
+        migrations.AddField(
+            model_name='prosubdepartment',
+            name='completed_qty',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Completed qty'),
+        ),
+        migrations.AddField(
+            model_name='prosubdepartment',
+            name='done',
+            field=models.BooleanField(db_index=True, default=False, editable=False, verbose_name='Done'),
+        ),
+        migrations.RunPython(backfill_completion, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.13 on 2026-10-19 13:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0034_pro_completion'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='loginoperator',
+            name='login_team_date',
+            field=models.DateField(db_index=True, verbose_name='Login team date'),
+        ),
+    ]
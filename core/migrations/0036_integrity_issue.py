@@ -0,0 +1,34 @@
+# Generated by Django 5.0.13 on 2026-10-19 13:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0035_login_team_date_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IntegrityIssue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('stale_active', 'Session still ACTIVE from a previous day'), ('logoff_before_login', 'Logoff not after login'), ('no_calendar', 'Session without calendar entry'), ('session_overlap', 'Overlapping sessions of an operator'), ('operator_without_session', 'Declared operator without session')], db_index=True, max_length=30, verbose_name='Check')),
+                ('key', models.CharField(max_length=100, unique=True, verbose_name='Key')),
+                ('day', models.DateField(blank=True, null=True, verbose_name='Date')),
+                ('detail', models.CharField(blank=True, max_length=255, verbose_name='Detail')),
+                ('first_seen_at', models.DateTimeField(verbose_name='First seen')),
+                ('last_seen_at', models.DateTimeField(verbose_name='Last seen')),
+                ('resolved_at', models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='Resolved')),
+                ('declaration', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='integrity_issues', to='core.declaration', verbose_name='Declaration')),
+                ('login_operator', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='integrity_issues', to='core.loginoperator', verbose_name='Login operator')),
+            ],
+            options={
+                'verbose_name': 'Integrity issue',
+                'verbose_name_plural': 'Integrity issues',
+                'ordering': ['-day', 'kind', 'id'],
+            },
+        ),
+    ]
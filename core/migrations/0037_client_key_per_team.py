@@ -0,0 +1,31 @@
+# Generated by Django 5.0.13 on 2026-10-19 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0036_integrity_issue'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='declaration',
+            name='client_key',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, verbose_name='Client key'),
+        ),
+        migrations.AlterField(
+            model_name='downtimedeclaration',
+            name='client_key',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64, null=True, verbose_name='Client key'),
+        ),
+        migrations.AddConstraint(
+            model_name='declaration',
+            constraint=models.UniqueConstraint(condition=models.Q(('client_key__isnull', False)), fields=('teamuser', 'client_key'), name='unique_declaration_team_client_key'),
+        ),
+        migrations.AddConstraint(
+            model_name='downtimedeclaration',
+            constraint=models.UniqueConstraint(condition=models.Q(('client_key__isnull', False)), fields=('login_operator', 'client_key'), name='unique_downtime_declaration_client_key'),
+        ),
+    ]
@@ -114,12 +114,27 @@ class Calendar(models.Model):
         return f"{self.date} - {self.team_user} ({self.shift_start}–{self.shift_end})"
 
 
+def normalize_badge(badge_num):
+    """
+    Canonical badge form used for lookups (trimmed, upper-case).
+    """
+    return (badge_num or "").strip().upper()
+
+
 class Operator(models.Model):
     badge_num = models.CharField(
         max_length=50,
         unique=True,
         verbose_name="Badge Number",
     )
+    # normalized badge_num (upper-case) - indexed exact match instead of badge_num__iexact
+    badge_norm = models.CharField(
+        max_length=50,
+        db_index=True,
+        editable=False,
+        default="",
+        verbose_name="Badge Number (normalized)",
+    )
     name = models.CharField(max_length=100, verbose_name="Name")
     act = models.BooleanField(default=True, verbose_name="Active")
     pin_code = models.CharField(max_length=20, verbose_name="Pin Code")
@@ -133,6 +148,15 @@ class Operator(models.Model):
         verbose_name_plural = "Operators"
         ordering = ["badge_num"]
 
+    def save(self, *args, **kwargs):
+        self.badge_norm = normalize_badge(self.badge_num)
+
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "badge_num" in update_fields:
+            kwargs["update_fields"] = set(update_fields) | {"badge_norm"}
+
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.badge_num} - {self.name}"
 
@@ -166,6 +190,13 @@ class Pro(models.Model):
         default=True,
         verbose_name="Active",
     )
+    # all active subdepartments reached qty on their final operation (core.pro_completion)
+    completed_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="Completed at",
+    )
     destination = models.CharField(
         max_length=100,
         verbose_name="Destination",
@@ -209,6 +240,13 @@ class ProSubdepartment(models.Model):
     )
     active = models.BooleanField(default=True, verbose_name="Active")
 
+    # a Routing exists for pro.sku + subdepartment (core.routings.refresh_pro_routing_flags)
+    has_routing = models.BooleanField(default=False, editable=False, db_index=True, verbose_name="Has routing")
+
+    # final operation output of the subdepartment, done = reached Pro.qty (core.pro_completion)
+    completed_qty = models.PositiveIntegerField(default=0, editable=False, verbose_name="Completed qty")
+    done = models.BooleanField(default=False, editable=False, db_index=True, verbose_name="Done")
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -261,6 +299,18 @@ class Routing(models.Model):
         verbose_name="Ready",
     )
 
+    # denormalized from routing operations (core.routings.recompute_ready)
+    operation_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Operations",
+    )
+    final_operation_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Final operations",
+    )
+
     status = models.BooleanField(
         default=True,
         verbose_name="Active",
@@ -417,7 +467,7 @@ class LoginOperator(models.Model):
 
     # stvarno vreme (server)
     login_actual = models.DateTimeField(verbose_name='Login actual')
-    login_team_date = models.DateField(verbose_name='Login team date')
+    login_team_date = models.DateField(verbose_name='Login team date', db_index=True)
     login_team_time = models.TimeField(verbose_name='Login team time')
 
     logoff_actual = models.DateTimeField(
@@ -530,6 +580,16 @@ class Declaration(models.Model):
         verbose_name='Operators'
     )
 
+    # idempotency key generated by the terminal (offline queue / bulk ingest),
+    # unique per team user
+    client_key = models.CharField(
+        max_length=64,
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="Client key",
+    )
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -537,11 +597,115 @@ class Declaration(models.Model):
         verbose_name = "Declaration"
         verbose_name_plural = "Declarations"
         ordering = ['-decl_date', 'teamuser__username']
+        constraints = [
+            models.UniqueConstraint(
+                fields=["teamuser", "client_key"],
+                condition=models.Q(client_key__isnull=False),
+                name="unique_declaration_team_client_key",
+            )
+        ]
 
     def __str__(self):
         return f"Decl {self.id} - {self.pro} / {self.routing} / {self.qty}"
 
 
+
+# --------- TEAM OUTPUT COUNTER ---------
+
+class TeamOutputCounter(models.Model):
+    """
+    Declared qty per team user / day / operator / routing operation.
+    Maintained from Declaration writes (see core.output_counters), read by
+    the team dashboard. operator is NULL for TEAM type declarations.
+    """
+    team_user = models.ForeignKey(
+        TeamUser,
+        on_delete=models.CASCADE,
+        related_name="output_counters",
+        verbose_name="Team user",
+    )
+    date = models.DateField(
+        verbose_name="Date",
+    )
+    operator = models.ForeignKey(
+        Operator,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="output_counters",
+        verbose_name="Operator",
+    )
+    routing_operation = models.ForeignKey(
+        RoutingOperation,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="output_counters",
+        verbose_name="Routing operation",
+    )
+    qty = models.IntegerField(
+        default=0,
+        verbose_name="Quantity",
+    )
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Team output counter"
+        verbose_name_plural = "Team output counters"
+        ordering = ["-date", "team_user"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["team_user", "date", "operator", "routing_operation"],
+                name="unique_team_output_counter",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.date} - {self.team_user} / {self.operator} / {self.routing_operation}: {self.qty}"
+
+
+# --------- PRO OPERATION COUNTER (WIP) ---------
+
+class ProOperationCounter(models.Model):
+    """
+    Cumulative declared qty per PRO / routing operation (pieces that passed
+    the operation). Maintained from Declaration writes (see core.wip), read
+    by the PRO progress page.
+    """
+    pro = models.ForeignKey(
+        Pro,
+        on_delete=models.CASCADE,
+        related_name="operation_counters",
+        verbose_name="PRO",
+    )
+    routing_operation = models.ForeignKey(
+        RoutingOperation,
+        on_delete=models.CASCADE,
+        related_name="pro_counters",
+        verbose_name="Routing operation",
+    )
+    qty = models.IntegerField(
+        default=0,
+        verbose_name="Quantity",
+    )
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "PRO operation counter"
+        verbose_name_plural = "PRO operation counters"
+        ordering = ["pro", "routing_operation"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["pro", "routing_operation"],
+                name="unique_pro_operation_counter",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.pro} / {self.routing_operation}: {self.qty}"
+
 # --------- BREAK ---------
 
 class Break(models.Model):
@@ -718,6 +882,17 @@ class DowntimeDeclaration(models.Model):
         editable=False,
     )
 
+    # idempotency key generated by the terminal (offline queue), unique per
+    # login session (the team is reached through login_operator)
+    client_key = models.CharField(
+        max_length=64,
+        null=True,
+        blank=True,
+        editable=False,
+        db_index=True,
+        verbose_name="Client key",
+    )
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -727,6 +902,13 @@ class DowntimeDeclaration(models.Model):
         verbose_name = "Downtime Declaration"
         verbose_name_plural = "Downtime Declarations"
         ordering = ["-created_at"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["login_operator", "client_key"],
+                condition=models.Q(client_key__isnull=False),
+                name="unique_downtime_declaration_client_key",
+            )
+        ]
 
     def clean(self):
         super().clean()
@@ -752,3 +934,76 @@ class DowntimeDeclaration(models.Model):
             f"{self.downtime} | "
             f"{self.downtime_total} min"
         )
+
+
+# --------- DATA INTEGRITY ---------
+
+class IntegrityIssue(models.Model):
+    """
+    Data problem found by the integrity scanner (core.integrity,
+    scan_integrity command). One row per problem (kind + key); a later
+    scan that no longer finds it sets resolved_at.
+    """
+    KIND_CHOICES = (
+        ("stale_active", "Session still ACTIVE from a previous day"),
+        ("logoff_before_login", "Logoff not after login"),
+        ("no_calendar", "Session without calendar entry"),
+        ("session_overlap", "Overlapping sessions of an operator"),
+        ("operator_without_session", "Declared operator without session"),
+    )
+
+    kind = models.CharField(
+        max_length=30,
+        choices=KIND_CHOICES,
+        db_index=True,
+        verbose_name="Check",
+    )
+    # kind + ids of the rows involved (stable between scans)
+    key = models.CharField(
+        max_length=100,
+        unique=True,
+        verbose_name="Key",
+    )
+    day = models.DateField(
+        null=True,
+        blank=True,
+        verbose_name="Date",
+    )
+    login_operator = models.ForeignKey(
+        LoginOperator,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="integrity_issues",
+        verbose_name="Login operator",
+    )
+    declaration = models.ForeignKey(
+        Declaration,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="integrity_issues",
+        verbose_name="Declaration",
+    )
+    detail = models.CharField(
+        max_length=255,
+        blank=True,
+        verbose_name="Detail",
+    )
+
+    first_seen_at = models.DateTimeField(verbose_name="First seen")
+    last_seen_at = models.DateTimeField(verbose_name="Last seen")
+    resolved_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        db_index=True,
+        verbose_name="Resolved",
+    )
+
+    class Meta:
+        verbose_name = "Integrity issue"
+        verbose_name_plural = "Integrity issues"
+        ordering = ["-day", "kind", "id"]
+
+    def __str__(self):
+        return f"{self.get_kind_display()}: {self.detail}"
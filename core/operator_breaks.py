@@ -0,0 +1,79 @@
+# core/operator_breaks.py
+"""
+Break assignment (OperatorBreak) for many operators at once, shared by the
+team terminal (DeclareBreakSaveView) and the planner wizard
+(OperatorBreakWizardView).
+
+Rules (one break per operator / team / day):
+  1. no break yet            -> create
+  2. break for the same team -> overwrite break type
+  3. break for another team  -> conflict, nothing is saved
+"""
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from core.models import OperatorBreak
+
+
+def assign_breaks(team_user_id, day, operator_ids, break_type_id):
+    """
+    Assign a break to many operators of a team for a day.
+
+    One query reads all existing breaks of the operators for the day (other
+    team conflicts + rows to overwrite), then the rows are written with one
+    bulk_update and one bulk_create in a transaction.
+
+    Returns (conflicts, created_count, updated_count); `conflicts` is the
+    list of OperatorBreak rows of other teams (operator loaded) and nothing
+    is written when it is not empty.
+    """
+    operator_ids = list(dict.fromkeys(int(op_id) for op_id in operator_ids))
+
+    try:
+        with transaction.atomic():
+            return _assign(team_user_id, day, operator_ids, break_type_id)
+    except IntegrityError:
+        # break created concurrently for one of the operators -> read again, overwrite
+        with transaction.atomic():
+            return _assign(team_user_id, day, operator_ids, break_type_id)
+
+
+def _assign(team_user_id, day, operator_ids, break_type_id):
+    existing = list(
+        OperatorBreak.objects
+        .filter(operator_id__in=operator_ids, date=day)
+        .select_for_update()
+    )
+
+    conflict_ids = [ob.pk for ob in existing if ob.team_user_id != team_user_id]
+    if conflict_ids:
+        conflicts = list(
+            OperatorBreak.objects.filter(pk__in=conflict_ids).select_related("operator").order_by("operator__badge_num")
+        )
+        return conflicts, 0, 0
+
+    now = timezone.now()
+    to_update = []
+    for ob in existing:
+        ob.break_type_id = break_type_id
+        ob.updated_at = now
+        to_update.append(ob)
+
+    existing_ops = {ob.operator_id for ob in existing}
+    to_create = [
+        OperatorBreak(
+            date=day,
+            operator_id=op_id,
+            team_user_id=team_user_id,
+            break_type_id=break_type_id,
+        )
+        for op_id in operator_ids
+        if op_id not in existing_ops
+    ]
+
+    if to_update:
+        OperatorBreak.objects.bulk_update(to_update, ["break_type", "updated_at"])
+    if to_create:
+        OperatorBreak.objects.bulk_create(to_create)
+
+    return [], len(to_create), len(to_update)
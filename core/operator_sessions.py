@@ -0,0 +1,204 @@
+# core/operator_sessions.py
+"""
+Operator login/logout rules (team time, grace period, IGNORE/COMPLETED)
+shared by the team terminal and planner views.
+"""
+from datetime import datetime, timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from core.badges import resolve_badges
+from core.models import LoginOperator, normalize_badge
+from core.shifts import get_shift, load_shifts
+
+
+def login_block_reason(shift, current_time):
+    """
+    Error message if operators can't be logged in to this shift right now, else None.
+    """
+    if not shift:
+        return "You cannot log in operators – no shift found in Calendar for today."
+    if current_time > shift.shift_end:
+        return "You cannot log in operators after the end of the shift."
+    return None
+
+
+def login_team_time(shift, current_date, current_time, grace_minutes):
+    """
+    Team login time:
+      - before shift start or inside the grace period -> shift_start
+      - after the grace period -> actual local time
+    """
+    shift_start_dt = datetime.combine(current_date, shift.shift_start)
+    grace_limit_dt = shift_start_dt + timedelta(minutes=grace_minutes or 0)
+    current_dt = datetime.combine(current_date, current_time)
+
+    if current_dt <= grace_limit_dt:
+        return shift.shift_start
+    return current_time
+
+
+def close_session(session, now, shift):
+    """
+    Fill logoff fields + status of an ACTIVE session (not saved).
+
+      - login and logout before shift start -> IGNORE, team time = shift_start
+      - during shift -> COMPLETED, team time = actual
+      - after shift -> COMPLETED, team time = shift_end
+      - session of an earlier day whose shift is over (stale ACTIVE) ->
+        COMPLETED at the shift end of its own day
+      - no shift -> COMPLETED, actual local date/time
+
+    `shift` is the shift of the session's team on its login_team_date.
+    """
+    local_now = timezone.localtime(now)
+    current_time = local_now.time()
+
+    session.logoff_actual = now  # UTC
+
+    if shift:
+        login_local_time = timezone.localtime(session.login_actual).time()
+        session.logoff_team_date = shift.date
+
+        shift_end_dt = datetime.combine(shift.date, shift.shift_end)
+        if shift.shift_end <= shift.shift_start:
+            shift_end_dt += timedelta(days=1)  # noćna smena
+
+        if local_now.date() > shift.date and local_now.replace(tzinfo=None) >= shift_end_dt:
+            session.logoff_team_date = shift_end_dt.date()
+            session.logoff_team_time = shift.shift_end
+            session.status = "COMPLETED"
+        elif login_local_time < shift.shift_start and current_time < shift.shift_start:
+            session.logoff_team_time = shift.shift_start
+            session.status = "IGNORE"
+        else:
+            session.logoff_team_time = min(current_time, shift.shift_end)
+            session.status = "COMPLETED"
+    else:
+        session.logoff_team_date = local_now.date()
+        session.logoff_team_time = current_time
+        session.status = "COMPLETED"
+
+    session.updated_at = now
+    return session
+
+
+CLOSE_FIELDS = ["logoff_actual", "logoff_team_date", "logoff_team_time", "status", "updated_at"]
+
+
+def batch_login(team_user, badge_nums, now=None):
+    """
+    Log in many badges to `team_user` in one go.
+
+    Uses a constant number of queries regardless of the number of badges:
+    badge resolve, ACTIVE sessions lookup, one bulk_update for sessions
+    auto-closed in other teams and one bulk_create for the new sessions.
+
+    Returns (error, results). `error` is set when the shift doesn't allow
+    logins; `results` has one dict per submitted badge:
+      {"badge", "operator", "status", "message"}
+    with status one of: logged_in, moved, already_logged_in, duplicate, not_found.
+    """
+    now = now or timezone.now()
+    local_now = timezone.localtime(now)
+    current_date = local_now.date()
+    current_time = local_now.time()
+
+    shift = get_shift(team_user, current_date)
+    error = login_block_reason(shift, current_time)
+    if error:
+        return error, []
+
+    badges = [b.strip() for b in badge_nums if b and b.strip()]
+    entries = resolve_badges(badges)
+
+    operator_ids = {e.id for e in entries.values() if e is not None}
+    active_by_operator = {}
+    for s in LoginOperator.objects.filter(
+        operator_id__in=operator_ids,
+        status="ACTIVE",
+        login_team_date=current_date,
+    ):
+        active_by_operator.setdefault(s.operator_id, []).append(s)
+
+    # all other teams' shifts for today (same cached day as our own shift)
+    shifts_today = load_shifts(current_date)
+    team_time = login_team_time(shift, current_date, current_time, team_user.login_grace_period)
+
+    results = []
+    seen = set()
+    to_close = []
+    to_create = []
+
+    for badge in badges:
+        key = normalize_badge(badge)
+        operator = entries.get(key)
+        row = {"badge": badge, "operator": operator}
+
+        if operator is None:
+            row.update(status="not_found", message="Operator not found or not active.")
+        elif operator.id in seen:
+            row.update(status="duplicate", message="Badge scanned more than once.")
+        else:
+            seen.add(operator.id)
+            sessions = active_by_operator.get(operator.id, [])
+
+            if any(s.team_user_id == team_user.pk for s in sessions):
+                row.update(
+                    status="already_logged_in",
+                    message="This operator is already logged in this team today.",
+                )
+            else:
+                for s in sessions:
+                    to_close.append(close_session(s, now, shifts_today.get(s.team_user_id)))
+
+                to_create.append(LoginOperator(
+                    operator_id=operator.id,
+                    team_user=team_user,
+                    login_actual=now,
+                    login_team_date=shift.date,
+                    login_team_time=team_time,
+                ))
+                if sessions:
+                    row.update(status="moved", message="Logged out from another team and logged in.")
+                else:
+                    row.update(status="logged_in", message="Logged in.")
+
+        results.append(row)
+
+    with transaction.atomic():
+        if to_close:
+            LoginOperator.objects.bulk_update(to_close, CLOSE_FIELDS)
+        if to_create:
+            LoginOperator.objects.bulk_create(to_create)
+
+    return None, results
+
+
+def bulk_logout(sessions, now=None):
+    """
+    Close many ACTIVE sessions in one go with the same rules as the single
+    logout (close_session).
+
+    `sessions` is a LoginOperator queryset; only its ACTIVE rows are closed.
+    Every session is closed with the shift of its own team and
+    login_team_date (stale sessions of earlier days included): shifts of all
+    teams are read once per distinct login date and the sessions are
+    written with one bulk_update.
+
+    Returns the list of closed sessions (status set to IGNORE / COMPLETED).
+    """
+    now = now or timezone.now()
+
+    with transaction.atomic():
+        active = list(sessions.filter(status="ACTIVE").select_for_update())
+        shifts = {day: load_shifts(day) for day in {s.login_team_date for s in active}}
+        closed = [
+            close_session(s, now, shifts[s.login_team_date].get(s.team_user_id))
+            for s in active
+        ]
+        if closed:
+            LoginOperator.objects.bulk_update(closed, CLOSE_FIELDS)
+
+    return closed
@@ -0,0 +1,203 @@
+# core/output_counters.py
+"""
+Team output counters: declared qty per (team_user, date, operator,
+routing_operation), kept in TeamOutputCounter.
+
+Every Declaration write (save, operators change, delete) applies the
+difference between the old and the new contribution of that declaration,
+in the same transaction as the write (receivers in core.signals).
+Each operator of a declaration gets the full qty (same as the dashboard
+join through the operators M2M); declarations without operators are
+counted with operator = NULL.
+
+reconcile_output_counters (management command) compares the counters with
+the raw declarations and rebuilds them on request.
+"""
+from collections import Counter, defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+
+from core.models import Declaration, TeamOutputCounter
+
+
+def _keys(team_user_id, date, operator_ids, routing_operation_id):
+    return [
+        (team_user_id, date, op_id, routing_operation_id)
+        for op_id in (operator_ids or [None])
+    ]
+
+
+def declaration_contribution(decl, operator_ids=None):
+    """
+    {(team_user_id, date, operator_id, routing_operation_id): qty} for one declaration.
+    Operators are read from the DB unless given.
+    """
+    if decl.pk is None:
+        return Counter()
+    if operator_ids is None:
+        operator_ids = list(decl.operators.values_list("id", flat=True))
+
+    result = Counter()
+    for key in _keys(decl.teamuser_id, decl.decl_date, operator_ids, decl.routing_operation_id):
+        result[key] += decl.qty or 0
+    return result
+
+
+def stored_contribution(decl_id):
+    """
+    Contribution of a declaration as it is currently stored in the DB.
+    """
+    decl = Declaration.objects.filter(pk=decl_id).first()
+    return declaration_contribution(decl) if decl else Counter()
+
+
+def apply_deltas(deltas):
+    """
+    Add {key: delta} to the counters (rows are created on first use,
+    rows that drop to 0 are removed).
+    """
+    deltas = {k: v for k, v in deltas.items() if v}
+    if not deltas:
+        return
+
+    with transaction.atomic():
+        for (team_user_id, date, operator_id, ro_id), delta in deltas.items():
+            lookup = dict(
+                team_user_id=team_user_id,
+                date=date,
+                operator_id=operator_id,
+                routing_operation_id=ro_id,
+            )
+            if TeamOutputCounter.objects.filter(**lookup).update(qty=F("qty") + delta):
+                continue
+            try:
+                with transaction.atomic():
+                    TeamOutputCounter.objects.create(qty=delta, **lookup)
+            except IntegrityError:
+                # row created by a concurrent write in the meantime
+                TeamOutputCounter.objects.filter(**lookup).update(qty=F("qty") + delta)
+
+        for team_user_id, date in {(k[0], k[1]) for k in deltas}:
+            TeamOutputCounter.objects.filter(team_user_id=team_user_id, date=date, qty=0).delete()
+
+
+def apply_change(before, after):
+    """
+    Apply the difference of two contributions (old -> new).
+    """
+    deltas = Counter(after)
+    deltas.subtract(before)
+    apply_deltas(deltas)
+
+
+def add_declarations(declarations, operator_ids_by_decl=None):
+    """
+    Count many new declarations at once (bulk_create paths, no signals).
+    operator_ids_by_decl: {decl_id: [operator ids]}.
+    """
+    operator_ids_by_decl = operator_ids_by_decl or {}
+    deltas = Counter()
+    for decl in declarations:
+        deltas.update(declaration_contribution(decl, operator_ids_by_decl.get(decl.pk, [])))
+    apply_deltas(deltas)
+
+
+# ---------- reconciliation ----------
+
+def raw_counters(date_from, date_to):
+    """
+    Counters computed from the Declaration table for a date range.
+    """
+    rows = (
+        Declaration.objects
+        .filter(decl_date__range=(date_from, date_to))
+        .values("teamuser_id", "decl_date", "operators__id", "routing_operation_id")
+        .annotate(total_qty=Sum("qty"))
+        .order_by()
+    )
+    return {
+        (r["teamuser_id"], r["decl_date"], r["operators__id"], r["routing_operation_id"]): r["total_qty"]
+        for r in rows
+        if r["total_qty"]
+    }
+
+
+def stored_counters(date_from, date_to):
+    rows = (
+        TeamOutputCounter.objects
+        .filter(date__range=(date_from, date_to))
+        .exclude(qty=0)
+        .values_list("team_user_id", "date", "operator_id", "routing_operation_id", "qty")
+    )
+    return {(tu, d, op, ro): qty for tu, d, op, ro, qty in rows}
+
+
+def compare_counters(date_from, date_to):
+    """
+    List of (key, stored_qty, raw_qty) where the counters differ from the raw data.
+    """
+    raw = raw_counters(date_from, date_to)
+    stored = stored_counters(date_from, date_to)
+    return [
+        (key, stored.get(key, 0), raw.get(key, 0))
+        for key in sorted(set(raw) | set(stored), key=str)
+        if stored.get(key, 0) != raw.get(key, 0)
+    ]
+
+
+def rebuild_counters(date_from, date_to):
+    """
+    Replace the counters of a date range with values computed from the raw data.
+    Returns the number of counter rows written.
+    """
+    with transaction.atomic():
+        raw = raw_counters(date_from, date_to)
+        TeamOutputCounter.objects.filter(date__range=(date_from, date_to)).delete()
+        TeamOutputCounter.objects.bulk_create([
+            TeamOutputCounter(
+                team_user_id=tu,
+                date=d,
+                operator_id=op,
+                routing_operation_id=ro,
+                qty=qty,
+            )
+            for (tu, d, op, ro), qty in raw.items()
+        ], batch_size=500)
+    return len(raw)
+
+
+def dashboard_rows(team_user, day):
+    """
+    Rows for the team dashboard table, grouped per operator:
+      [{"badge", "name", "operations": [{"operation", "qty"}], "total"}]
+    """
+    rows = (
+        TeamOutputCounter.objects
+        .filter(team_user=team_user, date=day, qty__gt=0)
+        .values(
+            "operator_id",
+            "operator__badge_num",
+            "operator__name",
+            "routing_operation__operation__name",
+        )
+        .annotate(total_qty=Sum("qty"))
+        .order_by("operator__name", "routing_operation__operation__name")
+    )
+
+    op_data = defaultdict(lambda: {"badge": "", "name": "", "operations": [], "total": 0})
+    for row in rows:
+        key = row["operator_id"] if row["operator_id"] is not None else "__team__"
+        if key == "__team__":
+            op_data[key]["badge"] = "-"
+            op_data[key]["name"] = "(Team)"
+        else:
+            op_data[key]["badge"] = row["operator__badge_num"] or ""
+            op_data[key]["name"] = row["operator__name"] or ""
+        op_data[key]["operations"].append({
+            "operation": row["routing_operation__operation__name"] or "-",
+            "qty": row["total_qty"],
+        })
+        op_data[key]["total"] += row["total_qty"]
+
+    return list(op_data.values())
@@ -0,0 +1,148 @@
+# core/output_timeline.py
+"""
+Hourly output timeline of a team for a day: pieces and earned SMV minutes
+(smv x qty) per shift hour of the declarations of that day (decl_date),
+bucketed by Declaration.created_at.
+
+Declarations entered late (planner wizard, file import, offline queue) are
+charted at the hour they were entered: on their own day when that is
+today, not at all when they are back-dated to a past day (the past day's
+shift window is already over).
+
+Buckets come from one grouped query (Trunc to the hour in the local time
+zone). Closed hours can't get new declarations (created_at is set on
+insert), so their buckets are kept in the shared cache and only the hours
+not cached yet plus the current hour are queried on refresh. Editing or
+deleting a declaration of a closed hour bumps the version of its team /
+decl_date (core.signals), which drops the cached hours.
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import F, Sum
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+from core.caching import bump_version, get_version
+from core.models import Declaration
+from core.shifts import get_shift
+
+
+CACHE_TIMEOUT = 2 * 24 * 60 * 60
+HOUR = timedelta(hours=1)
+
+
+def _version_name(team_user_id, day):
+    return f"team_timeline:{team_user_id}:{day.isoformat()}"
+
+
+def invalidate_timeline(team_user_id, day, created_at):
+    """
+    Drop cached hours of the team / decl_date of a declaration that was
+    changed after its hour closed (no-op for the current hour).
+    """
+    if created_at is None or day is None:
+        return
+    local = timezone.localtime(created_at)
+    if local.replace(minute=0, second=0, microsecond=0) + HOUR <= timezone.localtime():
+        bump_version(_version_name(team_user_id, day))
+
+
+def _window(team_user, day):
+    """
+    (first hour start, end) of the shift in local time; whole day when the
+    team has no calendar entry.
+    """
+    tz = timezone.get_current_timezone()
+    shift = get_shift(team_user, day)
+    if shift is None:
+        start = datetime.combine(day, time(0, 0))
+        return timezone.make_aware(start, tz), timezone.make_aware(start + timedelta(days=1), tz), False
+
+    start = datetime.combine(day, time(shift.shift_start.hour))
+    end = datetime.combine(day, shift.shift_end)
+    if shift.shift_end <= shift.shift_start:
+        end += timedelta(days=1)  # noćna smena
+    return timezone.make_aware(start, tz), timezone.make_aware(end, tz), True
+
+
+def _buckets(team_user_id, day, start, end):
+    """
+    {hour start (local, aware): (pieces, minutes)} for declarations of `day`
+    with created_at in [start, end).
+    """
+    rows = (
+        Declaration.objects
+        .filter(teamuser_id=team_user_id, decl_date=day, created_at__gte=start, created_at__lt=end)
+        .annotate(hour=Trunc("created_at", "hour", tzinfo=timezone.get_current_timezone()))
+        .order_by()
+        .values("hour")
+        .annotate(pieces=Sum("qty"), minutes=Sum(F("smv") * F("qty")))
+    )
+    return {
+        timezone.localtime(row["hour"]): (row["pieces"] or 0, Decimal(row["minutes"] or 0))
+        for row in rows
+    }
+
+
+def team_timeline(team_user, day):
+    """
+    {"day", "has_shift", "hours": [{"start", "pieces", "minutes", "state"}],
+     "total_pieces", "total_minutes"}; state is closed / current / future.
+    """
+    start, end, has_shift = _window(team_user, day)
+    now = timezone.localtime()
+
+    hours = []
+    hour = start
+    while hour < end:
+        hours.append(hour)
+        hour += HOUR
+
+    cache_key = f"{_version_name(team_user.pk, day)}:{get_version(_version_name(team_user.pk, day))}"
+    closed = cache.get(cache_key) or {}
+
+    # not cached closed hours + the current hour, one query
+    todo = [h for h in hours if h <= now and h.isoformat() not in closed]
+    fresh = {}
+    if todo:
+        fresh = _buckets(team_user.pk, day, todo[0], min(todo[-1] + HOUR, end))
+        newly_closed = {
+            h.isoformat(): [fresh.get(h, (0, 0))[0], str(fresh.get(h, (0, Decimal("0")))[1])]
+            for h in todo
+            if h + HOUR <= now
+        }
+        if newly_closed:
+            closed.update(newly_closed)
+            cache.set(cache_key, closed, CACHE_TIMEOUT)
+
+    rows = []
+    for h in hours:
+        if h > now:
+            state, pieces, minutes = "future", 0, Decimal("0")
+        elif h.isoformat() in closed and h + HOUR <= now:
+            state = "closed"
+            pieces, minutes = closed[h.isoformat()][0], Decimal(closed[h.isoformat()][1])
+        else:
+            state = "current"
+            pieces, minutes = fresh.get(h, (0, Decimal("0")))
+        rows.append({
+            "start": h.strftime("%H:%M"),
+            "pieces": pieces,
+            "minutes": float(round(minutes, 1)),
+            "state": state,
+        })
+
+    if not has_shift:
+        # no calendar entry -> only the hours with output
+        active = [i for i, r in enumerate(rows) if r["pieces"]]
+        rows = rows[active[0]:active[-1] + 1] if active else []
+
+    return {
+        "day": day.isoformat(),
+        "has_shift": has_shift,
+        "hours": rows,
+        "total_pieces": sum(r["pieces"] for r in rows),
+        "total_minutes": round(sum(r["minutes"] for r in rows), 1),
+    }
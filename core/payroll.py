@@ -0,0 +1,263 @@
+# core/payroll.py
+"""
+Piecework / earned minutes report per operator and period.
+
+  earned minutes    = sum(SMV x qty) of the declarations the operator took
+                      part in, split between co-operators by SPLIT_RULES
+  available minutes = login sessions - breaks - downtime
+  efficiency        = earned / available x 100
+
+Everything is aggregated in the database: grouped queries for earned
+minutes (declaration <-> operator rows), sessions, breaks and downtime;
+Python only merges the grouped rows (operators x periods).
+
+The "equal" split needs the co-operator count of every declaration.
+MSSQL can't aggregate over a subquery (error 130), so the count is only
+used in WHERE: one grouped query per distinct co-operator count (a few,
+team sizes) and the sums are divided by that count outside the aggregate.
+
+Session minutes are computed from login / logoff team time with
+Extract(hour / minute), so the same expression works on MSSQL and SQLite;
+a session that ends on the next day gets +24 h.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Case, Count, DecimalField, ExpressionWrapper, F, IntegerField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, ExtractHour, ExtractMinute, Trunc
+
+from core.models import Declaration, DowntimeDeclaration, LoginOperator, Operator
+
+
+SPLIT_RULES = {
+    "equal": "Split equally between co-operators",
+    "full": "Full minutes to every operator",
+}
+SMV_BASES = {
+    "smv": "SMV",
+    "smv_ita": "SMV ITA (SMV when missing)",
+}
+PERIODS = {
+    "day": "Day",
+    "week": "Week",
+    "month": "Month",
+    "range": "Whole range",
+}
+
+PAYROLL_STATUSES = ["ACTIVE", "COMPLETED"]
+
+MINUTES = DecimalField(max_digits=18, decimal_places=4)
+
+EXPORT_HEADER = [
+    "Period from", "Period to", "Badge", "Operator", "Pieces", "Earned (min)",
+    "Sessions (min)", "Break (min)", "Downtime (min)", "Available (min)", "Efficiency %",
+]
+
+
+def default_split_rule():
+    rule = getattr(settings, "PAYROLL_SPLIT_RULE", "equal")
+    return rule if rule in SPLIT_RULES else "equal"
+
+
+def _period(field, period, date_from):
+    """
+    Expression for the first day of the period of `field`.
+    """
+    if period == "range":
+        return Value(date_from)
+    return Trunc(field, period)
+
+
+def _period_end(start, period, date_from, date_to):
+    if period == "day":
+        end = start
+    elif period == "week":
+        end = start + timedelta(days=6)
+    elif period == "month":
+        end = (start.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+    else:
+        end = date_to
+    return max(start, date_from), min(end, date_to)
+
+
+def _minute_of_day(field):
+    return ExtractHour(field) * 60 + ExtractMinute(field)
+
+
+def earned_minutes(date_from, date_to, period="range", split=None, basis="smv"):
+    """
+    {(operator_id, period start): (pieces, earned minutes)}.
+
+    split "equal": smv x qty / number of operators on the declaration;
+    split "full":  smv x qty for every operator (same as Operator Capacity).
+    basis "smv_ita" uses SMV ITA where it is set and SMV otherwise.
+    """
+    split = split or default_split_rule()
+    Through = Declaration.operators.through
+
+    smv = F("declaration__smv")
+    has_minutes = Q(declaration__smv__isnull=False)
+    if basis == "smv_ita":
+        smv = Coalesce("declaration__smv_ita", "declaration__smv")
+        has_minutes |= Q(declaration__smv_ita__isnull=False)
+    minutes = smv * F("declaration__qty")
+
+    qs = Through.objects.filter(
+        has_minutes,
+        declaration__decl_date__gte=date_from,
+        declaration__decl_date__lte=date_to,
+    )
+
+    def grouped(rows_qs, divisor=1):
+        return (
+            (row["operator_id"], row["period"], row["pieces"] or 0, Decimal(row["earned"] or 0) / divisor)
+            for row in (
+                rows_qs
+                .annotate(period=_period("declaration__decl_date", period, date_from))
+                .order_by()
+                .values("operator_id", "period")
+                .annotate(
+                    pieces=Sum("declaration__qty"),
+                    earned=Sum(ExpressionWrapper(minutes, output_field=MINUTES)),
+                )
+            )
+        )
+
+    if split == "equal":
+        co_operators = (
+            Through.objects
+            .filter(declaration_id=OuterRef("declaration_id"))
+            .order_by()
+            .values("declaration_id")
+            .annotate(n=Count("id"))
+            .values("n")
+        )
+        qs = qs.alias(co_operators=Subquery(co_operators, output_field=IntegerField()))
+        counts = (
+            Declaration.objects
+            .filter(decl_date__gte=date_from, decl_date__lte=date_to)
+            .order_by()
+            .values("id")
+            .annotate(n=Count("operators"))
+            .filter(n__gt=0)
+            .values_list("n", flat=True)
+            .distinct()
+        )
+        parts = [grouped(qs.filter(co_operators=n), divisor=n) for n in counts]
+    else:
+        parts = [grouped(qs)]
+
+    result = {}
+    for part in parts:
+        for operator_id, start, pieces, earned in part:
+            old_pieces, old_earned = result.get((operator_id, start), (0, Decimal("0")))
+            result[(operator_id, start)] = (old_pieces + pieces, old_earned + earned)
+    return result
+
+
+def available_minutes(date_from, date_to, period="range"):
+    """
+    {(operator_id, period start): {"sessions", "break", "downtime"}} in
+    minutes, from three grouped queries.
+    """
+    result = {}
+
+    def _add(key, field, value):
+        entry = result.setdefault(key, {"sessions": Decimal("0"), "break": Decimal("0"), "downtime": Decimal("0")})
+        entry[field] += Decimal(value or 0)
+
+    logins = LoginOperator.objects.filter(
+        login_team_date__gte=date_from,
+        login_team_date__lte=date_to,
+        status__in=PAYROLL_STATUSES,
+    )
+
+    session_minutes = _minute_of_day("logoff_team_time") - _minute_of_day("login_team_time")
+    sessions = (
+        logins
+        .filter(logoff_team_time__isnull=False)
+        .annotate(
+            period=_period("login_team_date", period, date_from),
+            minutes=Case(
+                When(logoff_team_date__gt=F("login_team_date"), then=session_minutes + 24 * 60),
+                When(Q(logoff_team_time__gt=F("login_team_time")), then=session_minutes),
+                default=Value(0),
+                output_field=IntegerField(),
+            ),
+        )
+        .order_by()
+        .values("operator_id", "period")
+        .annotate(total=Sum("minutes"))
+    )
+    for row in sessions:
+        _add((row["operator_id"], row["period"]), "sessions", row["total"])
+
+    breaks = (
+        logins
+        .filter(break_time__isnull=False)
+        .annotate(period=_period("login_team_date", period, date_from))
+        .order_by()
+        .values("operator_id", "period")
+        .annotate(total=Sum("break_time"))
+    )
+    for row in breaks:
+        _add((row["operator_id"], row["period"]), "break", row["total"])
+
+    downtime = (
+        DowntimeDeclaration.objects
+        .filter(
+            login_operator__login_team_date__gte=date_from,
+            login_operator__login_team_date__lte=date_to,
+        )
+        .annotate(period=_period("login_operator__login_team_date", period, date_from))
+        .order_by()
+        .values("login_operator__operator_id", "period")
+        .annotate(total=Sum("downtime_total"))
+    )
+    for row in downtime:
+        _add((row["login_operator__operator_id"], row["period"]), "downtime", row["total"])
+
+    return result
+
+
+def payroll_report(date_from, date_to, period="range", split=None, basis="smv"):
+    """
+    Report rows (dicts) per operator and period, sorted by period and badge.
+    """
+    earned = earned_minutes(date_from, date_to, period=period, split=split, basis=basis)
+    available = available_minutes(date_from, date_to, period=period)
+
+    keys = set(earned) | set(available)
+    operators = Operator.objects.in_bulk({op_id for op_id, _ in keys})
+
+    rows = []
+    for op_id, start in keys:
+        pieces, earned_min = earned.get((op_id, start), (0, Decimal("0")))
+        parts = available.get((op_id, start), {"sessions": Decimal("0"), "break": Decimal("0"), "downtime": Decimal("0")})
+        available_min = max(parts["sessions"] - parts["break"] - parts["downtime"], Decimal("0"))
+        period_from, period_to = _period_end(start, period, date_from, date_to)
+        rows.append({
+            "period_from": period_from,
+            "period_to": period_to,
+            "operator": operators[op_id],
+            "pieces": pieces,
+            "earned_min": round(earned_min, 1),
+            "sessions_min": round(parts["sessions"], 1),
+            "break_min": round(parts["break"], 1),
+            "downtime_min": round(parts["downtime"], 1),
+            "available_min": round(available_min, 1),
+            "efficiency": round(earned_min / available_min * 100, 1) if available_min > 0 else Decimal("0.0"),
+        })
+
+    rows.sort(key=lambda r: (r["period_from"], r["operator"].badge_num))
+    return rows
+
+
+def export_rows(rows):
+    for r in rows:
+        yield [
+            r["period_from"], r["period_to"], r["operator"].badge_num, r["operator"].name,
+            r["pieces"], r["earned_min"], r["sessions_min"], r["break_min"],
+            r["downtime_min"], r["available_min"], r["efficiency"],
+        ]
@@ -0,0 +1,128 @@
+# core/pro_completion.py
+"""
+PRO completion from final operation output.
+
+ProSubdepartment.completed_qty = pieces declared on the final operation(s)
+of the subdepartment routing for that PRO, read from the incrementally
+maintained WIP counters (core.wip, ProOperationCounter) - never re-summed
+from Declaration. A link is done when completed_qty reaches Pro.qty; a PRO
+is complete (Pro.completed_at) when all its active links are done.
+
+PRO_COMPLETION_MODE (settings):
+  "flag"       - set completed_at / done only
+  "deactivate" - also switch Pro.status off when the PRO becomes complete
+                 (once; a planner may activate it again)
+
+A PRO that drops below its qty again (declaration deleted, qty raised) is
+un-flagged; its status is not switched back on.
+
+Refreshed for the PROs of every WIP counter change and on Pro / link /
+final operation changes (core.signals); detect_pro_completion (management
+command) refreshes all PROs.
+"""
+from django.conf import settings
+from django.db.models import Sum
+from django.utils import timezone
+
+from core.models import Pro, ProOperationCounter, ProSubdepartment
+
+
+COMPLETION_MODES = ("flag", "deactivate")
+
+
+def completion_mode():
+    mode = getattr(settings, "PRO_COMPLETION_MODE", "flag")
+    return mode if mode in COMPLETION_MODES else "flag"
+
+
+def final_output(pro_ids=None):
+    """
+    {(pro_id, subdepartment_id): qty declared on final operations}.
+    """
+    qs = ProOperationCounter.objects.filter(routing_operation__final_operation=True)
+    if pro_ids is not None:
+        qs = qs.filter(pro_id__in=list(pro_ids))
+    return {
+        (row["pro_id"], row["routing_operation__routing__subdepartment_id"]): row["total"]
+        for row in (
+            qs
+            .order_by()
+            .values("pro_id", "routing_operation__routing__subdepartment_id")
+            .annotate(total=Sum("qty"))
+        )
+    }
+
+
+def refresh_completion(pro_ids=None, mode=None):
+    """
+    Recompute completed_qty / done of the PRO links and completed_at (and
+    status, mode "deactivate") of the PROs; all PROs when pro_ids is None.
+    Two reads + bulk updates of the changed rows.
+
+    Returns (completed PROs, reopened PROs) - lists of Pro objects whose
+    completed_at was set / cleared.
+    """
+    if pro_ids is not None:
+        pro_ids = set(pro_ids)
+        if not pro_ids:
+            return [], []
+    mode = mode or completion_mode()
+
+    output = final_output(pro_ids)
+    links = ProSubdepartment.objects.select_related("pro").order_by("pro_id", "id")
+    if pro_ids is not None:
+        links = links.filter(pro_id__in=pro_ids)
+
+    now = timezone.now()
+    changed_links = []
+    pros = {}
+    links_done = {}  # pro_id -> all active links done
+    for link in links:
+        pro = link.pro
+        # drifted counters (see reconcile_wip_counters) must not block declaration writes
+        completed = max(output.get((link.pro_id, link.subdepartment_id), 0), 0)
+        done = bool(pro.qty) and completed >= pro.qty
+        if (link.completed_qty, link.done) != (completed, done):
+            link.completed_qty = completed
+            link.done = done
+            link.updated_at = now
+            changed_links.append(link)
+
+        pros.setdefault(link.pro_id, pro)
+        if link.active:
+            links_done[link.pro_id] = links_done.get(link.pro_id, True) and done
+
+    completed_pros = []
+    reopened_pros = []
+    for pro_id, pro in pros.items():
+        complete = links_done.get(pro_id, False)
+        if complete and pro.completed_at is None:
+            pro.completed_at = now
+            if mode == "deactivate":
+                pro.status = False
+            pro.updated_at = now
+            completed_pros.append(pro)
+        elif not complete and pro.completed_at is not None:
+            pro.completed_at = None
+            pro.updated_at = now
+            reopened_pros.append(pro)
+
+    if changed_links:
+        ProSubdepartment.objects.bulk_update(changed_links, ["completed_qty", "done", "updated_at"], batch_size=500)
+    if completed_pros or reopened_pros:
+        Pro.objects.bulk_update(completed_pros + reopened_pros, ["completed_at", "status", "updated_at"], batch_size=500)
+
+    return completed_pros, reopened_pros
+
+
+def refresh_for_routings(routing_ids):
+    """
+    Refresh completion of the PROs with output on the given routings
+    (final operation flag changed).
+    """
+    pro_ids = set(
+        ProOperationCounter.objects
+        .filter(routing_operation__routing_id__in=list(routing_ids))
+        .values_list("pro_id", flat=True)
+    )
+    return refresh_completion(pro_ids)
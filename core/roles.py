@@ -0,0 +1,59 @@
+# core/roles.py
+"""
+Cached role (auth group) resolution.
+
+A user's group names are read once and kept in the shared cache, so access
+mixins and the login redirect don't query auth_group on every request.
+Entries are dropped when group membership changes (see core.signals);
+renaming or deleting a group invalidates all users at once.
+"""
+from django.core.cache import cache
+
+from core.caching import bump_version, get_version
+
+
+ROLE_PLANNERS = "PLANNERS"
+ROLE_ADMINS = "ADMINS"
+ROLE_TEAMS = "TEAMS"
+
+ROLE_CACHE_TIMEOUT = 24 * 60 * 60
+
+
+def _cache_key(user_id):
+    return f"wip:roles:{get_version('roles')}:{user_id}"
+
+
+def get_roles(user):
+    """
+    Upper-case group names of the user (frozenset).
+    """
+    if not user or not user.is_authenticated:
+        return frozenset()
+
+    # memoized on the request's user object
+    roles = getattr(user, "_wip_roles", None)
+    if roles is not None:
+        return roles
+
+    key = _cache_key(user.pk)
+    roles = cache.get(key)
+    if roles is None:
+        roles = frozenset(
+            name.upper() for name in user.groups.values_list("name", flat=True)
+        )
+        cache.set(key, roles, ROLE_CACHE_TIMEOUT)
+
+    user._wip_roles = roles
+    return roles
+
+
+def has_role(user, role):
+    return role.upper() in get_roles(user)
+
+
+def invalidate_user_roles(*user_ids):
+    cache.delete_many([_cache_key(uid) for uid in user_ids])
+
+
+def invalidate_all_roles():
+    bump_version("roles")
@@ -0,0 +1,133 @@
+# core/routing_catalog.py
+"""
+Routing / operation catalog for declaration forms and lookups.
+
+Ready routings (status + ready) are kept per (SKU, subdepartment) together
+with their operations (SMV, SMV ITA, final flag) in a per-process cache.
+The shared "routings" version stamp is bumped on every Routing /
+RoutingOperation / Operation write (see core.signals), so all workers
+reload only after a change.
+"""
+from collections import namedtuple
+
+from core.caching import VersionedStore, get_version
+from core.models import Routing, RoutingOperation
+
+
+class RoutingEntry(namedtuple(
+    "RoutingEntry",
+    ["id", "sku", "subdepartment_id", "version", "declaration_type", "ready", "status", "operations"],
+)):
+    __slots__ = ()
+
+    @property
+    def label(self):
+        return f"{self.sku} / {self.version}"
+
+    @property
+    def is_operator_type(self):
+        return (self.declaration_type or "").strip().upper() == "OPERATOR"
+
+
+class OperationEntry(namedtuple(
+    "OperationEntry",
+    ["id", "routing_id", "operation_id", "name", "subdepartment_name", "smv", "smv_ita", "final_operation"],
+)):
+    __slots__ = ()
+
+    def __str__(self):
+        # same label as Operation.__str__
+        return f"{self.name} / {self.subdepartment_name}"
+
+
+_ROUTING_FIELDS = ("id", "sku", "subdepartment_id", "version", "declaration_type", "ready", "status")
+
+
+def _build_entries(routing_qs):
+    rows = list(routing_qs.values_list(*_ROUTING_FIELDS))
+    ops_by_routing = {}
+    for ro in (
+        RoutingOperation.objects
+        .filter(routing_id__in=[r[0] for r in rows])
+        .order_by("id")
+        .values_list(
+            "id", "routing_id", "operation_id", "operation__name",
+            "operation__subdepartment__subdepartment", "smv", "smv_ita", "final_operation",
+        )
+    ):
+        ops_by_routing.setdefault(ro[1], []).append(OperationEntry(*ro))
+
+    return [RoutingEntry(*row, tuple(ops_by_routing.get(row[0], ()))) for row in rows]
+
+
+def _load(key):
+    kind = key[0]
+
+    if kind == "routing":
+        entries = _build_entries(Routing.objects.filter(pk=key[1]))
+        return entries[0] if entries else None
+
+    # ("ready", SKU, subdepartment_id or None)
+    _, sku, subdep_id = key
+    qs = Routing.objects.filter(status=True, ready=True, sku__iexact=sku)
+    if subdep_id:
+        qs = qs.filter(subdepartment_id=subdep_id)
+    return tuple(_build_entries(qs.order_by("sku", "version")))
+
+
+_store = VersionedStore("routings", loader=_load, max_entries=2000)
+
+
+def catalog_version():
+    """
+    Version stamp of the catalog (changes on any routing/operation write).
+    """
+    return get_version("routings")
+
+
+def ready_routings(sku, subdepartment=None):
+    """
+    Active + ready routings for a SKU (case-insensitive), optionally limited
+    to one subdepartment (instance or id). Ordered by sku, version.
+    """
+    if not sku:
+        return ()
+    subdep_id = getattr(subdepartment, "pk", subdepartment) or None
+    return _store.get(("ready", sku.strip().upper(), subdep_id))
+
+
+def get_routing(routing_id):
+    """
+    RoutingEntry for any routing (ready or not), or None.
+    """
+    try:
+        routing_id = int(routing_id)
+    except (TypeError, ValueError):
+        return None
+    return _store.get(("routing", routing_id))
+
+
+def routing_operations(routing_id, order_by_name=False):
+    """
+    Operations of a routing (ordered by id, or by operation name).
+    """
+    entry = get_routing(routing_id)
+    if entry is None:
+        return ()
+    if order_by_name:
+        return tuple(sorted(entry.operations, key=lambda op: op.name or ""))
+    return entry.operations
+
+
+def get_routing_operation(routing_id, routing_operation_id):
+    """
+    OperationEntry of a routing by id, or None.
+    """
+    for op in routing_operations(routing_id):
+        if str(op.id) == str(routing_operation_id):
+            return op
+    return None
+
+
+def invalidate_routing_catalog():
+    _store.invalidate()
@@ -0,0 +1,369 @@
+# core/routing_import.py
+"""
+Routing / SMV import from an IE sheet (XLSX streamed in read_only mode, or
+CSV).
+
+Columns (header row, case-insensitive, any order):
+  sku, subdepartment, version, operation, smv   (required)
+  smv ita, final, description, declaration type (optional)
+
+One row = one operation of a routing (sku + subdepartment + version).
+The file is compared with the routings it mentions (one preload of
+Routing, Operation and RoutingOperation rows) and the result is a diff per
+routing: added / changed / removed operations. The diff is shown to the
+planner first and applied on confirm with bulk writes; Routing.ready is
+recomputed for all touched routings.
+
+Rules:
+  - operation must exist, be active and belong to the routing subdepartment
+  - a new routing needs a declaration type (Operator / Team) and a
+    14-18 character SKU (same as RoutingForm)
+  - optional columns missing from the file leave existing values unchanged
+  - operations missing from the file are removed only on request
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from core.models import Declaration, Operation, Routing, RoutingOperation, Subdepartment
+from core.pro_completion import refresh_for_routings
+from core.routing_catalog import invalidate_routing_catalog
+from core.routings import is_ready, recompute_ready, refresh_pro_routing_flags
+from core.spreadsheets import iter_rows
+
+
+COLUMN_ALIASES = {
+    "sku": "sku",
+    "subdepartment": "subdepartment",
+    "version": "version",
+    "operation": "operation",
+    "operation name": "operation",
+    "smv": "smv",
+    "smv ita": "smv_ita",
+    "smv_ita": "smv_ita",
+    "final": "final",
+    "final operation": "final",
+    "description": "description",
+    "operation description": "description",
+    "declaration type": "declaration_type",
+    "declaration_type": "declaration_type",
+}
+REQUIRED_COLUMNS = ["sku", "subdepartment", "version", "operation", "smv"]
+
+DECLARATION_TYPES = {"operator": "Operator", "team": "Team"}
+TRUE_VALUES = {"1", "true", "yes", "y", "x", "da"}
+
+# fields compared / written for existing routing operations
+COMPARED_FIELDS = ["smv", "smv_ita", "final_operation", "operation_description"]
+
+SMV_STEP = Decimal("0.001")
+SMV_MAX = Decimal("9999.999")
+
+
+def _parse_smv(value, errors, label):
+    if value in ("", None):
+        return None
+    try:
+        smv = Decimal(str(value).replace(",", ".")).quantize(SMV_STEP)
+    except InvalidOperation:
+        errors.append(f"Invalid {label}.")
+        return None
+    if smv < 0 or smv > SMV_MAX:
+        errors.append(f"Invalid {label}.")
+        return None
+    return smv
+
+
+def read_routing_file(uploaded_file):
+    """
+    Parse the file -> (rows, errors).
+
+    rows: list of dicts with the routing key, operation name and the values
+    given in the file (JSON serializable, kept in the session between
+    preview and apply); errors: [(row number, [messages])].
+    """
+    rows = []
+    errors = []
+    seen = {}
+
+    for row_no, values in iter_rows(uploaded_file, COLUMN_ALIASES, REQUIRED_COLUMNS):
+        row_errors = []
+        sku = str(values["sku"]).strip()
+        subdepartment = str(values["subdepartment"]).strip()
+        version = str(values["version"]).strip()
+        operation = str(values["operation"]).strip()
+
+        if not sku or not subdepartment or not version:
+            row_errors.append("SKU, subdepartment and version are required.")
+        if not operation:
+            row_errors.append("Operation is required.")
+
+        smv = _parse_smv(values["smv"], row_errors, "SMV")
+        if smv is None and "Invalid SMV." not in row_errors:
+            row_errors.append("SMV is required.")
+
+        row = {
+            "row": row_no,
+            "sku": sku,
+            "subdepartment": subdepartment,
+            "version": version,
+            "operation": operation,
+            "smv": str(smv) if smv is not None else None,
+        }
+        if "smv_ita" in values:
+            smv_ita = _parse_smv(values["smv_ita"], row_errors, "SMV ITA")
+            row["smv_ita"] = str(smv_ita) if smv_ita is not None else None
+        if "final" in values:
+            row["final_operation"] = str(values["final"]).strip().lower() in TRUE_VALUES
+        if "description" in values:
+            row["operation_description"] = str(values["description"])[:255]
+        if "declaration_type" in values and values["declaration_type"]:
+            declaration_type = DECLARATION_TYPES.get(str(values["declaration_type"]).strip().lower())
+            if declaration_type is None:
+                row_errors.append("Declaration type must be Operator or Team.")
+            row["declaration_type"] = declaration_type
+
+        key = (sku.upper(), subdepartment.upper(), version.upper(), operation.upper())
+        if not row_errors and key in seen:
+            row_errors.append(f"Duplicate of row {seen[key]}.")
+
+        if row_errors:
+            errors.append((row_no, row_errors))
+            continue
+
+        seen[key] = row_no
+        rows.append(row)
+
+    return rows, errors
+
+
+def build_routing_diff(rows):
+    """
+    Compare parsed rows with the database.
+
+    Returns (routings, errors): routings is a list of per routing dicts
+      {"key", "sku", "subdepartment", "version", "routing_id", "declaration_type",
+       "added": [...], "changed": [...], "removed": [...], "unchanged": int,
+       (removed operations carry "declarations": count of declarations on them)
+       "ready_after": bool (removed operations deleted),
+       "ready_if_kept": bool (removed operations kept)}
+    and errors is [(row number, [messages])] for rows that can't be applied.
+    """
+    subdepartments = {s.subdepartment.upper(): s for s in Subdepartment.objects.all()}
+    operations = {
+        op.name.upper(): op
+        for op in Operation.objects.filter(name__in={r["operation"] for r in rows})
+    }
+
+    skus = {r["sku"] for r in rows}
+    routings = {
+        (r.sku.upper(), r.subdepartment_id, r.version.upper()): r
+        for r in Routing.objects.filter(sku__in=skus)
+    }
+    current = {}
+    for ro in (
+        RoutingOperation.objects
+        .filter(routing_id__in=[r.pk for r in routings.values()])
+        .select_related("operation")
+        .order_by("id")
+    ):
+        current.setdefault(ro.routing_id, {})[ro.operation_id] = ro
+
+    # declaration type of a new routing may be given on any of its rows
+    new_types = {}
+    for row in rows:
+        if row.get("declaration_type"):
+            new_types.setdefault(
+                (row["sku"].upper(), row["subdepartment"].upper(), row["version"].upper()),
+                row["declaration_type"],
+            )
+
+    errors = []
+    plans = {}
+
+    for row in rows:
+        row_errors = []
+        declaration_type = new_types.get(
+            (row["sku"].upper(), row["subdepartment"].upper(), row["version"].upper())
+        )
+        subdep = subdepartments.get(row["subdepartment"].upper())
+        if subdep is None:
+            row_errors.append(f"Unknown subdepartment '{row['subdepartment']}'.")
+
+        op = operations.get(row["operation"].upper())
+        if op is None or not op.status:
+            row_errors.append(f"Operation '{row['operation']}' not found or not active.")
+        elif subdep is not None and op.subdepartment_id != subdep.pk:
+            row_errors.append("Operation belongs to another subdepartment.")
+
+        routing = routings.get((row["sku"].upper(), subdep.pk, row["version"].upper())) if subdep else None
+        if routing is None and subdep is not None:
+            if not 14 <= len(row["sku"]) <= 18:
+                row_errors.append("SKU must be between 14 or 18 characters long.")
+            if not declaration_type:
+                row_errors.append("New routing needs a declaration type (Operator or Team).")
+
+        if row_errors:
+            errors.append((row["row"], row_errors))
+            continue
+
+        key = (row["sku"].upper(), subdep.pk, row["version"].upper())
+        plan = plans.get(key)
+        if plan is None:
+            plan = plans[key] = {
+                "key": key,
+                "sku": routing.sku if routing else row["sku"],
+                "subdepartment_id": subdep.pk,
+                "subdepartment": subdep.subdepartment,
+                "version": routing.version if routing else row["version"],
+                "routing_id": routing.pk if routing else None,
+                "declaration_type": routing.declaration_type if routing else declaration_type,
+                "added": [],
+                "changed": [],
+                "removed": [],
+                "unchanged": 0,
+                "_ops": set(),
+            }
+        plan["_ops"].add(op.pk)
+
+        existing = current.get(plan["routing_id"], {}).get(op.pk)
+        new_values = {
+            "smv": Decimal(row["smv"]),
+            "smv_ita": Decimal(row["smv_ita"]) if row.get("smv_ita") else None,
+            "final_operation": row.get("final_operation", False),
+            "operation_description": row.get("operation_description", ""),
+        }
+
+        if existing is None:
+            plan["added"].append({"operation_id": op.pk, "operation": op.name, "row": row["row"], **new_values})
+            continue
+
+        fields = [f for f in COMPARED_FIELDS if f in row or f == "smv"]
+        changes = {
+            f: (getattr(existing, f), new_values[f])
+            for f in fields
+            if getattr(existing, f) != new_values[f]
+        }
+        if changes:
+            plan["changed"].append({
+                "id": existing.pk,
+                "operation_id": op.pk,
+                "operation": op.name,
+                "row": row["row"],
+                "changes": changes,
+            })
+        else:
+            plan["unchanged"] += 1
+
+    for plan in plans.values():
+        ops_in_file = plan.pop("_ops")
+        existing = current.get(plan["routing_id"], {})
+        plan["removed"] = [
+            {"id": ro.pk, "operation_id": op_id, "operation": ro.operation.name}
+            for op_id, ro in existing.items()
+            if op_id not in ops_in_file
+        ]
+
+        # final flag per operation after the import -> ready with / without removal
+        finals = {op_id: ro.final_operation for op_id, ro in existing.items()}
+        for change in plan["changed"]:
+            if "final_operation" in change["changes"]:
+                finals[change["operation_id"]] = change["changes"]["final_operation"][1]
+        for added in plan["added"]:
+            finals[added["operation_id"]] = added["final_operation"]
+
+        kept = {op_id: final for op_id, final in finals.items() if op_id in ops_in_file}
+        plan["ready_after"] = is_ready(len(kept), sum(kept.values()))
+        plan["ready_if_kept"] = is_ready(len(finals), sum(finals.values()))
+
+    # declarations that lose their operation link if the removal is applied
+    removed_ids = [r["id"] for plan in plans.values() for r in plan["removed"]]
+    declared = dict(
+        Declaration.objects
+        .filter(routing_operation_id__in=removed_ids)
+        .order_by()
+        .values_list("routing_operation_id")
+        .annotate(n=Count("id"))
+    ) if removed_ids else {}
+    for plan in plans.values():
+        for r in plan["removed"]:
+            r["declarations"] = declared.get(r["id"], 0)
+
+    return sorted(plans.values(), key=lambda p: (p["sku"], p["subdepartment"], p["version"])), errors
+
+
+def apply_routing_diff(plans, remove_missing=False):
+    """
+    Write a diff from build_routing_diff: new routings, added / changed (and
+    optionally removed) routing operations, then recompute ready.
+    Returns {"routings", "added", "changed", "removed"} counts.
+    """
+    now = timezone.now()
+    result = {"routings": 0, "added": 0, "changed": 0, "removed": 0}
+
+    with transaction.atomic():
+        new_plans = [p for p in plans if p["routing_id"] is None]
+        Routing.objects.bulk_create([
+            Routing(
+                sku=p["sku"],
+                subdepartment_id=p["subdepartment_id"],
+                version=p["version"],
+                declaration_type=p["declaration_type"],
+                status=True,
+                ready=False,
+            )
+            for p in new_plans
+        ])
+        if new_plans:
+            created = {
+                (r.sku.upper(), r.subdepartment_id, r.version.upper()): r.pk
+                for r in Routing.objects.filter(sku__in={p["sku"] for p in new_plans})
+            }
+            for p in new_plans:
+                p["routing_id"] = created[p["key"]]
+        result["routings"] = len(new_plans)
+
+        to_create = [
+            RoutingOperation(
+                routing_id=p["routing_id"],
+                operation_id=a["operation_id"],
+                operation_description=a["operation_description"],
+                smv=a["smv"],
+                smv_ita=a["smv_ita"],
+                final_operation=a["final_operation"],
+            )
+            for p in plans
+            for a in p["added"]
+        ]
+        RoutingOperation.objects.bulk_create(to_create, batch_size=500)
+        result["added"] = len(to_create)
+
+        changes = {c["id"]: c["changes"] for p in plans for c in p["changed"]}
+        to_update = list(RoutingOperation.objects.filter(pk__in=changes))
+        for ro in to_update:
+            for field, (_old, new) in changes[ro.pk].items():
+                setattr(ro, field, new)
+            ro.updated_at = now
+        if to_update:
+            RoutingOperation.objects.bulk_update(to_update, COMPARED_FIELDS + ["updated_at"], batch_size=500)
+        result["changed"] = len(to_update)
+
+        if remove_missing:
+            removed_ids = [r["id"] for p in plans for r in p["removed"]]
+            if removed_ids:
+                # delete() total also counts cascaded counter / break rows
+                _, deleted = RoutingOperation.objects.filter(pk__in=removed_ids).delete()
+                result["removed"] = deleted.get(RoutingOperation._meta.label, 0)
+
+        recompute_ready(p["routing_id"] for p in plans)
+        refresh_for_routings(
+            p["routing_id"] for p in plans
+            if (remove_missing and p["removed"]) or any("final_operation" in c["changes"] for c in p["changed"])
+        )
+        if new_plans:
+            refresh_pro_routing_flags(skus={p["sku"] for p in new_plans})
+        transaction.on_commit(invalidate_routing_catalog)
+
+    return result
@@ -0,0 +1,208 @@
+# core/routings.py
+"""
+Routing maintenance shared by planner views / signals / commands:
+
+- recompute_ready: Routing.operation_count / final_operation_count / ready
+  for many routings from one aggregate query
+- refresh_pro_routing_flags: ProSubdepartment.has_routing (a Routing exists
+  for the PRO SKU + subdepartment) for many PRO links in one query
+- copy_routing: copy operations of one routing into many target SKUs
+
+The denormalized columns are kept current by core.signals (single writes)
+and by the bulk paths below; recompute_routing_readiness (management
+command) rebuilds them. Bulk writes skip model signals, so these functions
+invalidate the routing catalog themselves (on commit).
+"""
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Q
+from django.utils import timezone
+
+from core.models import ProSubdepartment, Routing, RoutingOperation
+from core.routing_catalog import invalidate_routing_catalog
+
+
+def is_ready(total_ops, final_ops):
+    """
+    Ready rule: at least one operation and exactly one final operation.
+    """
+    return total_ops >= 1 and final_ops == 1
+
+
+def recompute_ready(routing_ids=None):
+    """
+    Recompute operation counts and Routing.ready for many routings (all
+    routings when routing_ids is None): one aggregate query, one bulk_update
+    of the routings whose values changed.
+
+    Returns {routing_id: ready} for the changed routings.
+    """
+    routings = Routing.objects.all()
+    ops = RoutingOperation.objects.all()
+    if routing_ids is not None:
+        routing_ids = set(routing_ids)
+        if not routing_ids:
+            return {}
+        routings = routings.filter(pk__in=routing_ids)
+        ops = ops.filter(routing_id__in=routing_ids)
+
+    counts = {
+        row["routing_id"]: (row["total"], row["finals"])
+        for row in (
+            ops
+            .order_by()
+            .values("routing_id")
+            .annotate(total=Count("id"), finals=Count("id", filter=Q(final_operation=True)))
+        )
+    }
+
+    now = timezone.now()
+    changed = []
+    for routing in routings.only("id", "ready", "operation_count", "final_operation_count"):
+        total, finals = counts.get(routing.pk, (0, 0))
+        ready = is_ready(total, finals)
+        if (routing.operation_count, routing.final_operation_count, routing.ready) != (total, finals, ready):
+            routing.operation_count = total
+            routing.final_operation_count = finals
+            routing.ready = ready
+            routing.updated_at = now
+            changed.append(routing)
+
+    if changed:
+        Routing.objects.bulk_update(
+            changed, ["operation_count", "final_operation_count", "ready", "updated_at"], batch_size=500
+        )
+        transaction.on_commit(invalidate_routing_catalog)
+
+    return {r.pk: r.ready for r in changed}
+
+
+def refresh_pro_routing_flags(pro_ids=None, skus=None):
+    """
+    Recompute ProSubdepartment.has_routing for the links of the given PROs
+    and / or PRO SKUs (all links when both are None). One query + one
+    bulk_update of the changed rows. Returns the number of changed rows.
+    """
+    links = ProSubdepartment.objects.all()
+    if pro_ids is not None or skus is not None:
+        cond = Q()
+        if pro_ids:
+            cond |= Q(pro_id__in=list(pro_ids))
+        if skus:
+            cond |= Q(pro__sku__in=list(skus))
+        if not cond:
+            return 0
+        links = links.filter(cond)
+
+    routing_exists = Routing.objects.filter(
+        sku=OuterRef("pro__sku"),
+        subdepartment=OuterRef("subdepartment"),
+    )
+    now = timezone.now()
+    changed = []
+    for link in links.annotate(found=Exists(routing_exists)).only("id", "has_routing"):
+        if link.has_routing != link.found:
+            link.has_routing = link.found
+            link.updated_at = now
+            changed.append(link)
+
+    if changed:
+        ProSubdepartment.objects.bulk_update(changed, ["has_routing", "updated_at"], batch_size=500)
+    return len(changed)
+
+
+def copy_routing(source, target_skus, routing_operation_ids):
+    """
+    Copy selected operations of `source` into the routing with the same
+    subdepartment / version of every target SKU (created when missing,
+    not ready). Operations already present in a target are skipped.
+
+    Constant number of queries for any number of targets / operations.
+    Returns a list of per target dicts:
+      {"sku", "routing", "created_routing", "created_ops", "skipped_ops", "ready"}
+    """
+    # SKUs are compared case-insensitively (MSSQL collation)
+    unique_skus = {}
+    for sku in (s.strip() for s in target_skus if s and s.strip()):
+        unique_skus.setdefault(sku.upper(), sku)
+    target_skus = list(unique_skus.values())
+
+    src_ops = list(
+        RoutingOperation.objects
+        .filter(routing=source, pk__in=routing_operation_ids)
+        .order_by("id")
+    )
+
+    with transaction.atomic():
+        targets = {
+            r.sku.upper(): r
+            for r in Routing.objects.filter(
+                sku__in=target_skus,
+                subdepartment_id=source.subdepartment_id,
+                version=source.version,
+            )
+        }
+        new_skus = [sku for sku in target_skus if sku.upper() not in targets]
+        Routing.objects.bulk_create([
+            Routing(
+                sku=sku,
+                subdepartment_id=source.subdepartment_id,
+                version=source.version,
+                version_description=source.version_description,
+                declaration_type=source.declaration_type,
+                status=source.status,
+                ready=False,  # novi routing nije "ready" dok ga ne završiš
+            )
+            for sku in new_skus
+        ])
+        if new_skus:
+            targets.update({
+                r.sku.upper(): r
+                for r in Routing.objects.filter(
+                    sku__in=new_skus,
+                    subdepartment_id=source.subdepartment_id,
+                    version=source.version,
+                )
+            })
+
+        existing = set(
+            RoutingOperation.objects
+            .filter(routing_id__in=[r.pk for r in targets.values()])
+            .values_list("routing_id", "operation_id")
+        )
+
+        results = []
+        to_create = []
+        for sku in target_skus:
+            routing = targets[sku.upper()]
+            row = {
+                "sku": sku,
+                "routing": routing,
+                "created_routing": sku in new_skus,
+                "created_ops": 0,
+                "skipped_ops": 0,
+                "ready": routing.ready,
+            }
+            for src_ro in src_ops:
+                if (routing.pk, src_ro.operation_id) in existing:
+                    row["skipped_ops"] += 1
+                    continue
+                to_create.append(RoutingOperation(
+                    routing_id=routing.pk,
+                    operation_id=src_ro.operation_id,
+                    operation_description=src_ro.operation_description,
+                    smv=src_ro.smv,
+                    smv_ita=src_ro.smv_ita,
+                    final_operation=src_ro.final_operation,
+                ))
+                row["created_ops"] += 1
+            results.append(row)
+
+        RoutingOperation.objects.bulk_create(to_create, batch_size=500)
+        changed = recompute_ready(r.pk for r in targets.values())
+        if new_skus:
+            refresh_pro_routing_flags(skus=new_skus)
+        transaction.on_commit(invalidate_routing_catalog)
+
+    for row in results:
+        row["ready"] = changed.get(row["routing"].pk, row["ready"])
+    return results
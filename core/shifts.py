@@ -0,0 +1,62 @@
+# core/shifts.py
+"""
+Shift lookup service: (team_user, date) -> shift_start / shift_end.
+
+Calendar rows are loaded per date for all teams with one query and kept in
+a per-process cache, dropped on any Calendar write (see core.signals).
+"""
+from collections import namedtuple
+
+from core.caching import VersionedStore
+from core.models import Calendar
+
+
+ShiftInfo = namedtuple("ShiftInfo", ["team_user_id", "date", "shift_start", "shift_end"])
+
+
+def _load_day(day):
+    return {
+        tu_id: ShiftInfo(tu_id, d, start, end)
+        for tu_id, d, start, end in (
+            Calendar.objects
+            .filter(date=day)
+            .values_list("team_user_id", "date", "shift_start", "shift_end")
+        )
+    }
+
+
+# one entry per date; older dates fall out first
+_store = VersionedStore("calendar", loader=_load_day, max_entries=120)
+
+
+def load_shifts(day):
+    """
+    All shifts for a date -> {team_user_id: ShiftInfo}.
+    """
+    return _store.get(day)
+
+
+def get_shift(team_user, day):
+    """
+    Shift of a team user (instance or id) for a date, or None.
+    """
+    team_user_id = getattr(team_user, "pk", team_user)
+    return load_shifts(day).get(team_user_id)
+
+
+def shift_state(shift, current_time):
+    """
+    (shift_state, alert_class) for the team terminal banners:
+      - ("active", "success")    shift in progress
+      - ("inactive", "warning")  shift exists, but not in progress
+      - ("no_shift", "danger")   no calendar entry
+    """
+    if not shift:
+        return "no_shift", "danger"
+    if shift.shift_start <= current_time <= shift.shift_end:
+        return "active", "success"
+    return "inactive", "warning"
+
+
+def invalidate_shifts():
+    _store.invalidate()
@@ -0,0 +1,224 @@
+# core/signals.py
+"""
+Cache invalidation and counter maintenance hooks (registered in CoreConfig.ready).
+"""
+from collections import Counter
+
+from django.contrib.auth.models import Group
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from core.badges import invalidate_badge_index
+from core.caching import bump_version
+from core.models import (
+    Calendar, Declaration, Downtime, DowntimeDeclaration, LoginOperator, Operation, Operator, Pro, ProSubdepartment,
+    Routing, RoutingOperation, Subdepartment, TeamUser,
+)
+from core.downtime_report import invalidate_downtime_report
+from core.output_counters import apply_change, declaration_contribution
+from core.output_timeline import invalidate_timeline
+from core.pro_completion import refresh_completion, refresh_for_routings
+from core.routing_catalog import invalidate_routing_catalog
+from core.routings import recompute_ready, refresh_pro_routing_flags
+from core.roles import invalidate_all_roles, invalidate_user_roles
+from core.shifts import invalidate_shifts
+from core import wip
+
+
+@receiver(post_save, sender=Operator)
+@receiver(post_delete, sender=Operator)
+def operator_changed(sender, **kwargs):
+    invalidate_badge_index()
+
+
+@receiver(post_save, sender=Calendar)
+@receiver(post_delete, sender=Calendar)
+def calendar_changed(sender, **kwargs):
+    invalidate_shifts()
+
+
+@receiver(post_save, sender=Downtime)
+@receiver(post_delete, sender=Downtime)
+@receiver(post_save, sender=DowntimeDeclaration)
+@receiver(post_delete, sender=DowntimeDeclaration)
+def downtime_changed(sender, **kwargs):
+    invalidate_downtime_report()
+
+
+# downtime report groups by the session's login date / team
+@receiver(post_save, sender=LoginOperator)
+@receiver(post_delete, sender=LoginOperator)
+def login_operator_changed(sender, created=False, **kwargs):
+    if not created:  # a new session has no downtime yet
+        invalidate_downtime_report()
+
+
+@receiver(post_save, sender=Routing)
+@receiver(post_delete, sender=Routing)
+@receiver(post_save, sender=RoutingOperation)
+@receiver(post_delete, sender=RoutingOperation)
+@receiver(post_save, sender=Operation)
+@receiver(post_delete, sender=Operation)
+def routing_catalog_changed(sender, **kwargs):
+    invalidate_routing_catalog()
+
+
+@receiver(post_save, sender=TeamUser)
+@receiver(post_delete, sender=TeamUser)
+@receiver(post_save, sender=Subdepartment)
+@receiver(post_delete, sender=Subdepartment)
+def team_user_changed(sender, update_fields=None, **kwargs):
+    # login only touches last_login -> nothing the lookups show
+    if update_fields and set(update_fields) <= {"last_login"}:
+        return
+    bump_version("teamusers")
+
+
+@receiver(m2m_changed, sender=TeamUser.groups.through)
+def group_membership_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+
+    if not reverse:
+        # user.groups.add/remove/clear
+        invalidate_user_roles(instance.pk)
+    elif pk_set:
+        # group.user_set.add/remove
+        invalidate_user_roles(*pk_set)
+    else:
+        # group.user_set.clear -> affected users unknown
+        invalidate_all_roles()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, **kwargs):
+    invalidate_all_roles()
+
+
+
+# ---------- team output counters (core.output_counters) / PRO WIP (core.wip) ----------
+
+@receiver(pre_save, sender=Declaration)
+def declaration_before_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    stored = Declaration.objects.filter(pk=instance.pk).first() if instance.pk else None
+    instance._output_before = declaration_contribution(stored) if stored else Counter()
+    instance._wip_before = wip.declaration_wip(stored)
+    instance._timeline_before = (stored.teamuser_id, stored.decl_date, stored.created_at) if stored else None
+
+
+@receiver(post_save, sender=Declaration)
+def declaration_saved(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    before = getattr(instance, "_output_before", Counter())
+    apply_change(before, declaration_contribution(instance))
+    wip.apply_change(getattr(instance, "_wip_before", Counter()), wip.declaration_wip(instance))
+
+    # edit of a declaration from a closed hour -> cached hourly timeline
+    timeline_before = getattr(instance, "_timeline_before", None)
+    if not created and timeline_before:
+        invalidate_timeline(*timeline_before)
+        if timeline_before[:2] != (instance.teamuser_id, instance.decl_date):
+            invalidate_timeline(instance.teamuser_id, instance.decl_date, instance.created_at)
+
+    instance._output_before = None
+    instance._wip_before = None
+    instance._timeline_before = None
+
+
+@receiver(pre_delete, sender=Declaration)
+def declaration_deleted(sender, instance, **kwargs):
+    apply_change(declaration_contribution(instance), Counter())
+    wip.apply_change(wip.declaration_wip(instance), Counter())
+    invalidate_timeline(instance.teamuser_id, instance.decl_date, instance.created_at)
+
+
+def _declarations_for_m2m(instance, reverse, pk_set):
+    if not reverse:
+        return [instance]
+    if pk_set is None:
+        # operator.declarations.clear()
+        return list(instance.declarations.all())
+    return list(Declaration.objects.filter(pk__in=pk_set))
+
+
+@receiver(m2m_changed, sender=Declaration.operators.through)
+def declaration_operators_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ("pre_add", "pre_remove", "pre_clear"):
+        decls = _declarations_for_m2m(instance, reverse, pk_set)
+        instance._output_m2m_before = (decls, Counter())
+        for decl in decls:
+            instance._output_m2m_before[1].update(declaration_contribution(decl))
+
+    elif action in ("post_add", "post_remove", "post_clear"):
+        decls, before = getattr(instance, "_output_m2m_before", ([], Counter()))
+        after = Counter()
+        for decl in decls:
+            after.update(declaration_contribution(decl))
+        apply_change(before, after)
+        instance._output_m2m_before = None
+
+
+# ---------- routing readiness / PRO routing flags (core.routings) ----------
+
+READINESS_FIELDS = {"ready", "operation_count", "final_operation_count", "updated_at"}
+
+
+@receiver(post_save, sender=RoutingOperation)
+@receiver(post_delete, sender=RoutingOperation)
+def routing_operation_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    recompute_ready([instance.routing_id])
+    refresh_for_routings([instance.routing_id])
+
+
+@receiver(pre_save, sender=Routing)
+def routing_before_save(sender, instance, raw=False, **kwargs):
+    if raw or not instance.pk:
+        return
+    instance._routing_key_before = (
+        Routing.objects.filter(pk=instance.pk).values_list("sku", "subdepartment_id").first()
+    )
+
+
+@receiver(post_save, sender=Routing)
+def routing_saved(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields and set(update_fields) <= READINESS_FIELDS):
+        return
+    before = getattr(instance, "_routing_key_before", None)
+    if created or before != (instance.sku, instance.subdepartment_id):
+        skus = {instance.sku}
+        if before:
+            skus.add(before[0])
+        refresh_pro_routing_flags(skus=skus)
+
+
+@receiver(post_delete, sender=Routing)
+def routing_deleted(sender, instance, **kwargs):
+    refresh_pro_routing_flags(skus=[instance.sku])
+
+
+@receiver(post_save, sender=Pro)
+def pro_saved(sender, instance, created=False, raw=False, **kwargs):
+    # new PRO has no subdepartment links yet
+    if raw or created:
+        return
+    refresh_pro_routing_flags(pro_ids=[instance.pk])
+
+    # qty / links may have changed -> completion (written with bulk_update, keep the instance in sync)
+    completed, reopened = refresh_completion([instance.pk])
+    for pro in completed + reopened:
+        instance.completed_at = pro.completed_at
+        instance.status = pro.status
+
+
+@receiver(post_save, sender=ProSubdepartment)
+def pro_subdepartment_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    refresh_pro_routing_flags(pro_ids=[instance.pro_id])
+    refresh_completion([instance.pro_id])
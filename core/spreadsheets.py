@@ -0,0 +1,184 @@
+# core/spreadsheets.py
+"""
+Streaming readers for planner file imports (.xlsx with openpyxl read_only,
+.csv with a sniffed delimiter) and streaming writers for planner exports
+(.csv through StreamingHttpResponse, .xlsx with openpyxl write_only).
+
+Each import defines its columns as {header alias: column name}; the first
+row of the file is the header, columns may be in any order.
+"""
+import csv
+import hashlib
+import io
+import tempfile
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.http import FileResponse, StreamingHttpResponse
+
+EXPORT_FORMATS = {"csv", "xlsx"}
+
+
+class ImportFileError(Exception):
+    """
+    The file can't be read (format, missing columns).
+    """
+
+
+def _cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, (datetime, date)):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def _header(row, aliases, required):
+    columns = {}
+    for idx, name in enumerate(row):
+        key = aliases.get(str(name or "").strip().lower())
+        if key and key not in columns:
+            columns[key] = idx
+
+    missing = [c for c in required if c not in columns]
+    if missing:
+        raise ImportFileError(f"Missing column(s): {', '.join(missing)}.")
+    return columns
+
+
+def _xlsx_rows(uploaded_file):
+    from openpyxl import load_workbook
+
+    try:
+        wb = load_workbook(uploaded_file, read_only=True, data_only=True)
+    except Exception:
+        raise ImportFileError("File is not a valid XLSX workbook.")
+    try:
+        yield from wb.active.iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+
+def _csv_rows(uploaded_file):
+    text = io.TextIOWrapper(uploaded_file.file, encoding="utf-8-sig", newline="")
+    try:
+        sample = text.read(4096)
+        text.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel
+        yield from csv.reader(text, dialect)
+    except UnicodeDecodeError:
+        raise ImportFileError("CSV file must be UTF-8 encoded.")
+    finally:
+        text.detach()
+
+
+def iter_rows(uploaded_file, aliases, required=(), extensions=(".xlsx", ".csv")):
+    """
+    Yield (row number, {column: value}) for the data rows of an uploaded
+    file. Rows are streamed, empty rows are skipped. Columns missing from
+    the file are not in the dict.
+    """
+    name = (uploaded_file.name or "").lower()
+    if name.endswith(".xlsx") and ".xlsx" in extensions:
+        rows = _xlsx_rows(uploaded_file)
+    elif name.endswith(".csv") and ".csv" in extensions:
+        rows = _csv_rows(uploaded_file)
+    else:
+        raise ImportFileError(f"Upload an {' or '.join(extensions)} file.")
+
+    columns = None
+    for row_no, row in enumerate(rows, start=1):
+        if columns is None:
+            columns = _header(row, aliases, required)
+            continue
+        values = {key: _cell(row[idx]) if idx < len(row) else "" for key, idx in columns.items()}
+        if any(v != "" for v in values.values()):
+            yield row_no, values
+
+    if columns is None:
+        raise ImportFileError("File is empty.")
+
+
+def file_digest(uploaded_file):
+    digest = hashlib.sha1()
+    for chunk in uploaded_file.chunks():
+        digest.update(chunk)
+    uploaded_file.seek(0)
+    return digest.hexdigest()
+
+
+# ---------- export ----------
+
+class _Echo:
+    """
+    File-like object for csv.writer: write() returns the line instead of
+    buffering it.
+    """
+
+    def write(self, value):
+        return value
+
+
+def _csv_stream(header, rows):
+    writer = csv.writer(_Echo())
+    yield "\ufeff"  # BOM -> Excel reads UTF-8
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def csv_response(filename, header, rows):
+    """
+    StreamingHttpResponse writing `rows` (any iterable of sequences) as CSV
+    while they are produced; nothing is buffered.
+    """
+    response = StreamingHttpResponse(_csv_stream(header, rows), content_type="text/csv; charset=utf-8")
+    response["Content-Disposition"] = f'attachment; filename="{filename}.csv"'
+    return response
+
+
+def _xlsx_value(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        return value.replace(tzinfo=None)
+    return value
+
+
+def xlsx_response(filename, header, rows, title="Export"):
+    """
+    XLSX download of `rows` written with an openpyxl write_only workbook
+    (rows go straight to a temporary file, memory use does not grow with
+    the row count); the finished file is streamed with FileResponse.
+    """
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=title[:31])
+    ws.append(header)
+    for row in rows:
+        ws.append([_xlsx_value(v) for v in row])
+
+    tmp = tempfile.TemporaryFile()
+    wb.save(tmp)
+    tmp.seek(0)
+    return FileResponse(
+        tmp,
+        as_attachment=True,
+        filename=f"{filename}.xlsx",
+        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    )
+
+
+def export_response(fmt, filename, header, rows, title="Export"):
+    """
+    csv_response / xlsx_response by format name ("csv" or "xlsx").
+    """
+    if fmt == "xlsx":
+        return xlsx_response(filename, header, rows, title=title)
+    return csv_response(filename, header, rows)
@@ -1,3 +1,480 @@
-from django.test import TestCase
+from datetime import datetime, time, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import Group
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core.attendance import attendance_days
+from core.declaration_import import import_declarations
+from core.declarations import build_downtime_declaration, create_team_declaration, ingest_team_batch
+from core.downtime_report import downtime_report
+from core.integrity import session_overlap
+from core.models import (
+    Calendar, Declaration, Downtime, LoginOperator, ProOperationCounter, Operation, Operator, Pro, ProSubdepartment, Routing, RoutingOperation,
+    Subdepartment, TeamUser,
+)
+from core.operator_sessions import bulk_logout
+from core import output_counters
+from core.output_timeline import team_timeline
+from core.payroll import earned_minutes
+from core.wip import OverDeclarationError, compare_counters, reserve_qty
+
+
+class ProductionDataMixin:
+    """
+    Subdepartment, two teams with a calendar entry for today, operators,
+    one PRO with a ready Operator type routing (two operations, the second
+    one final).
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.today = timezone.localdate()
+        self.sd = Subdepartment.objects.create(subdepartment="SEW")
+        self.team1 = TeamUser.objects.create_user("team1", "team1", subdepartment=self.sd)
+        self.team2 = TeamUser.objects.create_user("team2", "team2", subdepartment=self.sd)
+        for team in (self.team1, self.team2):
+            Calendar.objects.create(team_user=team, date=self.today, shift_start=time(0, 0), shift_end=time(23, 59))
+        self.ops = [
+            Operator.objects.create(badge_num=f"R{i:03d}", name=f"Op {i}", pin_code="1", func="f")
+            for i in range(3)
+        ]
+        self.pro = Pro.objects.create(pro_name="P1", sku="STYLE0001COL1XS", qty=100)
+        ProSubdepartment.objects.create(pro=self.pro, subdepartment=self.sd)
+        self.routing = Routing.objects.create(
+            sku=self.pro.sku, subdepartment=self.sd, version="1", declaration_type="Operator", ready=True,
+        )
+        self.ro1 = RoutingOperation.objects.create(
+            routing=self.routing, operation=Operation.objects.create(name="op1", subdepartment=self.sd), smv="1.000",
+        )
+        self.ro2 = RoutingOperation.objects.create(
+            routing=self.routing, operation=Operation.objects.create(name="op2", subdepartment=self.sd), smv="2.000",
+            final_operation=True,
+        )
+
+    def login(self, operator, team_user, start=time(6, 0), end=None, day=None, status="ACTIVE"):
+        day = day or self.today
+        return LoginOperator.objects.create(
+            operator=operator,
+            team_user=team_user,
+            login_actual=timezone.now(),
+            login_team_date=day,
+            login_team_time=start,
+            logoff_team_date=day if end else None,
+            logoff_team_time=end,
+            status=status,
+        )
+
+    def declaration_payload(self, key, operator, qty=1):
+        return {
+            "key": key,
+            "pro": self.pro.pk,
+            "routing": self.routing.pk,
+            "routing_operation": self.ro1.pk,
+            "qty": qty,
+            "operators": [operator.pk],
+        }
+
+
+class TeamIngestClientKeyTests(ProductionDataMixin, TestCase):
+
+    def test_same_key_from_two_teams_creates_two_declarations(self):
+        self.login(self.ops[0], self.team1)
+        self.login(self.ops[1], self.team2)
+
+        first = ingest_team_batch(self.team1, [self.declaration_payload("q-1", self.ops[0])])
+        second = ingest_team_batch(self.team2, [self.declaration_payload("q-1", self.ops[1])])
+
+        self.assertEqual(first[0]["status"], "created")
+        self.assertEqual(second[0]["status"], "created")
+        self.assertNotEqual(first[0]["id"], second[0]["id"])
+        self.assertEqual(Declaration.objects.get(pk=second[0]["id"]).teamuser, self.team2)
+
+    def test_resend_is_duplicate_of_own_declaration(self):
+        self.login(self.ops[0], self.team1)
+        self.login(self.ops[1], self.team2)
+        ingest_team_batch(self.team1, [self.declaration_payload("q-1", self.ops[0])])
+        created = ingest_team_batch(self.team2, [self.declaration_payload("q-1", self.ops[1])])
+
+        resent = ingest_team_batch(self.team2, [self.declaration_payload("q-1", self.ops[1])])
+
+        self.assertEqual(resent[0]["status"], "duplicate")
+        self.assertEqual(resent[0]["id"], created[0]["id"])
+        self.assertEqual(Declaration.objects.count(), 2)
+
+
+@override_settings(DECLARATION_QTY_TOLERANCE=5)
+class WipCounterTests(ProductionDataMixin, TestCase):
+
+    def counters(self):
+        return dict(
+            ProOperationCounter.objects.filter(pro=self.pro).values_list("routing_operation_id", "qty")
+        )
+
+    def declare(self, routing_operation, qty, operators=()):
+        decl = Declaration.objects.create(
+            teamuser=self.team1, subdepartment=self.sd, decl_date=self.today, pro=self.pro,
+            routing=self.routing, routing_operation=routing_operation, qty=qty, smv="1.000",
+        )
+        if operators:
+            decl.operators.set(operators)
+        return decl
+
+    def assertCountersMatchDeclarations(self):
+        self.assertEqual(compare_counters(), [])
+        self.assertEqual(output_counters.compare_counters(self.today, self.today), [])
+
+    def test_create_edit_delete_apply_deltas(self):
+        first = self.declare(self.ro1, 10)
+        second = self.declare(self.ro1, 5)
+        self.assertEqual(self.counters(), {self.ro1.pk: 15})
+
+        first.qty = 7
+        first.save()
+        self.assertEqual(self.counters(), {self.ro1.pk: 12})
+
+        second.routing_operation = self.ro2
+        second.save()
+        self.assertEqual(self.counters(), {self.ro1.pk: 7, self.ro2.pk: 5})
+
+        first.delete()
+        self.assertEqual(self.counters(), {self.ro2.pk: 5})
+        self.assertCountersMatchDeclarations()
+
+    def test_declaration_without_operation_is_not_counted(self):
+        self.declare(None, 10)
+
+        self.assertEqual(self.counters(), {})
+        self.assertCountersMatchDeclarations()
+
+    def test_operator_changes_keep_qty_counted_once(self):
+        decl = self.declare(self.ro1, 10, operators=[self.ops[0]])
+
+        decl.operators.add(self.ops[1])
+        decl.operators.remove(self.ops[0])
+        decl.operators.clear()
+        decl.operators.set([self.ops[1], self.ops[2]])
+
+        self.assertEqual(self.counters(), {self.ro1.pk: 10})
+        self.assertCountersMatchDeclarations()
+
+    def test_final_operation_updates_pro_completion(self):
+        self.declare(self.ro1, 40)
+        final = self.declare(self.ro2, 30)
+        link = ProSubdepartment.objects.get(pro=self.pro, subdepartment=self.sd)
+        self.assertEqual(link.completed_qty, 30)
+
+        final.delete()
+        link.refresh_from_db()
+        self.assertEqual(link.completed_qty, 0)
+
+    def test_bulk_ingest_is_counted(self):
+        self.login(self.ops[0], self.team1)
+
+        ingest_team_batch(self.team1, [
+            self.declaration_payload("q-1", self.ops[0], qty=4),
+            self.declaration_payload("q-2", self.ops[0], qty=6),
+        ])
+
+        self.assertEqual(self.counters(), {self.ro1.pk: 10})
+        self.assertCountersMatchDeclarations()
+
+
+@override_settings(DECLARATION_QTY_TOLERANCE=5)
+class OverDeclarationGuardTests(ProductionDataMixin, TestCase):
+
+    def save(self, qty, routing_operation=None):
+        return create_team_declaration(
+            self.team1, self.pro, self.routing, routing_operation or self.ro1, qty, [self.ops[0].pk],
+        )
+
+    def test_limit_is_pro_qty_plus_tolerance(self):
+        self.save(100)
+        self.save(5)
+
+        with self.assertRaisesMessage(
+            OverDeclarationError,
+            "Quantity too high: PRO P1 has 100 pcs (+5 tolerance), 105 already declared on op1. Max 0 more.",
+        ):
+            self.save(1)
+
+    def test_rejected_save_writes_nothing(self):
+        self.save(60)
+
+        with self.assertRaises(OverDeclarationError):
+            self.save(50)
+
+        self.assertEqual(Declaration.objects.count(), 1)
+        self.assertEqual(ProOperationCounter.objects.get(routing_operation=self.ro1).qty, 60)
+
+    def test_limit_is_per_operation(self):
+        self.save(105)
+
+        self.save(105, routing_operation=self.ro2)
+
+        self.assertEqual(Declaration.objects.count(), 2)
+
+    @override_settings(DECLARATION_QTY_TOLERANCE=0)
+    def test_without_tolerance(self):
+        with self.assertRaisesMessage(
+            OverDeclarationError,
+            "Quantity too high: PRO P1 has 100 pcs, 0 already declared on op1. Max 100 more.",
+        ):
+            reserve_qty(self.pro, self.ro1, 101)
+
+    @override_settings(DECLARATION_QTY_TOLERANCE=-1)
+    def test_negative_tolerance_disables_the_guard(self):
+        self.save(500)
+
+        self.assertEqual(ProOperationCounter.objects.get(routing_operation=self.ro1).qty, 500)
+
+
+class TeamIngestPayloadTests(ProductionDataMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.team1.groups.add(Group.objects.get_or_create(name="TEAMS")[0])
+        self.client.force_login(self.team1)
+        self.login(self.ops[0], self.team1)
+
+    def post_json(self, payload):
+        return self.client.post(reverse("teams:ingest"), data=payload, content_type="application/json")
+
+    def test_payload_must_be_an_object(self):
+        for payload in ([], [{"key": "q-1"}], "5", '"x"', "null"):
+            response = self.post_json(payload)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json()["errors"], ["Invalid payload."])
+
+    def test_operators_must_be_a_list(self):
+        bad_string = dict(self.declaration_payload("q-1", self.ops[0]), operators=str(self.ops[0].pk))
+        bad_int = dict(self.declaration_payload("q-2", self.ops[0]), operators=self.ops[0].pk)
+
+        results = self.post_json({"declarations": [bad_string, bad_int]}).json()["results"]
+
+        self.assertEqual([r["status"] for r in results], ["error", "error"])
+        self.assertIn("Operators must be a list of operator ids.", results[0]["errors"])
+        self.assertFalse(Declaration.objects.exists())
+
+    def test_non_finite_downtime_value_is_rejected(self):
+        downtime = Downtime.objects.create(downtime_name="Machine", subdepartment=self.sd, fixed_duration=False)
+        items = [
+            {"key": f"d-{value}", "operator": self.ops[0].pk, "downtime": downtime.pk, "downtime_value": value}
+            for value in ("NaN", "Infinity", "-Infinity")
+        ]
+
+        results = self.post_json({"downtimes": items}).json()["results"]
+
+        self.assertEqual([r["status"] for r in results], ["error"] * 3)
+        self.assertEqual(results[0]["errors"], ["Downtime value must be greater than 0."])
+
+    def test_quick_save_race_on_client_key_returns_stored_declaration(self):
+        stored = Declaration.objects.create(
+            teamuser=self.team1, subdepartment=self.sd, decl_date=self.today, pro=self.pro,
+            routing=self.routing, routing_operation=self.ro1, qty=1, client_key="q-1",
+        )
+        data = {
+            "client_key": "q-1", "pro": self.pro.pk, "routing": self.routing.pk,
+            "routing_operation": self.ro1.pk, "qty": 1, "operators": [self.ops[0].pk],
+        }
+
+        # the concurrent request commits between the key lookup and the insert
+        with mock.patch("teams.views.DeclarationQuickSaveView.stored_id", side_effect=[None, stored.pk]), \
+                mock.patch("teams.views.create_team_declaration", side_effect=IntegrityError):
+            response = self.client.post(reverse("teams:declare_output_quick_save"), data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["id"], stored.pk)
+
+
+class OverLimitBulkTests(ProductionDataMixin, TestCase):
+
+    def test_ingest_stores_and_flags_rows_over_pro_qty(self):
+        self.login(self.ops[0], self.team1)
+
+        results = ingest_team_batch(self.team1, [
+            self.declaration_payload("q-1", self.ops[0], qty=100),
+            self.declaration_payload("q-2", self.ops[0], qty=5),
+            self.declaration_payload("q-3", self.ops[0], qty=1),
+        ])
+
+        self.assertEqual([r["status"] for r in results], ["created"] * 3)
+        self.assertEqual([bool(r["warnings"]) for r in results], [False, False, True])
+        self.assertIn("106 declared", results[2]["warnings"][0])
+        self.assertEqual(Declaration.objects.count(), 3)
+
+    def test_import_lists_rows_over_pro_qty(self):
+        self.login(self.ops[0], self.team1)
+        content = (
+            "date,team,pro,operation,qty,operators\n"
+            f"{self.today:%Y-%m-%d},team1,P1,op1,104,R000\n"
+            f"{self.today:%Y-%m-%d},team1,P1,op1,2,R000\n"
+        )
+
+        result = import_declarations(SimpleUploadedFile("decl.csv", content.encode()))
+
+        self.assertEqual(result["errors"], [])
+        self.assertEqual(result["created"], 2)
+        self.assertEqual([row_no for row_no, _ in result["over_limit"]], [3])
+
+
+class OutputTimelineTests(ProductionDataMixin, TestCase):
+
+    def declare(self, day, qty):
+        return Declaration.objects.create(
+            teamuser=self.team1, subdepartment=self.sd, decl_date=day, pro=self.pro,
+            routing=self.routing, routing_operation=self.ro1, qty=qty, smv="1.000",
+        )
+
+    def test_back_dated_declaration_is_not_charted_today(self):
+        self.declare(self.today, 3)
+        self.declare(self.today - timedelta(days=1), 50)
+
+        timeline = team_timeline(self.team1, self.today)
+
+        self.assertEqual(timeline["total_pieces"], 3)
+
+
+class AttendanceOpenSessionTests(ProductionDataMixin, TestCase):
+
+    def test_open_session_of_past_day_is_not_counted(self):
+        yesterday = self.today - timedelta(days=1)
+        self.login(self.ops[0], self.team1, start=time(6, 0), day=yesterday)
+        now = datetime.combine(self.today, time(10, 0))
+
+        days = list(attendance_days(yesterday, self.today, now=now))
+
+        self.assertEqual(len(days), 1)
+        self.assertEqual(days[0]["presence_min"], 0)
+        self.assertEqual(days[0]["open_sessions"], 1)
+
+    def test_open_session_of_today_counts_up_to_now(self):
+        self.login(self.ops[0], self.team1, start=time(6, 0))
+        now = datetime.combine(self.today, time(10, 0))
+
+        days = list(attendance_days(self.today, self.today, now=now))
+
+        self.assertEqual(days[0]["presence_min"], 240)
+        self.assertEqual(days[0]["open_sessions"], 0)
+
+    def test_open_night_shift_from_yesterday_counts_up_to_now(self):
+        yesterday = self.today - timedelta(days=1)
+        Calendar.objects.create(team_user=self.team2, date=yesterday, shift_start=time(22, 0), shift_end=time(6, 0))
+        self.login(self.ops[0], self.team2, start=time(22, 0), day=yesterday)
+        now = datetime.combine(self.today, time(2, 0))
+
+        days = list(attendance_days(yesterday, self.today, now=now))
+
+        self.assertEqual(days[0]["presence_min"], 240)
+        self.assertEqual(days[0]["open_sessions"], 0)
+
+    def test_open_day_shift_from_yesterday_is_not_counted(self):
+        yesterday = self.today - timedelta(days=1)
+        Calendar.objects.create(team_user=self.team1, date=yesterday, shift_start=time(6, 0), shift_end=time(14, 0))
+        self.login(self.ops[0], self.team1, start=time(22, 0), day=yesterday)
+        now = datetime.combine(self.today, time(2, 0))
+
+        days = list(attendance_days(yesterday, self.today, now=now))
+
+        self.assertEqual(days[0]["presence_min"], 0)
+        self.assertEqual(days[0]["open_sessions"], 1)
+
+
+class SessionOverlapTests(ProductionDataMixin, TestCase):
+
+    def test_nested_sessions_overlap_the_long_session(self):
+        long = self.login(self.ops[0], self.team1, start=time(6, 0), end=time(18, 0), status="COMPLETED")
+        first = self.login(self.ops[0], self.team2, start=time(8, 0), end=time(9, 0), status="COMPLETED")
+        second = self.login(self.ops[0], self.team2, start=time(10, 0), end=time(11, 0), status="COMPLETED")
+
+        keys = sorted(issue["key"] for issue in session_overlap())
+
+        self.assertEqual(keys, sorted([
+            f"session_overlap:{long.pk}:{first.pk}",
+            f"session_overlap:{long.pk}:{second.pk}",
+        ]))
+
+    def test_back_to_back_sessions_do_not_overlap(self):
+        self.login(self.ops[0], self.team1, start=time(6, 0), end=time(10, 0), status="COMPLETED")
+        self.login(self.ops[0], self.team2, start=time(10, 0), end=time(14, 0), status="COMPLETED")
+
+        self.assertEqual(list(session_overlap()), [])
+
+
+class BulkLogoutTests(ProductionDataMixin, TestCase):
+
+    def test_stale_session_is_closed_with_the_shift_of_its_own_day(self):
+        yesterday = self.today - timedelta(days=1)
+        Calendar.objects.create(team_user=self.team1, date=yesterday, shift_start=time(6, 0), shift_end=time(14, 0))
+        stale = self.login(self.ops[0], self.team1, start=time(6, 0), day=yesterday)
+        current = self.login(self.ops[1], self.team1, start=time(0, 0))
+        now = timezone.make_aware(datetime.combine(self.today, time(10, 0)))
+
+        bulk_logout(LoginOperator.objects.filter(pk__in=[stale.pk, current.pk]), now=now)
+
+        stale.refresh_from_db()
+        current.refresh_from_db()
+        self.assertEqual(
+            (stale.status, stale.logoff_team_date, stale.logoff_team_time),
+            ("COMPLETED", yesterday, time(14, 0)),
+        )
+        self.assertEqual(
+            (current.status, current.logoff_team_date, current.logoff_team_time),
+            ("COMPLETED", self.today, time(10, 0)),
+        )
+
+
+class DowntimeReportCacheTests(ProductionDataMixin, TestCase):
+
+    def test_session_edit_refreshes_cached_report(self):
+        session = self.login(self.ops[0], self.team1)
+        downtime = Downtime.objects.create(downtime_name="Machine", subdepartment=self.sd, fixed_duration=False)
+        build_downtime_declaration(session.pk, downtime.pk, "10", 1).save()
+        before = downtime_report(self.today, self.today)
+
+        session.team_user = self.team2
+        session.save()
+        after = downtime_report(self.today, self.today)
+
+        self.assertEqual([t["label"] for t in before["teams"]], ["team1"])
+        self.assertEqual([t["label"] for t in after["teams"]], ["team2"])
+
+
+class PayrollBasisTests(ProductionDataMixin, TestCase):
+
+    def test_smv_ita_basis_keeps_declarations_without_smv(self):
+        decl = Declaration.objects.create(
+            teamuser=self.team1, subdepartment=self.sd, decl_date=self.today, pro=self.pro,
+            routing=self.routing, routing_operation=self.ro1, qty=10, smv=None, smv_ita="1.500",
+        )
+        decl.operators.set([self.ops[0]])
+
+        by_ita = earned_minutes(self.today, self.today, basis="smv_ita")
+        by_smv = earned_minutes(self.today, self.today, basis="smv")
+
+        self.assertEqual(by_ita[(self.ops[0].pk, self.today)], (10, 15))
+        self.assertEqual(by_smv, {})
+
+    def test_split_rules(self):
+        shared = Declaration.objects.create(
+            teamuser=self.team1, subdepartment=self.sd, decl_date=self.today, pro=self.pro,
+            routing=self.routing, routing_operation=self.ro1, qty=10, smv="1.000",
+        )
+        shared.operators.set([self.ops[0], self.ops[1]])
+        solo = Declaration.objects.create(
+            teamuser=self.team1, subdepartment=self.sd, decl_date=self.today, pro=self.pro,
+            routing=self.routing, routing_operation=self.ro2, qty=4, smv="2.000",
+        )
+        solo.operators.set([self.ops[0]])
+
+        equal = earned_minutes(self.today, self.today, split="equal")
+        full = earned_minutes(self.today, self.today, split="full")
+
+        self.assertEqual(equal[(self.ops[0].pk, self.today)], (14, 13))
+        self.assertEqual(equal[(self.ops[1].pk, self.today)], (10, 5))
+        self.assertEqual(full[(self.ops[0].pk, self.today)], (14, 18))
+        self.assertEqual(full[(self.ops[1].pk, self.today)], (10, 10))
@@ -4,15 +4,18 @@ from django.contrib import messages
 from django.shortcuts import redirect, render
 from django.contrib.auth import get_user_model
 
+from core.roles import get_roles, ROLE_ADMINS, ROLE_PLANNERS, ROLE_TEAMS
+
 app_name = 'core'
 
 
 def redirect_by_role(user):
-    if user.groups.filter(name__iexact='PLANNERS').exists():
+    roles = get_roles(user)
+    if ROLE_PLANNERS in roles:
         return redirect('planners:planner_dashboard')
-    elif user.groups.filter(name__iexact='ADMINS').exists():
+    elif ROLE_ADMINS in roles:
         return redirect('core:admin_dashboard')
-    elif user.groups.filter(name__iexact='TEAMS').exists():
+    elif ROLE_TEAMS in roles:
         return redirect('teams:team_dashboard')
     return redirect('core:main_page')
 
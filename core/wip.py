@@ -0,0 +1,298 @@
+# core/wip.py
+"""
+WIP balance per PRO: cumulative declared qty per (pro, routing_operation),
+kept in ProOperationCounter.
+
+Every Declaration write (save, delete, bulk insert) applies the difference
+between the old and the new contribution of that declaration in the same
+transaction as the write (receivers in core.signals, add_declarations for
+bulk paths) and refreshes PRO completion (core.pro_completion) of the
+touched PROs. Counter rows are changed with UPDATE qty = qty + delta, so
+concurrent declaration saves serialize on the counter row instead of
+overwriting each other; rows are touched in a fixed order to avoid
+deadlocks between two multi-row writes.
+
+The declaration qty is counted once per declaration (not per operator),
+declarations without a routing operation are not counted.
+
+reconcile_wip_counters (management command) compares the counters with the
+raw declarations and rebuilds them on request.
+
+reserve_qty guards interactive saves against declaring more than the PRO
+qty (+ DECLARATION_QTY_TOLERANCE %) on an operation: it locks the counter
+row (select_for_update) and checks it before the declaration is written;
+the declaration signal then increments the same, already locked row.
+Bulk paths (team offline ingest, file import) record data that already
+happened on the floor, so they are not rejected; over_limit_rows marks the
+rows that go over the limit instead.
+"""
+from collections import Counter
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+
+from core.models import Declaration, Pro, ProOperationCounter, Routing, RoutingOperation
+from core.pro_completion import refresh_completion
+
+
+def declaration_wip(decl):
+    """
+    {(pro_id, routing_operation_id): qty} for one declaration.
+    """
+    if decl is None or decl.pk is None or decl.routing_operation_id is None:
+        return Counter()
+    return Counter({(decl.pro_id, decl.routing_operation_id): decl.qty or 0})
+
+
+def apply_deltas(deltas):
+    """
+    Add {(pro_id, routing_operation_id): delta} to the counters (rows are
+    created on first use, rows that drop to 0 are removed).
+    """
+    deltas = {k: v for k, v in deltas.items() if v}
+    if not deltas:
+        return
+
+    with transaction.atomic():
+        for (pro_id, ro_id), delta in sorted(deltas.items()):
+            lookup = dict(pro_id=pro_id, routing_operation_id=ro_id)
+            if ProOperationCounter.objects.filter(**lookup).update(qty=F("qty") + delta):
+                continue
+            try:
+                with transaction.atomic():
+                    ProOperationCounter.objects.create(qty=delta, **lookup)
+            except IntegrityError:
+                # row created by a concurrent write in the meantime
+                ProOperationCounter.objects.filter(**lookup).update(qty=F("qty") + delta)
+
+        pro_ids = {k[0] for k in deltas}
+        ProOperationCounter.objects.filter(pro_id__in=pro_ids, qty=0).delete()
+        refresh_completion(pro_ids)
+
+
+def apply_change(before, after):
+    """
+    Apply the difference of two contributions (old -> new).
+    """
+    deltas = Counter(after)
+    deltas.subtract(before)
+    apply_deltas(deltas)
+
+
+def add_declarations(declarations):
+    """
+    Count many new declarations at once (bulk_create paths, no signals).
+    """
+    deltas = Counter()
+    for decl in declarations:
+        deltas.update(declaration_wip(decl))
+    apply_deltas(deltas)
+
+
+# ---------- over-declaration guard ----------
+
+class OverDeclarationError(Exception):
+    """
+    Declared qty would exceed PRO qty + tolerance on an operation.
+    """
+
+
+def qty_limit(pro):
+    """
+    Max pieces per operation of a PRO (PRO qty + tolerance %); None = no limit
+    (PRO without qty, or DECLARATION_QTY_TOLERANCE < 0).
+    """
+    tolerance = getattr(settings, "DECLARATION_QTY_TOLERANCE", 0)
+    if not pro.qty or tolerance is None or tolerance < 0:
+        return None
+    return pro.qty * (100 + tolerance) // 100
+
+
+def reserve_qty(pro, routing_operation, qty):
+    """
+    Check that `qty` more pieces fit on the operation of the PRO. Must run
+    in the transaction that writes the declaration: the counter row stays
+    locked until commit, so concurrent saves of the same PRO / operation
+    are checked one after another.
+
+    Raises OverDeclarationError.
+    """
+    limit = qty_limit(pro)
+    if limit is None or routing_operation is None:
+        return
+
+    lookup = dict(pro_id=pro.pk, routing_operation_id=routing_operation.pk)
+    counter = ProOperationCounter.objects.select_for_update().filter(**lookup).first()
+    if counter is None:
+        try:
+            with transaction.atomic():
+                counter = ProOperationCounter.objects.create(qty=0, **lookup)
+        except IntegrityError:
+            # first declaration of the operation saved concurrently
+            counter = ProOperationCounter.objects.select_for_update().get(**lookup)
+
+    if counter.qty + qty > limit:
+        available = max(limit - counter.qty, 0)
+        raise OverDeclarationError(
+            f"Quantity too high: PRO {pro.pro_name} has {pro.qty} pcs"
+            f"{f' (+{limit - pro.qty} tolerance)' if limit > pro.qty else ''}, "
+            f"{counter.qty} already declared on {routing_operation.operation.name}. "
+            f"Max {available} more."
+        )
+
+
+def over_limit_rows(decl_rows):
+    """
+    {key: message} for cleaned declaration rows (keyed by client_key, in
+    insert order; pro or pro_id, routing_operation_id, qty) that take an
+    operation of their PRO over qty_limit(): stored counter plus the rows
+    before it in the batch. Call before the rows are inserted.
+    """
+    def pro_id(c):
+        return c["pro"].pk if c.get("pro") is not None else c["pro_id"]
+
+    rows = {k: c for k, c in decl_rows.items() if c["routing_operation_id"] is not None}
+    if not rows:
+        return {}
+
+    pro_ids = {pro_id(c) for c in rows.values()}
+    pros = Pro.objects.in_bulk(list(pro_ids))
+    declared = Counter(stored_counters(pro_ids))
+
+    warnings = {}
+    for key, c in rows.items():
+        pro = pros[pro_id(c)]
+        counter_key = (pro.pk, c["routing_operation_id"])
+        declared[counter_key] += c["qty"]
+        limit = qty_limit(pro)
+        if limit is not None and declared[counter_key] > limit:
+            warnings[key] = (
+                f"Over PRO qty: PRO {pro.pro_name} has {pro.qty} pcs"
+                f"{f' (+{limit - pro.qty} tolerance)' if limit > pro.qty else ''}, "
+                f"{declared[counter_key]} declared on this operation."
+            )
+    return warnings
+
+
+# ---------- reconciliation ----------
+
+def raw_counters(pro_ids=None):
+    """
+    Counters computed from the Declaration table (all PROs or the given ones).
+    """
+    qs = Declaration.objects.filter(routing_operation__isnull=False)
+    if pro_ids is not None:
+        qs = qs.filter(pro_id__in=list(pro_ids))
+    rows = (
+        qs
+        .values("pro_id", "routing_operation_id")
+        .annotate(total_qty=Sum("qty"))
+        .order_by()
+    )
+    return {(r["pro_id"], r["routing_operation_id"]): r["total_qty"] for r in rows if r["total_qty"]}
+
+
+def stored_counters(pro_ids=None):
+    qs = ProOperationCounter.objects.exclude(qty=0)
+    if pro_ids is not None:
+        qs = qs.filter(pro_id__in=list(pro_ids))
+    return {(pro, ro): qty for pro, ro, qty in qs.values_list("pro_id", "routing_operation_id", "qty")}
+
+
+def compare_counters(pro_ids=None):
+    """
+    List of (key, stored_qty, raw_qty) where the counters differ from the raw data.
+    """
+    raw = raw_counters(pro_ids)
+    stored = stored_counters(pro_ids)
+    return [
+        (key, stored.get(key, 0), raw.get(key, 0))
+        for key in sorted(set(raw) | set(stored))
+        if stored.get(key, 0) != raw.get(key, 0)
+    ]
+
+
+def rebuild_counters(pro_ids=None):
+    """
+    Replace the counters (all PROs or the given ones) with values computed
+    from the raw data. Returns the number of counter rows written.
+    """
+    with transaction.atomic():
+        raw = raw_counters(pro_ids)
+        stale = ProOperationCounter.objects.all()
+        if pro_ids is not None:
+            stale = stale.filter(pro_id__in=list(pro_ids))
+        stale.delete()
+        ProOperationCounter.objects.bulk_create([
+            ProOperationCounter(pro_id=pro_id, routing_operation_id=ro_id, qty=qty)
+            for (pro_id, ro_id), qty in raw.items()
+        ], batch_size=500)
+        refresh_completion(pro_ids)
+    return len(raw)
+
+
+# ---------- PRO progress ----------
+
+def pro_progress(pro):
+    """
+    WIP balance of a PRO per routing (routings of the PRO SKU that are
+    active or have declared qty), operations in routing order:
+
+      [{"routing", "operations": [{"routing_operation", "done", "remaining",
+        "wip", "percent"}], "completed", "remaining"}]
+
+    done:      pieces declared on the operation
+    remaining: PRO qty - done (not below 0)
+    wip:       pieces done on the previous operation and not yet on this one
+               (None for the first operation)
+    completed: done of the final operation (None when the routing has none)
+
+    Three queries: routings, routing operations, counters.
+    """
+    counters = dict(
+        ProOperationCounter.objects
+        .filter(pro=pro)
+        .values_list("routing_operation_id", "qty")
+    )
+    counted_routings = set(
+        RoutingOperation.objects.filter(pk__in=list(counters)).values_list("routing_id", flat=True)
+    )
+    routings = [
+        r for r in Routing.objects.filter(sku=pro.sku).select_related("subdepartment").order_by("subdepartment__subdepartment", "version")
+        if r.status or r.pk in counted_routings
+    ]
+    ops_by_routing = {}
+    for ro in (
+        RoutingOperation.objects
+        .filter(routing_id__in=[r.pk for r in routings])
+        .select_related("operation")
+        .order_by("routing_id", "id")
+    ):
+        ops_by_routing.setdefault(ro.routing_id, []).append(ro)
+
+    target = pro.qty or 0
+    result = []
+    for routing in routings:
+        rows = []
+        completed = None
+        previous = None
+        for ro in ops_by_routing.get(routing.pk, []):
+            done = counters.get(ro.pk, 0)
+            rows.append({
+                "routing_operation": ro,
+                "done": done,
+                "remaining": max(target - done, 0),
+                "wip": previous - done if previous is not None else None,
+                "percent": round(done * 100 / target, 1) if target else None,
+            })
+            previous = done
+            if ro.final_operation:
+                completed = done
+        result.append({
+            "routing": routing,
+            "operations": rows,
+            "completed": completed,
+            "remaining": max(target - completed, 0) if completed is not None else None,
+        })
+    return result
@@ -35,6 +35,7 @@ urlpatterns = [
     path('pro/', views.ProListView.as_view(), name='pro_list'),
     path('pro/add/', views.ProCreateView.as_view(), name='pro_add'),
     path('pro/<int:pk>/edit/', views.ProUpdateView.as_view(), name='pro_edit'),
+    path('pro/<int:pk>/progress/', views.ProProgressView.as_view(), name='pro_progress'),
     path('pro/<int:pk>/delete/', views.ProDeleteView.as_view(), name='pro_delete'),
     path("pro/add-from-posummary/", POSummaryLookupView.as_view(), name="posummary_lookup"),
     path("pro/add-from-posummary/create/", POSummaryProCreateView.as_view(), name="posummary_pro_create"),
@@ -49,6 +50,7 @@ urlpatterns = [
     path('routings/copy/', views.RoutingCopyStep1View.as_view(), name='routing_copy_step1'),
     path('routing/copy/quick/', views.RoutingCopyStep11View.as_view(), name='routing_copy_step11'),
     path('routings/copy/confirm/', views.RoutingCopyStep2View.as_view(), name='routing_copy_step2'),
+    path('routings/import/', views.RoutingImportView.as_view(), name='routing_import'),
 
     # OPERATIONS
     path('operations/', views.OperationListView.as_view(), name='operation_list'),
@@ -70,6 +72,7 @@ urlpatterns = [
     path("login-operators/logout/wizard/", views.LoginOperatorLogoutWizardView.as_view(), name="login_operator_logout_wizard",),
     path("login-operators/logout/save/", views.LoginOperatorLogoutSaveView.as_view(), name="login_operator_logout_save",),
     path("login-operators/logout/cancel/", views.LoginOperatorLogoutCancelView.as_view(), name="login_operator_logout_cancel", ),
+    path("login-operators/logout/bulk/", views.LoginOperatorBulkLogoutView.as_view(), name="login_operator_logout_bulk",),
 
     # MANUAL AUTO-LOGOUT
     path('login-operators/manual-logout/',ManualLogoutOperatorsView.as_view(),name='manual_logout_operators'),
@@ -82,6 +85,8 @@ urlpatterns = [
     path('declarations/add/', DeclarationCreateView.as_view(), name='declaration_add'),
     path('declarations/wizard/', DeclarationWizardPlannerView.as_view(), name='declaration_wizard'),
     path('declarations/wizard/save/', DeclarationSavePlannerView.as_view(), name='declaration_save_planner'),
+    path('declarations/import/', views.DeclarationImportView.as_view(), name='declaration_import'),
+    path('declarations/export/', views.DeclarationExportView.as_view(), name='declaration_export'),
     path("declarations/wizard/cancel/", DeclarationWizardCancelView.as_view(), name="declaration_wizard_cancel"),
     path('declarations/<int:pk>/', DeclarationDetailView.as_view(), name='declaration_view'),
     path("declarations/<int:pk>/edit/", views.DeclarationUpdateView.as_view(), name="declaration_edit"),
@@ -101,6 +106,12 @@ urlpatterns = [
 
     # OPERATOR CAPACITY
     path("operator-capacity/",OperatorCapacityTodayView.as_view(),name="operator_capacity_today",),
+    path("payroll/", views.PayrollReportView.as_view(), name="payroll_report"),
+    path("attendance/", views.AttendanceReportView.as_view(), name="attendance_report"),
+
+    # DATA INTEGRITY
+    path("integrity/", views.IntegrityIssueListView.as_view(), name="integrity_issue_list"),
+    path("integrity/scan/", views.IntegrityScanView.as_view(), name="integrity_scan"),
 
     # DOWNTIME
     path("downtimes/", DowntimeListView.as_view(), name="downtime_list"),
@@ -108,6 +119,7 @@ urlpatterns = [
     path("downtimes/<int:pk>/edit/", DowntimeUpdateView.as_view(), name="downtime_edit"),
 
     # DOWNTIME DECLARATIONS
+    path("downtime-declarations/report/", views.DowntimeReportView.as_view(), name="downtime_report"),
     path("downtime-declarations/",DowntimeDeclarationListView.as_view(),name="downtime_declaration_list",),
     path("downtime-declarations/wizard/",DowntimeDeclarationWizardView.as_view(),name="downtime_declaration_wizard",),
     path("downtime-declarations/wizard/save/",DowntimeDeclarationSaveView.as_view(),name="downtime_declaration_save",),
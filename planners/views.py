@@ -3,7 +3,9 @@ from django import forms
 # import datetime
 from datetime import datetime, date, time, timedelta
 import os
+import re
 import json
+import hashlib
 from decimal import Decimal, InvalidOperation
 
 
@@ -16,10 +18,13 @@ from django.contrib import messages
 from django.db import connections, transaction
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views import View
-from django.db.models import Q, Sum, OuterRef, Exists
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from django.db.models import Q, Sum
 from django.contrib.auth.models import Group
-from django.db.models import Count
+from django.db.models import Count, Max
 from django.urls import reverse, reverse_lazy
+from django.utils.http import urlencode
 from django.utils import timezone
 from django.forms.widgets import CheckboxSelectMultiple
 from django.forms import HiddenInput
@@ -28,6 +33,24 @@ from django.conf import settings
 
 
 from core.models import *
+from core.attendance import EXPORT_HEADER as ATTENDANCE_EXPORT_HEADER, attendance_days, export_rows as attendance_export_rows, format_intervals
+from core.badges import invalidate_badge_index
+from core.roles import has_role, ROLE_PLANNERS
+from core.shifts import get_shift
+from core.caching import get_version
+from core.routing_catalog import catalog_version, get_routing, get_routing_operation, ready_routings, routing_operations
+from core.operator_sessions import bulk_logout, CLOSE_FIELDS
+from core.declaration_export import HEADER as DECLARATION_EXPORT_HEADER, declaration_queryset, declaration_rows
+from core.declaration_import import import_declarations
+from core.declarations import create_downtime_declarations
+from core.integrity import KINDS as INTEGRITY_KINDS, scan as run_integrity_scan
+from core.downtime_report import downtime_report
+from core.operator_breaks import assign_breaks
+from core.payroll import EXPORT_HEADER as PAYROLL_EXPORT_HEADER, PERIODS, SMV_BASES, SPLIT_RULES, default_split_rule, export_rows as payroll_export_rows, payroll_report
+from core.routings import copy_routing, recompute_ready
+from core.routing_import import apply_routing_diff, build_routing_diff, read_routing_file
+from core.spreadsheets import ImportFileError, export_response
+from core.wip import OverDeclarationError, pro_progress, reserve_qty
 
 
 class PlannerAccessMixin(LoginRequiredMixin, UserPassesTestMixin):
@@ -35,7 +58,7 @@ class PlannerAccessMixin(LoginRequiredMixin, UserPassesTestMixin):
 
     def test_func(self):
         user = self.request.user
-        return user.is_superuser or user.groups.filter(name__iexact="PLANNERS").exists()
+        return user.is_superuser or has_role(user, ROLE_PLANNERS)
 
 
 # ---------- DASHBOARD ----------
@@ -135,7 +158,10 @@ class PlannerDashboardView(PlannerAccessMixin, TemplateView):
             .count()
         )
 
-
+        # =========================================================
+        # DATA INTEGRITY – OPEN ISSUES (last scan)
+        # =========================================================
+        context["integrity_open_count"] = IntegrityIssue.objects.filter(resolved_at__isnull=True).count()
 
         return context
 
@@ -311,6 +337,8 @@ class OperatorSyncView(PlannerAccessMixin, View):
                     else:
                         updated += 1
 
+            invalidate_badge_index()
+
             messages.success(
                 request,
                 f"Synchronization with Inteos finished. "
@@ -510,7 +538,7 @@ class CalendarBulkCreateView(PlannerAccessMixin, FormView):
         # RULE 2 — TODAY RESTRICTIONS
         for d in dates_to_process:
             if d == today:
-                existing = Calendar.objects.filter(team_user=user, date=today).first()
+                existing = get_shift(user, today)
 
                 if existing:
                     # TODAY — SHIFT ACTIVE
@@ -784,20 +812,15 @@ class ProListView(PlannerAccessMixin, ListView):
         context["show_closed"] = self._show_closed()
 
         if not self._show_closed():
-            routing_exists = Routing.objects.filter(
-                sku=OuterRef("pro__sku"),
-                subdepartment=OuterRef("subdepartment"),
-            )
-            missing = (
+            # has_routing se odrzava u core.routings (signali + recompute_routing_readiness)
+            missing = list(
                 ProSubdepartment.objects
-                .filter(active=True, pro__sku__isnull=False)
-                .annotate(has_routing=Exists(routing_exists))
-                .filter(has_routing=False)
+                .filter(active=True, has_routing=False, pro__sku__isnull=False)
                 .select_related("pro", "subdepartment")
                 .order_by("pro__pro_name")
             )
             context["pros_without_routing"] = missing
-            context["pros_without_routing_count"] = missing.count()
+            context["pros_without_routing_count"] = len(missing)
         else:
             context["pros_without_routing"] = []
             context["pros_without_routing_count"] = 0
@@ -860,6 +883,21 @@ class ProUpdateView(PlannerAccessMixin, ProSubdepartmentMixin, UpdateView):
         return response
 
 
+class ProProgressView(PlannerAccessMixin, DetailView):
+    """
+    WIP balance of a PRO: pieces done / remaining per routing operation and
+    pieces between consecutive operations (core.wip counters).
+    """
+    model = Pro
+    template_name = "planners/pro_progress.html"
+    context_object_name = "pro"
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        ctx["routings"] = pro_progress(self.object)
+        return ctx
+
+
 class ProDeleteView(PlannerAccessMixin, DeleteView):
     model = Pro
     template_name = "planners/confirm_delete.html"
@@ -1065,7 +1103,8 @@ class UpdateAllProFromPOSummaryView(PlannerAccessMixin, View):
         os.makedirs(log_dir, exist_ok=True)
         log_path = os.path.join(log_dir, "pro_posummary_update.txt")
 
-        pros = Pro.objects.filter(status=True)
+        # zavrseni PRO-ovi (core.pro_completion) se vise ne sinhronizuju
+        pros = Pro.objects.filter(status=True, completed_at__isnull=True)
         now = datetime.now()
 
         try:
@@ -1210,7 +1249,6 @@ class RoutingListView(PlannerAccessMixin, ListView):
         return (
             Routing.objects
             .select_related("subdepartment")
-            .annotate(op_count=Count("routing_operations"))
             .order_by("sku", "version")
         )
 
@@ -1375,16 +1413,27 @@ class RoutingDeleteView(PlannerAccessMixin, DeleteView):
         return response
 
 
+def split_skus(value):
+    """
+    List of SKUs from text separated by new lines, commas, semicolons or
+    spaces (duplicates removed, case-insensitive).
+    """
+    skus = {}
+    for sku in re.split(r"[\s,;]+", value or ""):
+        if sku:
+            skus.setdefault(sku.upper(), sku)
+    return list(skus.values())
+
+
 class RoutingCopySelectForm(forms.Form):
     """
     STEP 1:
-    - target_sku: novi SKU za koji pravimo routing
+    - target_sku: jedan ili vise novih SKU (po redu, zarezom ili razmakom odvojeni)
     - source_routing: postojeći routing iz kog kopiramo operations
     """
     target_sku = forms.CharField(
-        max_length=100,
-        label="SKU for which to create routing",
-        widget=forms.TextInput(attrs={"class": "form-control"})
+        label="SKU(s) for which to create routing",
+        widget=forms.Textarea(attrs={"class": "form-control", "rows": 4})
     )
 
     source_routing = forms.ModelChoiceField(
@@ -1396,10 +1445,13 @@ class RoutingCopySelectForm(forms.Form):
     )
 
     def clean_target_sku(self):
-        value = self.cleaned_data["target_sku"].strip()
-        if not value:
+        skus = split_skus(self.cleaned_data["target_sku"])
+        if not skus:
             raise forms.ValidationError("Please enter target SKU.")
-        return value
+        too_long = [sku for sku in skus if len(sku) > 100]
+        if too_long:
+            raise forms.ValidationError(f"SKU too long: {', '.join(too_long)}")
+        return skus
 
 
 class RoutingCopyStep1View(PlannerAccessMixin, FormView):
@@ -1410,13 +1462,13 @@ class RoutingCopyStep1View(PlannerAccessMixin, FormView):
     form_class = RoutingCopySelectForm
 
     def form_valid(self, form):
-        target_sku = form.cleaned_data["target_sku"]
+        target_skus = form.cleaned_data["target_sku"]
         source_routing = form.cleaned_data["source_routing"]
 
         # Redirect na STEP 2 sa parametrima u query stringu
         url = (
             reverse("planners:routing_copy_step2")
-            + f"?target_sku={target_sku}&source_id={source_routing.pk}"
+            + "?" + urlencode({"target_sku": ",".join(target_skus), "source_id": source_routing.pk})
         )
         return redirect(url)
 
@@ -1474,15 +1526,15 @@ class RoutingCopyStep2View(PlannerAccessMixin, TemplateView):
     Drugi ekran:
       - prikaz svih RoutingOperation za izabrani routing
       - čekiramo koje želimo da kopiramo
-      - potvrdom kreiramo novi Routing (ako ne postoji)
-        + nove RoutingOperation za novi SKU
-      - nakon kopije: izračunava se i ažurira target_routing.ready
+      - potvrdom kreiramo novi Routing za svaki target SKU (ako ne postoji)
+        + nove RoutingOperation (core.routings.copy_routing)
+      - nakon kopije: izračunava se i ažurira ready za sve target routinge
     """
     template_name = "planners/routing_copy_step2.html"
 
     def _get_source_and_target(self):
         """
-        Helper za izvlačenje source_routing i target_sku
+        Helper za izvlačenje source_routing i liste target SKU
         iz GET/POST parametara.
         """
         source_id = self.request.GET.get("source_id") or self.request.POST.get("source_id")
@@ -1496,12 +1548,12 @@ class RoutingCopyStep2View(PlannerAccessMixin, TemplateView):
         except Routing.DoesNotExist:
             return None, None
 
-        return source, target_sku.strip()
+        return source, split_skus(target_sku)
 
     def get(self, request, *args, **kwargs):
-        source, target_sku = self._get_source_and_target()
+        source, target_skus = self._get_source_and_target()
 
-        if not source or not target_sku:
+        if not source or not target_skus:
             messages.error(request, "Invalid copy parameters. Please start again.")
             return redirect("planners:routing_copy_step1")
 
@@ -1514,15 +1566,16 @@ class RoutingCopyStep2View(PlannerAccessMixin, TemplateView):
 
         context = {
             "source_routing": source,
-            "target_sku": target_sku,
+            "target_skus": target_skus,
+            "target_sku": ",".join(target_skus),
             "routing_ops": routing_ops,
         }
         return self.render_to_response(context)
 
     def post(self, request, *args, **kwargs):
-        source, target_sku = self._get_source_and_target()
+        source, target_skus = self._get_source_and_target()
 
-        if not source or not target_sku:
+        if not source or not target_skus:
             messages.error(request, "Invalid copy parameters. Please start again.")
             return redirect("planners:routing_copy_step1")
 
@@ -1531,76 +1584,34 @@ class RoutingCopyStep2View(PlannerAccessMixin, TemplateView):
             messages.error(request, "Please select at least one operation to copy.")
             url = (
                 reverse("planners:routing_copy_step2")
-                + f"?target_sku={target_sku}&source_id={source.pk}"
+                + "?" + urlencode({"target_sku": ",".join(target_skus), "source_id": source.pk})
             )
             return redirect(url)
 
-        # 1) napravi ili nađi ciljnu Routing kombinaciju
-        target_routing, created_routing = Routing.objects.get_or_create(
-            sku=target_sku,
-            subdepartment=source.subdepartment,
-            version=source.version,
-            defaults={
-                "version_description": source.version_description,
-                "declaration_type": source.declaration_type,
-                "status": source.status,
-                "ready": False,   # novi routing nije "ready" dok ga ne završiš
-            },
-        )
+        # kopija u sve target SKU odjednom (+ ready za sve target routinge)
+        results = copy_routing(source, target_skus, selected_ids)
 
-        created_ops = 0
-        skipped_ops = 0
-
-        for op_id in selected_ids:
-            try:
-                src_ro = RoutingOperation.objects.get(pk=op_id, routing=source)
-            except RoutingOperation.DoesNotExist:
-                continue
-
-            obj, created = RoutingOperation.objects.get_or_create(
-                routing=target_routing,
-                operation=src_ro.operation,
-                defaults={
-                    "operation_description": src_ro.operation_description,
-                    "smv": src_ro.smv,
-                    "smv_ita": src_ro.smv_ita,
-                    "final_operation": src_ro.final_operation,
-                },
-            )
-            if created:
-                created_ops += 1
-            else:
-                skipped_ops += 1
+        created_ops = sum(row["created_ops"] for row in results)
+        skipped_ops = sum(row["skipped_ops"] for row in results)
+        created_routings = sum(1 for row in results if row["created_routing"])
 
         msg = (
             f"Copied {created_ops} operation(s) from "
             f"{source.sku} / {source.subdepartment} / {source.version} "
-            f"to SKU '{target_routing.sku}'."
+            f"to {len(results)} SKU(s): {', '.join(row['sku'] for row in results)}."
         )
+        if created_routings:
+            msg += f" {created_routings} new routing(s) created."
         if skipped_ops:
             msg += f" {skipped_ops} operation(s) already existed and were skipped."
-
         messages.success(request, msg)
 
-        # -----------------------------
-        # NOVO: update target_routing.ready
-        # -----------------------------
-        try:
-            ops_qs = target_routing.routing_operations.all()
-            total_ops = ops_qs.count()
-            final_ops = ops_qs.filter(final_operation=True).count()
-
-            new_ready = (total_ops >= 1 and final_ops == 1)
-            if target_routing.ready != new_ready:
-                target_routing.ready = new_ready
-                target_routing.save(update_fields=["ready", "updated_at"])
-                messages.info(
-                    request,
-                    f"Routing '{target_routing.sku}' ready status updated to: {'Ready' if new_ready else 'Not ready'}."
-                )
-        except Exception as e:
-            # ne smemo pucati kopiranje zbog problema u update-u statusa
-            messages.warning(request, f"Warning while updating routing ready status: {e}")
+        ready_skus = [row["sku"] for row in results if row["ready"]]
+        not_ready_skus = [row["sku"] for row in results if not row["ready"]]
+        if ready_skus:
+            messages.info(request, f"Ready: {', '.join(ready_skus)}.")
+        if not_ready_skus:
+            messages.info(request, f"Not ready: {', '.join(not_ready_skus)}.")
 
         # Odmah prikažemo listu operation-a za novi routing
         # return redirect(
@@ -1611,6 +1622,78 @@ class RoutingCopyStep2View(PlannerAccessMixin, TemplateView):
         return redirect("planners:routing_list")
 
 
+# ---------- ROUTING IMPORT (XLSX / CSV) ----------
+
+class RoutingImportForm(forms.Form):
+    file = forms.FileField(
+        label="SMV sheet (.xlsx or .csv)",
+        widget=forms.ClearableFileInput(attrs={"class": "form-control", "accept": ".xlsx,.csv"}),
+    )
+
+
+class RoutingImportView(PlannerAccessMixin, View):
+    """
+    Routing / SMV import:
+      1) upload -> preview (diff: added / changed / removed operations per routing)
+      2) confirm -> apply (bulk writes + ready recompute)
+    Parsed rows are kept in the session between the two steps; the diff is
+    rebuilt on confirm so it is applied against the current data.
+    """
+    template_name = "planners/routing_import.html"
+    session_key = "routing_import_rows"
+
+    def get(self, request):
+        request.session.pop(self.session_key, None)
+        return render(request, self.template_name, {"form": RoutingImportForm()})
+
+    def post(self, request):
+        if request.POST.get("action") == "apply":
+            return self._apply(request)
+
+        form = RoutingImportForm(request.POST, request.FILES)
+        if not form.is_valid():
+            return render(request, self.template_name, {"form": form})
+
+        try:
+            rows, errors = read_routing_file(form.cleaned_data["file"])
+        except ImportFileError as e:
+            form.add_error("file", str(e))
+            return render(request, self.template_name, {"form": form})
+
+        plans, diff_errors = build_routing_diff(rows)
+        errors = sorted(errors + diff_errors)
+
+        request.session[self.session_key] = rows
+        request.session.modified = True
+
+        return render(request, self.template_name, {
+            "form": RoutingImportForm(),
+            "plans": plans,
+            "errors": errors,
+            "has_changes": any(p["added"] or p["changed"] or p["removed"] or not p["routing_id"] for p in plans),
+            "has_removed": any(p["removed"] for p in plans),
+            "removed_declarations": sum(r["declarations"] for p in plans for r in p["removed"]),
+        })
+
+    def _apply(self, request):
+        rows = request.session.pop(self.session_key, None)
+        request.session.modified = True
+        if not rows:
+            messages.error(request, "No routing import in progress. Please upload the file again.")
+            return redirect("planners:routing_import")
+
+        plans, _errors = build_routing_diff(rows)
+        result = apply_routing_diff(plans, remove_missing=bool(request.POST.get("remove_missing")))
+
+        messages.success(
+            request,
+            f"Routing import done: {result['routings']} new routing(s), "
+            f"{result['added']} operation(s) added, {result['changed']} changed, "
+            f"{result['removed']} removed."
+        )
+        return redirect("planners:routing_list")
+
+
 # ---------- OPERATION  ---------
 
 
@@ -1733,12 +1816,10 @@ class RoutingReadyMixin:
       - u svim ostalim slučajevima → routing.ready = False
     """
     def update_routing_ready(self, routing: Routing):
-        qs = routing.routing_operations.all()
-        total_ops = qs.count()
-        final_ops = qs.filter(final_operation=True).count()
-
-        routing.ready = (total_ops >= 1 and final_ops == 1)
-        routing.save(update_fields=["ready", "updated_at"])
+        # brojaci + ready se odrzavaju u core.routings (i kroz signale na RoutingOperation)
+        changed = recompute_ready([routing.pk])
+        if routing.pk in changed:
+            routing.ready = changed[routing.pk]
 
 
 class RoutingOperationListView(PlannerAccessMixin, ListView):
@@ -2079,7 +2160,7 @@ class LoginOperatorCreateView(PlannerAccessMixin, CreateView):
         team_time = provided_time or default_team_time
 
         # Validate calendar entry exists for that team_user + team_date
-        cal = Calendar.objects.filter(team_user=team_user, date=team_date).first()
+        cal = get_shift(team_user, team_date)
         if not cal:
             form.add_error(
                 "team_user",
@@ -2204,10 +2285,7 @@ class LoginOperatorUpdateView(PlannerAccessMixin, UpdateView):
             form.add_error("login_team_date", "Please provide login team date.")
             return self.form_invalid(form)
 
-        cal = Calendar.objects.filter(
-            team_user=team_user,
-            date=login_team_date
-        ).first()
+        cal = get_shift(team_user, login_team_date)
 
         if not cal:
             form.add_error(
@@ -2443,10 +2521,7 @@ class LoginOperatorLogoutSaveView(PlannerAccessMixin, View):
         logoff_time = time.fromisoformat(wip["logoff_team_time"])
         today = timezone.localdate()
 
-        calendar = Calendar.objects.filter(
-            team_user=team_user,
-            date=today
-        ).first()
+        calendar = get_shift(team_user, today)
 
         if not calendar:
             messages.error(request, "No calendar entry for today.")
@@ -2473,14 +2548,16 @@ class LoginOperatorLogoutSaveView(PlannerAccessMixin, View):
             logoff_actual__isnull=True,
         )
 
-        count = 0
-        for lo in qs:
+        sessions = list(qs)
+        for lo in sessions:
             lo.logoff_actual = now_utc
             lo.logoff_team_date = today
             lo.logoff_team_time = logoff_time
             lo.status = "COMPLETED"
-            lo.save()
-            count += 1
+            lo.updated_at = now_utc
+
+        LoginOperator.objects.bulk_update(sessions, CLOSE_FIELDS)
+        count = len(sessions)
 
         request.session.pop("logout_wip", None)
         request.session.modified = True
@@ -2489,6 +2566,29 @@ class LoginOperatorLogoutSaveView(PlannerAccessMixin, View):
         return redirect("planners:login_operator_list")
 
 
+class LoginOperatorBulkLogoutView(PlannerAccessMixin, View):
+    """
+    Logout of the selected ACTIVE sessions (any team) at the current time,
+    same IGNORE / COMPLETED rules as the team terminal logout.
+    """
+
+    def post(self, request):
+        session_ids = request.POST.getlist("session_ids")
+        if not session_ids:
+            messages.error(request, "Select at least one active login.")
+            return redirect("planners:login_operator_list")
+
+        closed = bulk_logout(LoginOperator.objects.filter(id__in=session_ids))
+
+        ignored = sum(1 for lo in closed if lo.status == "IGNORE")
+        messages.success(
+            request,
+            f"{len(closed)} operators logged out"
+            + (f" ({ignored} before shift start, status IGNORE)." if ignored else ".")
+        )
+        return redirect("planners:login_operator_list")
+
+
 class LoginOperatorLogoutCancelView(PlannerAccessMixin, View):
     def get(self, request):
         request.session.pop("logout_wip", None)
@@ -2542,10 +2642,7 @@ class ManualLogoutOperatorsView(LoginRequiredMixin, View):
             login_date = session.login_team_date
 
             try:
-                calendar_entry = Calendar.objects.filter(
-                    team_user=session.team_user,
-                    date=login_date,
-                ).first()
+                calendar_entry = get_shift(session.team_user_id, login_date)
 
                 if not calendar_entry:
                     skipped_no_calendar += 1
@@ -2785,14 +2882,10 @@ class DeclarationForm(forms.ModelForm):
             effective_pro = pro or (instance.pro if instance else None)
 
         if effective_pro:
-            qs = Routing.objects.filter(
-                status=True,
-                ready=True,
-                sku__iexact=effective_pro.sku,
-            )
-            if subdepartment:
-                qs = qs.filter(subdepartment=subdepartment)
-            self.fields["routing"].queryset = qs.order_by("sku", "version")
+            entries = ready_routings(effective_pro.sku, subdepartment)
+            self.fields["routing"].queryset = Routing.objects.filter(
+                pk__in=[e.id for e in entries]
+            ).order_by("sku", "version")
         else:
             self.fields["routing"].queryset = Routing.objects.none()
 
@@ -2809,9 +2902,9 @@ class DeclarationForm(forms.ModelForm):
             effective_routing = routing or (instance.routing if instance else None)
 
         if effective_routing:
-            self.fields["routing_operation"].queryset = (
-                effective_routing.routing_operations.all().order_by("id")
-            )
+            self.fields["routing_operation"].queryset = RoutingOperation.objects.filter(
+                pk__in=[op.id for op in routing_operations(effective_routing.pk)]
+            ).order_by("id")
         else:
             self.fields["routing_operation"].queryset = RoutingOperation.objects.none()
 
@@ -2870,6 +2963,7 @@ class _PStep2ProForm(forms.Form):
                 Pro.objects.filter(
                     pro_subdepartments__subdepartment=subdepartment,
                     pro_subdepartments__active=True,
+                    pro_subdepartments__done=False,
                     status=True,
                 )
                 .distinct()
@@ -2894,21 +2988,14 @@ class _PStep3RoutingForm(forms.Form):
             self.fields["routing"].queryset = Routing.objects.none()
             return
 
-        qs = Routing.objects.filter(
-            status=True,
-            ready=True,
-            sku__iexact=pro.sku,
-        )
-
-        if subdepartment:
-            qs = qs.filter(subdepartment=subdepartment)
-
-        qs = qs.order_by("version")
-        self.fields["routing"].queryset = qs
+        entries = ready_routings(pro.sku, subdepartment)
+        self.fields["routing"].queryset = Routing.objects.filter(
+            pk__in=[e.id for e in entries]
+        ).order_by("version")
 
         # auto-select ako ima samo jedan routing
-        if qs.count() == 1:
-            self.initial["routing"] = qs.first().id
+        if len(entries) == 1:
+            self.initial["routing"] = entries[0].id
 
 
 class _PStep4RoutingOperationForm(forms.Form):
@@ -2926,12 +3013,14 @@ class _PStep4RoutingOperationForm(forms.Form):
             self.fields["routing_operation"].queryset = RoutingOperation.objects.none()
             return
 
-        qs = routing.routing_operations.all().order_by("id")
-        self.fields["routing_operation"].queryset = qs
+        ops = routing_operations(routing.pk)
+        self.fields["routing_operation"].queryset = RoutingOperation.objects.filter(
+            pk__in=[op.id for op in ops]
+        ).order_by("id")
 
         # auto-select ako ima samo jedna operacija
-        if qs.count() == 1:
-            self.initial["routing_operation"] = qs.first().id
+        if len(ops) == 1:
+            self.initial["routing_operation"] = ops[0].id
 
 
 class _PStep5QtyForm(forms.Form):
@@ -2995,6 +3084,10 @@ class DeclarationListView(PlannerAccessMixin, ListView):
         ctx = super().get_context_data(**kwargs)
         ctx["show_all"] = self._show_all()
         ctx["decl_date_from"] = self._cutoff_date().strftime("%d.%m.%Y.")
+        ctx["export_form"] = DeclarationExportForm(initial={
+            "date_from": None if self._show_all() else self._cutoff_date(),
+            "date_to": date.today(),
+        })
         return ctx
 
 
@@ -3097,18 +3190,14 @@ class DeclarationWizardPlannerView(PlannerAccessMixin, View):
                 pass
 
         if wip.get("routing"):
-            try:
-                r = Routing.objects.get(pk=wip["routing"])
-                preview["routing"] = f"{r.sku} / {r.version}"
-            except Routing.DoesNotExist:
-                pass
+            r = get_routing(wip["routing"])
+            if r:
+                preview["routing"] = r.label
 
-        if wip.get("routing_operation"):
-            try:
-                ro = RoutingOperation.objects.select_related("operation").get(pk=wip["routing_operation"])
-                preview["routing_operation"] = ro.operation.name
-            except RoutingOperation.DoesNotExist:
-                pass
+            if wip.get("routing_operation"):
+                ro = get_routing_operation(wip["routing"], wip["routing_operation"])
+                if ro:
+                    preview["routing_operation"] = ro.name
 
         return preview
 
@@ -3208,12 +3297,8 @@ class DeclarationWizardPlannerView(PlannerAccessMixin, View):
             if form.is_valid():
                 work_date = form.cleaned_data["work_date"]
 
-                try:
-                    calendar = Calendar.objects.get(
-                        team_user_id=wip["teamuser"],
-                        date=work_date
-                    )
-                except Calendar.DoesNotExist:
+                calendar = get_shift(wip["teamuser"], work_date)
+                if not calendar:
                     messages.error(request, "No calendar entry for this date.")
                     return redirect(reverse("planners:declaration_wizard") + "?step=2")
 
@@ -3279,9 +3364,8 @@ class DeclarationWizardPlannerView(PlannerAccessMixin, View):
 
 class DeclarationSavePlannerView(PlannerAccessMixin, View):
     """
-    Create Declaration from planner_wip and clear session.
-    Uses selected work_date and Calendar.shift_start
-    for created_at / updated_at.
+    Create Declaration from planner_wip (decl_date = selected work_date)
+    and clear session.
     """
 
     def get(self, request, *args, **kwargs):
@@ -3304,19 +3388,14 @@ class DeclarationSavePlannerView(PlannerAccessMixin, View):
             return redirect(reverse("planners:declaration_list"))
 
         # -----------------------
-        # DATE + SHIFT
+        # DATE
         # -----------------------
         try:
             work_date = date.fromisoformat(wip["work_date"])
-            shift_start = time.fromisoformat(wip["shift_start"])
         except Exception:
-            messages.error(request, "Invalid date or shift data.")
+            messages.error(request, "Invalid date data.")
             return redirect(reverse("planners:declaration_wizard") + "?step=2")
 
-        decl_datetime = timezone.make_aware(
-            datetime.combine(work_date, shift_start)
-        )
-
         # -----------------------
         # DEFENSIVE CHECK
         # -----------------------
@@ -3348,38 +3427,42 @@ class DeclarationSavePlannerView(PlannerAccessMixin, View):
             messages.error(request, "Invalid quantity.")
             return redirect(reverse("planners:declaration_wizard") + "?step=6")
 
-        # -----------------------
-        # CREATE DECLARATION
-        # -----------------------
-        decl = Declaration.objects.create(
-            decl_date=work_date,
-            teamuser=teamuser,
-            subdepartment=teamuser.subdepartment,
-            pro=pro,
-            routing=routing,
-            routing_operation=routing_operation,
-            qty=qty,
-            smv=(wip.get("smv") or (routing_operation.smv if routing_operation else None)),
-            smv_ita=(wip.get("smv_ita") or (routing_operation.smv_ita if routing_operation else None)),
-            created_at=decl_datetime,
-            updated_at=decl_datetime,
-        )
-
         # -----------------------
         # OPERATORS (STEP 7)
         # -----------------------
+        operator_ids = []
         if routing.declaration_type and routing.declaration_type.strip().upper() == "OPERATOR":
             operator_ids = wip.get("operators", []) or []
 
             if not operator_ids:
-                decl.delete()
                 messages.error(
                     request,
                     "Declaration requires operators but none selected."
                 )
                 return redirect(reverse("planners:declaration_wizard") + "?step=7")
 
-            decl.operators.add(*operator_ids)
+        # -----------------------
+        # CREATE DECLARATION (+ operators, team output counters)
+        # -----------------------
+        try:
+            with transaction.atomic():
+                reserve_qty(pro, routing_operation, qty)
+                decl = Declaration.objects.create(
+                    decl_date=work_date,
+                    teamuser=teamuser,
+                    subdepartment=teamuser.subdepartment,
+                    pro=pro,
+                    routing=routing,
+                    routing_operation=routing_operation,
+                    qty=qty,
+                    smv=(wip.get("smv") or (routing_operation.smv if routing_operation else None)),
+                    smv_ita=(wip.get("smv_ita") or (routing_operation.smv_ita if routing_operation else None)),
+                )
+                if operator_ids:
+                    decl.operators.add(*operator_ids)
+        except OverDeclarationError as e:
+            messages.error(request, str(e))
+            return redirect(reverse("planners:declaration_wizard") + "?step=6")
 
         # -----------------------
         # CLEANUP & FINISH
@@ -3460,6 +3543,123 @@ class DeclarationWizardCancelView(PlannerAccessMixin, View):
 
 
 
+# ---------- DECLARATION IMPORT (XLSX / CSV) ----------
+
+class DeclarationImportForm(forms.Form):
+    file = forms.FileField(
+        label="File (.xlsx or .csv)",
+        widget=forms.ClearableFileInput(attrs={"class": "form-control", "accept": ".xlsx,.csv"}),
+    )
+
+
+class DeclarationImportView(PlannerAccessMixin, FormView):
+    """
+    Bulk import of (paper) declarations from an XLSX / CSV file.
+    Columns: date, team, pro, routing, operation, qty, operators.
+    Valid rows are imported, invalid ones are listed with their errors.
+    """
+    template_name = "planners/declaration_import.html"
+    form_class = DeclarationImportForm
+
+    def form_valid(self, form):
+        try:
+            result = import_declarations(form.cleaned_data["file"])
+        except ImportFileError as e:
+            form.add_error("file", str(e))
+            return self.form_invalid(form)
+
+        if result["created"]:
+            messages.success(self.request, f"{result['created']} declaration(s) imported.")
+        if result["skipped"]:
+            messages.info(self.request, f"{result['skipped']} row(s) already imported from this file – skipped.")
+        if result["errors"]:
+            messages.warning(self.request, f"{len(result['errors'])} row(s) not imported – see the list below.")
+        if result["over_limit"]:
+            messages.warning(
+                self.request,
+                f"{len(result['over_limit'])} imported row(s) go over the PRO qty – see the list below.",
+            )
+
+        return self.render_to_response(self.get_context_data(form=self.form_class(), result=result))
+
+
+class DeclarationExportForm(forms.Form):
+    date_from = forms.DateField(
+        label="Date from",
+        required=False,
+        widget=forms.DateInput(attrs={"type": "date", "class": "form-control form-control-sm"}),
+    )
+    date_to = forms.DateField(
+        label="Date to",
+        required=False,
+        widget=forms.DateInput(attrs={"type": "date", "class": "form-control form-control-sm"}),
+    )
+    team_user = forms.ModelChoiceField(
+        label="Team user",
+        queryset=TeamUser.objects.filter(subdepartment__isnull=False).order_by("username"),
+        required=False,
+        widget=forms.Select(attrs={"class": "form-select form-select-sm"}),
+    )
+    subdepartment = forms.ModelChoiceField(
+        label="Subdepartment",
+        queryset=Subdepartment.objects.order_by("subdepartment"),
+        required=False,
+        widget=forms.Select(attrs={"class": "form-select form-select-sm"}),
+    )
+    pro = forms.CharField(
+        label="PRO",
+        required=False,
+        widget=forms.TextInput(attrs={"class": "form-control form-control-sm", "placeholder": "PRO contains…"}),
+    )
+    format = forms.ChoiceField(
+        label="Format",
+        choices=[("xlsx", "Excel (.xlsx)"), ("csv", "CSV")],
+        initial="xlsx",
+        widget=forms.Select(attrs={"class": "form-select form-select-sm"}),
+    )
+
+    def clean(self):
+        cleaned = super().clean()
+        df = cleaned.get("date_from")
+        dt = cleaned.get("date_to")
+        if df and dt and df > dt:
+            raise ValidationError("Date from must be before date to.")
+        return cleaned
+
+
+class DeclarationExportView(PlannerAccessMixin, View):
+    """
+    Declaration export (CSV / XLSX) with date / team / subdepartment / PRO
+    filters. Rows are streamed from the database in chunks, the full set is
+    never loaded or rendered.
+    """
+
+    def get(self, request):
+        form = DeclarationExportForm(request.GET)
+        if not form.is_valid():
+            for errors in form.errors.values():
+                for err in errors:
+                    messages.error(request, err)
+            return redirect("planners:declaration_list")
+
+        data = form.cleaned_data
+        qs = declaration_queryset(
+            date_from=data["date_from"],
+            date_to=data["date_to"],
+            team_user=data["team_user"],
+            subdepartment=data["subdepartment"],
+            pro=data["pro"].strip(),
+        )
+        filename = "declarations_{}_{}".format(
+            data["date_from"].strftime("%Y%m%d") if data["date_from"] else "start",
+            data["date_to"].strftime("%Y%m%d") if data["date_to"] else "end",
+        )
+        return export_response(
+            data["format"], filename, DECLARATION_EXPORT_HEADER, declaration_rows(qs), title="Declarations"
+        )
+
+
+
 # ---------- BREAKS ----------
 
 class BreakListView(PlannerAccessMixin, ListView):
@@ -3722,10 +3922,7 @@ class OperatorBreakWizardView(PlannerAccessMixin, View):
             if form.is_valid():
                 date_val = form.cleaned_data["work_date"]
 
-                if not Calendar.objects.filter(
-                    team_user_id=wip["team_user"],
-                    date=date_val
-                ).exists():
+                if not get_shift(wip["team_user"], date_val):
                     messages.error(request, "No calendar entry for selected team and date.")
                     return self._go(2)
 
@@ -3758,34 +3955,27 @@ class OperatorBreakWizardView(PlannerAccessMixin, View):
             form = _OBStep4OperatorsForm(request.POST, queryset=ops_qs)
             if form.is_valid():
 
-                # 🚫 RESTRIKCIJA — drugi team isti dan
-                invalid_ops = []
-                for op in form.cleaned_data["operators"]:
-                    if OperatorBreak.objects.filter(
-                        operator=op,
-                        date=work_date
-                    ).exclude(team_user_id=wip["team_user"]).exists():
-                        invalid_ops.append(str(op))
+                # 🚫 RESTRIKCIJA — drugi team isti dan (provera + snimanje u core.operator_breaks)
+                conflicts, created_count, updated_count = assign_breaks(
+                    wip["team_user"],
+                    work_date,
+                    form.cleaned_data["operators"].values_list("id", flat=True),
+                    wip["break"],
+                )
 
-                if invalid_ops:
+                if conflicts:
                     messages.error(
                         request,
                         "Break NOT saved. Operator(s) already have break for another team: "
-                        + ", ".join(invalid_ops)
+                        + ", ".join(str(ob.operator) for ob in conflicts)
                     )
                     return self._go(4)
 
-                # ✅ SAVE
-                for op in form.cleaned_data["operators"]:
-                    OperatorBreak.objects.update_or_create(
-                        team_user_id=wip["team_user"],
-                        date=work_date,
-                        operator=op,
-                        defaults={"break_type_id": wip["break"]},
-                    )
-
                 request.session.pop("operator_break_wip", None)
-                messages.success(request, "Operator break(s) declared.")
+                messages.success(
+                    request,
+                    f"Operator break(s) declared: {created_count} created, {updated_count} updated."
+                )
                 return redirect("planners:operator_break_list")
 
         return self._render(request, step, form)
@@ -3835,42 +4025,21 @@ class OperatorCapacityTodayView(PlannerAccessMixin, TemplateView):
             operators__status__in=["ACTIVE", "COMPLETED"],
         ).distinct()
 
+        # closed sessions of the day, one query + sweep per operator (core.attendance)
+        attendance = {a["operator_id"]: a for a in attendance_days(selected_date, selected_date)}
+
         for op in operators:
 
             # -----------------------------
-            # LOGIN SESSIONS
+            # LOGIN SESSIONS (merged, overlaps counted once)
             # -----------------------------
-            sessions = LoginOperator.objects.filter(
-                operator=op,
-                login_team_date=selected_date,
-                status__in=["ACTIVE", "COMPLETED"],
-                login_team_time__isnull=False,
-                logoff_team_time__isnull=False,
-            ).order_by("login_team_time")
-
-            session_ranges = []
-            sessions_minutes = Decimal("0.0")
-
-            team_name = None
-            first_session = sessions.first()
-            if first_session and first_session.team_user:
-                team_name = first_session.team_user.username
-
-            for s in sessions:
-                start = s.login_team_time
-                end = s.logoff_team_time
-                if end <= start:
-                    continue
-
-                session_ranges.append(
-                    f"{start.strftime('%H:%M')}–{end.strftime('%H:%M')}"
-                )
-
-                delta = (
-                    datetime.combine(selected_date, end)
-                    - datetime.combine(selected_date, start)
-                )
-                sessions_minutes += Decimal(delta.total_seconds()) / Decimal("60")
+            presence = attendance.get(op.pk)
+            team_name = presence["teams"][0] if presence else None
+            session_ranges = [
+                format_intervals([interval]) for interval in presence["intervals"]
+            ] if presence else []
+            sessions_minutes = Decimal(str(presence["presence_min"])) if presence else Decimal("0.0")
+            overlap_minutes = presence["overlap_min"] if presence else 0
 
             # -----------------------------
             # BREAK
@@ -3940,6 +4109,7 @@ class OperatorCapacityTodayView(PlannerAccessMixin, TemplateView):
                 "operator": op,
                 "team": team_name,
                 "session_ranges": session_ranges,
+                "overlap_minutes": overlap_minutes,
                 "break_minutes": round(break_minutes, 1),
                 "downtime_minutes": round(downtime_minutes, 1),
                 "available_min": round(available_minutes, 1),
@@ -3955,6 +4125,275 @@ class OperatorCapacityTodayView(PlannerAccessMixin, TemplateView):
         return context
 
 
+# ---------- PAYROLL (PIECEWORK) ----------
+
+class PayrollReportForm(forms.Form):
+    date_from = forms.DateField(
+        label="Date from",
+        widget=forms.DateInput(attrs={"type": "date", "class": "form-control form-control-sm"}),
+    )
+    date_to = forms.DateField(
+        label="Date to",
+        widget=forms.DateInput(attrs={"type": "date", "class": "form-control form-control-sm"}),
+    )
+    period = forms.ChoiceField(
+        label="Period",
+        choices=list(PERIODS.items()),
+        initial="range",
+        widget=forms.Select(attrs={"class": "form-select form-select-sm"}),
+    )
+    split = forms.ChoiceField(
+        label="Multi-operator declarations",
+        choices=list(SPLIT_RULES.items()),
+        widget=forms.Select(attrs={"class": "form-select form-select-sm"}),
+    )
+    basis = forms.ChoiceField(
+        label="Minutes basis",
+        choices=list(SMV_BASES.items()),
+        initial="smv",
+        widget=forms.Select(attrs={"class": "form-select form-select-sm"}),
+    )
+
+    def clean(self):
+        cleaned = super().clean()
+        df = cleaned.get("date_from")
+        dt = cleaned.get("date_to")
+        if df and dt and df > dt:
+            raise ValidationError("Date from must be before date to.")
+        return cleaned
+
+
+class PayrollReportView(PlannerAccessMixin, TemplateView):
+    """
+    Earned minutes / available minutes / efficiency per operator and period
+    (core.payroll, aggregated in the database). ?export=csv|xlsx downloads
+    the same rows.
+    """
+    template_name = "planners/payroll_report.html"
+
+    def _form(self):
+        today = timezone.localdate()
+        data = self.request.GET.copy()
+        data.setdefault("date_from", today.replace(day=1).isoformat())
+        data.setdefault("date_to", today.isoformat())
+        data.setdefault("period", "range")
+        data.setdefault("split", default_split_rule())
+        data.setdefault("basis", "smv")
+        return PayrollReportForm(data)
+
+    def get(self, request, *args, **kwargs):
+        form = self._form()
+        rows = None
+        if form.is_valid():
+            data = form.cleaned_data
+            rows = payroll_report(
+                data["date_from"], data["date_to"],
+                period=data["period"], split=data["split"], basis=data["basis"],
+            )
+            fmt = request.GET.get("export")
+            if fmt in ("csv", "xlsx"):
+                filename = f"payroll_{data['date_from']:%Y%m%d}_{data['date_to']:%Y%m%d}"
+                return export_response(fmt, filename, PAYROLL_EXPORT_HEADER, payroll_export_rows(rows), title="Payroll")
+
+        return self.render_to_response(self.get_context_data(
+            form=form,
+            rows=rows,
+            query=urlencode({k: v for k, v in form.data.items() if k != "export"}),
+        ))
+
+
+class AttendanceReportForm(forms.Form):
+    date_from = forms.DateField(
+        label="Date from",
+        widget=forms.DateInput(attrs={"type": "date", "class": "form-control form-control-sm"}),
+    )
+    date_to = forms.DateField(
+        label="Date to",
+        widget=forms.DateInput(attrs={"type": "date", "class": "form-control form-control-sm"}),
+    )
+    team_user = forms.ModelChoiceField(
+        label="Team user",
+        queryset=TeamUser.objects.filter(subdepartment__isnull=False).order_by("username"),
+        required=False,
+        empty_label="ALL",
+        widget=forms.Select(attrs={"class": "form-select form-select-sm"}),
+    )
+    issues_only = forms.BooleanField(
+        label="Overlaps / gaps only",
+        required=False,
+        widget=forms.CheckboxInput(attrs={"class": "form-check-input d-block"}),
+    )
+
+    def clean(self):
+        cleaned = super().clean()
+        df = cleaned.get("date_from")
+        dt = cleaned.get("date_to")
+        if df and dt and df > dt:
+            raise ValidationError("Date from must be before date to.")
+        return cleaned
+
+
+class AttendanceReportView(PlannerAccessMixin, TemplateView):
+    """
+    Net presence per operator and day with overlapping sessions merged
+    (core.attendance). ?export=csv|xlsx streams the same rows.
+    """
+    template_name = "planners/attendance_report.html"
+
+    def get(self, request, *args, **kwargs):
+        today = timezone.localdate()
+        data = request.GET.copy()
+        data.setdefault("date_from", today.isoformat())
+        data.setdefault("date_to", today.isoformat())
+        form = AttendanceReportForm(data)
+
+        rows = None
+        if form.is_valid():
+            cleaned = form.cleaned_data
+            # open sessions of today count up to now
+            now = timezone.localtime().replace(tzinfo=None, microsecond=0)
+            days = attendance_days(cleaned["date_from"], cleaned["date_to"], team_user=cleaned["team_user"], now=now)
+            if cleaned["issues_only"]:
+                days = (a for a in days if a["overlap_min"] or a["gap_count"] or a["invalid_sessions"])
+
+            fmt = request.GET.get("export")
+            if fmt in ("csv", "xlsx"):
+                filename = f"attendance_{cleaned['date_from']:%Y%m%d}_{cleaned['date_to']:%Y%m%d}"
+                return export_response(fmt, filename, ATTENDANCE_EXPORT_HEADER, attendance_export_rows(days), title="Attendance")
+
+            rows = [dict(a, ranges=format_intervals(a["intervals"])) for a in days]
+
+        return self.render_to_response(self.get_context_data(
+            form=form,
+            rows=rows,
+            query=urlencode({k: v for k, v in form.data.items() if k != "export"}),
+        ))
+
+
+class DowntimeReportForm(forms.Form):
+    date_from = forms.DateField(
+        label="Date from",
+        widget=forms.DateInput(attrs={"type": "date", "class": "form-control form-control-sm"}),
+    )
+    date_to = forms.DateField(
+        label="Date to",
+        widget=forms.DateInput(attrs={"type": "date", "class": "form-control form-control-sm"}),
+    )
+    subdepartment = forms.ModelChoiceField(
+        label="Subdepartment",
+        queryset=Subdepartment.objects.all(),
+        required=False,
+        empty_label="ALL",
+        widget=forms.Select(attrs={"class": "form-select form-select-sm"}),
+    )
+
+    def clean(self):
+        cleaned = super().clean()
+        df = cleaned.get("date_from")
+        dt = cleaned.get("date_to")
+        if df and dt and df > dt:
+            raise ValidationError("Date from must be before date to.")
+        return cleaned
+
+
+class DowntimeReportView(PlannerAccessMixin, TemplateView):
+    """
+    Downtime Pareto by type, team / subdepartment split and daily trend for
+    a date range (core.downtime_report: one grouped query, cached per range).
+    """
+    template_name = "planners/downtime_report.html"
+
+    def get(self, request, *args, **kwargs):
+        today = timezone.localdate()
+        data = request.GET.copy()
+        data.setdefault("date_from", (today - timedelta(days=29)).isoformat())
+        data.setdefault("date_to", today.isoformat())
+        form = DowntimeReportForm(data)
+
+        report = None
+        if form.is_valid():
+            subdepartment = form.cleaned_data["subdepartment"]
+            report = downtime_report(
+                form.cleaned_data["date_from"],
+                form.cleaned_data["date_to"],
+                subdepartment.pk if subdepartment else None,
+            )
+
+        chart = None
+        if report:
+            chart = {
+                "pareto": {
+                    "labels": [r["label"] for r in report["pareto"]],
+                    "minutes": [float(r["minutes"]) for r in report["pareto"]],
+                    "cumulative": [float(r["cumulative"]) for r in report["pareto"]],
+                },
+                "trend": report["trend"],
+            }
+
+        return self.render_to_response(self.get_context_data(form=form, report=report, chart=chart))
+
+
+# ---------- DATA INTEGRITY ----------
+
+class IntegrityIssueListView(PlannerAccessMixin, ListView):
+    """
+    Issues written by the integrity scanner (core.integrity), open ones by
+    default, with links to the session / declaration to fix.
+    """
+    model = IntegrityIssue
+    template_name = "planners/integrity_issue_list.html"
+    context_object_name = "issues"
+    paginate_by = None
+    max_rows = 2000
+
+    def _filters(self):
+        kind = self.request.GET.get("kind", "")
+        if kind not in INTEGRITY_KINDS:
+            kind = ""
+        state = self.request.GET.get("state", "open")
+        if state not in ("open", "resolved", "all"):
+            state = "open"
+        return kind, state
+
+    def get_queryset(self):
+        kind, state = self._filters()
+        qs = IntegrityIssue.objects.select_related("login_operator__team_user", "declaration")
+        if kind:
+            qs = qs.filter(kind=kind)
+        if state == "open":
+            qs = qs.filter(resolved_at__isnull=True)
+        elif state == "resolved":
+            qs = qs.filter(resolved_at__isnull=False)
+        return qs.order_by("-day", "kind", "id")[:self.max_rows]
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        kind, state = self._filters()
+        counts = dict(
+            IntegrityIssue.objects
+            .filter(resolved_at__isnull=True)
+            .order_by()
+            .values_list("kind")
+            .annotate(n=Count("id"))
+        )
+        context["kinds"] = [(k, label, counts.get(k, 0)) for k, label in IntegrityIssue.KIND_CHOICES]
+        context["selected_kind"] = kind
+        context["selected_state"] = state
+        context["max_rows"] = self.max_rows
+        context["last_scan"] = IntegrityIssue.objects.aggregate(last=Max("last_seen_at"))["last"]
+        return context
+
+
+class IntegrityScanView(PlannerAccessMixin, View):
+    def post(self, request):
+        result = run_integrity_scan()
+        found = sum(r[0] for r in result.values())
+        new = sum(r[1] for r in result.values())
+        resolved = sum(r[2] for r in result.values())
+        messages.success(request, f"Scan finished: {found} open issue(s), {new} new, {resolved} resolved.")
+        return redirect("planners:integrity_issue_list")
+
+
 
 # ---------- DOWNTIME  ------------
 
@@ -4437,13 +4876,12 @@ class DowntimeDeclarationSaveView(PlannerAccessMixin, View):
         # -----------------------
         # CREATE DECLARATIONS
         # -----------------------
-        for lo_id in wip["login_operators"]:
-            DowntimeDeclaration.objects.create(
-                login_operator_id=lo_id,
-                downtime_id=wip["downtime"],
-                downtime_value=downtime_value,
-                repetition=repetition,
-            )
+        created = create_downtime_declarations(
+            wip["login_operators"],
+            wip["downtime"],
+            downtime_value,
+            repetition,
+        )
 
         # -----------------------
         # CLEAN SESSION
@@ -4453,7 +4891,7 @@ class DowntimeDeclarationSaveView(PlannerAccessMixin, View):
 
         messages.success(
             request,
-            "Downtime declarations created."
+            f"{created} downtime declaration(s) created."
         )
 
         return redirect("planners:downtime_declaration_list")
@@ -4598,7 +5036,52 @@ def dashboard_view(request):
 
 
 # ---------- AJAX ENDPOINTS ----------
+#
+# Lookups answer conditional GETs: the ETag is built from cheap version
+# markers (catalog version stamps, max updated_at) so an unchanged result
+# is answered with 304 Not Modified before the main query runs.
+
+def _etag(*parts):
+    return hashlib.md5(":".join(str(p) for p in parts).encode()).hexdigest()
+
+
+def _routings_etag(request):
+    pro_id = request.GET.get("pro_id")
+    sku = None
+    if pro_id:
+        try:
+            sku = Pro.objects.filter(pk=pro_id).values_list("sku", flat=True).first()
+        except (TypeError, ValueError):
+            pass
+    return _etag("routings", catalog_version(), pro_id, sku, request.GET.get("subdepartment"))
 
+
+def _routing_operations_etag(request):
+    return _etag("routing_operations", catalog_version(), request.GET.get("routing_id"))
+
+
+def _teamuser_etag(request):
+    return _etag("teamuser", get_version("teamusers"), request.GET.get("teamuser_id"))
+
+
+def _team_user_active_logins_etag(request):
+    team_user_id = request.GET.get("team_user")
+    today = timezone.localdate()
+    marker = None
+    if team_user_id:
+        try:
+            marker = (
+                LoginOperator.objects
+                .filter(team_user_id=team_user_id, login_team_date=today)
+                .aggregate(cnt=Count("id"), last=Max("updated_at"))
+            )
+        except (TypeError, ValueError):
+            pass
+    return _etag("active_logins", today, team_user_id, marker)
+
+
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_routings_etag)
 def ajax_get_routings(request):
     pro_id = request.GET.get("pro_id")
     subdep_id = request.GET.get("subdepartment")  # optional: filter by subdepartment id
@@ -4606,33 +5089,33 @@ def ajax_get_routings(request):
     if pro_id:
         try:
             pro = Pro.objects.get(pk=pro_id)
-            qs = Routing.objects.filter(status=True, ready=True, sku=pro.sku)
-            if subdep_id:
-                try:
-                    sd = Subdepartment.objects.get(pk=subdep_id)
-                    qs = qs.filter(subdepartment=sd)
-                except Subdepartment.DoesNotExist:
-                    # ignore invalid subdepartment param
-                    pass
-            data = [{"id": r.id, "text": f"{r.sku} / {r.version}"} for r in qs.order_by("version")]
+            try:
+                sd_id = int(subdep_id) if subdep_id else None
+            except ValueError:
+                sd_id = None
+            if sd_id is not None and not Subdepartment.objects.filter(pk=sd_id).exists():
+                # ignore invalid / unknown subdepartment param
+                sd_id = None
+            entries = sorted(ready_routings(pro.sku, sd_id), key=lambda r: r.version)
+            data = [{"id": r.id, "text": r.label} for r in entries]
         except Pro.DoesNotExist:
             pass
     return JsonResponse({"results": data})
 
 
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_routing_operations_etag)
 def ajax_get_routing_operations(request):
     routing_id = request.GET.get("routing_id")
     data = []
     if routing_id:
-        try:
-            routing = Routing.objects.get(pk=routing_id)
-            qs = routing.routing_operations.all().order_by("id")
-            data = [{"id": ro.id, "text": ro.operation.name} for ro in qs]
-        except Routing.DoesNotExist:
-            pass
+        # routing catalog: operations with names, no per-row operation lookup
+        data = [{"id": ro.id, "text": ro.name} for ro in routing_operations(routing_id)]
     return JsonResponse({"results": data})
 
 
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_teamuser_etag)
 def ajax_get_teamuser(request):
     """
     Returns JSON { subdepartment_id: <id or ''>, subdepartment_name: <name or ''> }
@@ -4654,6 +5137,8 @@ def ajax_get_teamuser(request):
     return JsonResponse(data)
 
 
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_team_user_active_logins_etag)
 def ajax_team_user_active_logins(request):
     team_user_id = request.GET.get("team_user")
     today = timezone.localdate()
@@ -150,6 +150,27 @@ AUTH_USER_MODEL = 'core.TeamUser'
 SESSION_COOKIE_AGE = 365 * 24 * 60 * 60  # 365 days
 SESSION_EXPIRE_AT_BROWSER_CLOSE = False  # Don't expire session when browser is closed
 
+# Shared cache (version stamps for in-process lookup caches, see core/caching.py).
+# File based so that web workers and scheduled management commands on the same
+# server see the same stamps.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': config('CACHE_LOCATION', default=os.path.join(BASE_DIR, 'cache')),
+    }
+}
+
+# Payroll report: default split of multi-operator declarations
+# ('equal' = minutes divided between co-operators, 'full' = full minutes each)
+PAYROLL_SPLIT_RULE = config('PAYROLL_SPLIT_RULE', default='equal')
+
+# PRO completion from final operation output (core.pro_completion)
+# ('flag' = mark completed only, 'deactivate' = also switch the PRO off)
+PRO_COMPLETION_MODE = config('PRO_COMPLETION_MODE', default='flag')
+
+# Max declared qty per PRO operation = PRO qty + this % (negative = no check, core.wip.reserve_qty)
+DECLARATION_QTY_TOLERANCE = config('DECLARATION_QTY_TOLERANCE', default=5, cast=int)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
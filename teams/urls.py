@@ -7,12 +7,19 @@ app_name = 'teams'
 
 urlpatterns = [
     path('dashboard/', TeamDashboardView.as_view(), name='team_dashboard'),
+    path('dashboard/timeline/', TeamOutputTimelineView.as_view(), name='team_output_timeline'),
     path('operators/login/', OperatorLoginView.as_view(), name='operator_login'),
+    path('operators/login/batch/', OperatorBatchLoginView.as_view(), name='operator_login_batch'),
     path('operators/logout/', OperatorLogoutView.as_view(), name='operator_logout'),
+    path('operators/logout/bulk/', OperatorBulkLogoutView.as_view(), name='operator_logout_bulk'),
 
     path('declare-output/', DeclarationWizardView.as_view(), name='declare_output'),
     path('declare-output/save/', DeclarationSaveView.as_view(), name='declare_output_save'),
     path('declare-output/cancel/', DeclarationWizardCancelView.as_view(), name='declare_output_cancel'),
+    path('declare-output/quick/', DeclarationQuickView.as_view(), name='declare_output_quick'),
+    path('declare-output/catalog/', DeclarationCatalogView.as_view(), name='declare_output_catalog'),
+    path('declare-output/quick/save/', DeclarationQuickSaveView.as_view(), name='declare_output_quick_save'),
+    path('ingest/', TeamIngestView.as_view(), name='ingest'),
 
     path("declare-break/", DeclareBreakWizardView.as_view(), name="declare_break"),
     path("declare-break/save/", DeclareBreakSaveView.as_view(), name="declare_break_save"),
@@ -7,12 +7,28 @@ from django.contrib import messages
 from django.utils import timezone
 from django.urls import reverse
 from django.forms.widgets import CheckboxSelectMultiple, HiddenInput
-from datetime import datetime, timedelta
-from django.db.models import Min, Sum
-from collections import defaultdict
+import json
+from django.db import IntegrityError
+from django.db.models import Min
+from django.http import JsonResponse
 
 
 from core.models import *
+from core.badges import resolve_badge
+from core.roles import has_role, ROLE_TEAMS
+from core.shifts import get_shift, shift_state
+from core.output_counters import dashboard_rows
+from core.output_timeline import team_timeline
+from core.routing_catalog import get_routing, get_routing_operation, ready_routings, routing_operations
+from core.declarations import (
+    TeamDeclarationValidator, create_downtime_declarations, create_team_declaration, declarable_logins,
+    ingest_team_batch,
+)
+from core.operator_breaks import assign_breaks
+from core.wip import OverDeclarationError
+from core.operator_sessions import (
+    batch_login, bulk_logout, close_session, login_block_reason, login_team_time,
+)
 
 
 class TeamAccessMixin(LoginRequiredMixin, UserPassesTestMixin):
@@ -20,7 +36,7 @@ class TeamAccessMixin(LoginRequiredMixin, UserPassesTestMixin):
 
     def test_func(self):
         user = self.request.user
-        return user.is_superuser or user.groups.filter(name__iexact="TEAMS").exists()
+        return user.is_superuser or has_role(user, ROLE_TEAMS)
 
 
 # ---------- DASHBOARD  ----------
@@ -36,35 +52,14 @@ class TeamDashboardView(TeamAccessMixin, TemplateView):
         current_time = now_local.time()
 
         # današnja smena za ovog team user-a (ako postoji)
-        calendar_entry = Calendar.objects.filter(
-            team_user=self.request.user,
-            date=today,
-        ).first()
-
-        # default vrednosti
-        shift_state = None          # "active", "inactive", "no_shift"
-        shift_alert_class = None    # "success", "warning", "danger"
-
-        if calendar_entry:
-            shift_start = calendar_entry.shift_start
-            shift_end = calendar_entry.shift_end
-
-            if shift_start <= current_time <= shift_end:
-                # smena upravo traje
-                shift_state = "active"
-                shift_alert_class = "success"
-            else:
-                # postoji smena, ali trenutno nije u toku
-                shift_state = "inactive"
-                shift_alert_class = "warning"
-        else:
-            # nema smene za danas
-            shift_state = "no_shift"
-            shift_alert_class = "danger"
+        calendar_entry = get_shift(self.request.user, today)
+
+        # "active" / "inactive" / "no_shift" + "success" / "warning" / "danger"
+        state, alert_class = shift_state(calendar_entry, current_time)
 
         context["calendar_entry"] = calendar_entry
-        context["shift_state"] = shift_state
-        context["shift_alert_class"] = shift_alert_class
+        context["shift_state"] = state
+        context["shift_alert_class"] = alert_class
 
         # Operators logged in today for this team
         today_logins = (
@@ -76,37 +71,18 @@ class TeamDashboardView(TeamAccessMixin, TemplateView):
         )
         context['today_logins'] = today_logins
 
-        # Declarations today: qty summed per operator per operation
-        decl_rows = (
-            Declaration.objects
-            .filter(teamuser=self.request.user, decl_date=today)
-            .values(
-                'operators__id',
-                'operators__badge_num',
-                'operators__name',
-                'routing_operation__operation__name',
-            )
-            .annotate(total_qty=Sum('qty'))
-            .order_by('operators__name', 'routing_operation__operation__name')
-        )
+        # Declarations today: qty per operator per operation (team output counters)
+        context['op_data'] = dashboard_rows(self.request.user, today)
+        return context
 
-        op_data = defaultdict(lambda: {'badge': '', 'name': '', 'operations': [], 'total': 0})
-        for row in decl_rows:
-            key = row['operators__id'] if row['operators__id'] is not None else '__team__'
-            if key == '__team__':
-                op_data[key]['badge'] = '-'
-                op_data[key]['name'] = '(Team)'
-            else:
-                op_data[key]['badge'] = row['operators__badge_num'] or ''
-                op_data[key]['name'] = row['operators__name'] or ''
-            op_data[key]['operations'].append({
-                'operation': row['routing_operation__operation__name'] or '-',
-                'qty': row['total_qty'],
-            })
-            op_data[key]['total'] += row['total_qty']
 
-        context['op_data'] = list(op_data.values())
-        return context
+class TeamOutputTimelineView(TeamAccessMixin, View):
+    """
+    Hourly output (pieces + SMV minutes) of the team for today, JSON for the
+    dashboard chart (core.output_timeline, closed hours cached).
+    """
+    def get(self, request, *args, **kwargs):
+        return JsonResponse(team_timeline(request.user, timezone.localdate()))
 
 
 # ---------- FORM ----------
@@ -135,28 +111,10 @@ class OperatorLoginView(TeamAccessMixin, TemplateView):
         context["login_form"] = OperatorLoginForm()
 
         # današnja smena za ovog team user-a
-        calendar_entry = Calendar.objects.filter(
-            team_user=self.request.user,
-            date=today,
-        ).first()
-
-        # default vrednosti za status smene
-        shift_state = None          # "active", "inactive", "no_shift"
-        shift_alert_class = None    # "success", "warning", "danger"
-
-        if calendar_entry:
-            shift_start = calendar_entry.shift_start
-            shift_end = calendar_entry.shift_end
-
-            if shift_start <= current_time <= shift_end:
-                shift_state = "active"
-                shift_alert_class = "success"
-            else:
-                shift_state = "inactive"
-                shift_alert_class = "warning"
-        else:
-            shift_state = "no_shift"
-            shift_alert_class = "danger"
+        calendar_entry = get_shift(self.request.user, today)
+
+        # status smene
+        state, alert_class = shift_state(calendar_entry, current_time)
 
         # aktivne sesije ovog tima
         active_sessions = (
@@ -165,8 +123,8 @@ class OperatorLoginView(TeamAccessMixin, TemplateView):
         )
 
         context["calendar_entry"] = calendar_entry
-        context["shift_state"] = shift_state
-        context["shift_alert_class"] = shift_alert_class
+        context["shift_state"] = state
+        context["shift_alert_class"] = alert_class
         context["active_sessions"] = active_sessions
         return context
 
@@ -178,9 +136,9 @@ class OperatorLoginView(TeamAccessMixin, TemplateView):
 
         badge_num = form.cleaned_data["badge_num"]
 
-        try:
-            operator = Operator.objects.get(badge_num__iexact=badge_num, act=True)
-        except Operator.DoesNotExist:
+        # in-memory badge index (DB fallback on miss)
+        operator = resolve_badge(badge_num)
+        if operator is None:
             messages.error(request, "Operator not found or not active.")
             return redirect("teams:operator_login")
 
@@ -190,107 +148,48 @@ class OperatorLoginView(TeamAccessMixin, TemplateView):
         current_date = local_now.date()
         current_time = local_now.time()
 
-        # mora da postoji današnja smena za OVAJ tim
-        calendar_entry = Calendar.objects.filter(
-            team_user=request.user,
-            date=current_date,
-        ).first()
+        # mora da postoji današnja smena za OVAJ tim, i ne sme posle kraja smene
+        calendar_entry = get_shift(request.user, current_date)
 
-        if not calendar_entry:
-            messages.error(
-                request,
-                "You cannot log in operators – no shift found in Calendar for today.",
-            )
-            return redirect("teams:operator_login")
-
-        shift_start = calendar_entry.shift_start
-        shift_end = calendar_entry.shift_end
-
-        # ne sme posle kraja smene
-        if current_time > shift_end:
-            messages.error(request, "You cannot log in operators after the end of the shift.")
+        error = login_block_reason(calendar_entry, current_time)
+        if error:
+            messages.error(request, error)
             return redirect("teams:operator_login")
 
         # --- PROVERA POSTOJEĆIH AKTIVNIH SESIJA ---
 
-        active_today_qs = LoginOperator.objects.filter(
-            operator=operator,
+        active_today = list(LoginOperator.objects.filter(
+            operator_id=operator.id,
             status="ACTIVE",
             login_team_date=current_date,
-        )
+        ))
 
         # 1) već prijavljen u istom timu
-        same_team_session = active_today_qs.filter(team_user=request.user).first()
-        if same_team_session:
+        if any(s.team_user_id == request.user.pk for s in active_today):
             messages.error(request, "This operator is already logged in this team today.")
             return redirect("teams:operator_login")
 
         # 2) prijavljen u drugom timu → auto logout
-        other_team_sessions = active_today_qs.exclude(team_user=request.user)
-
-        for s in other_team_sessions:
-            other_calendar = Calendar.objects.filter(
-                team_user=s.team_user,
-                date=current_date,
-            ).first()
-
-            s.logoff_actual = now  # UTC
-
-            if other_calendar:
-                other_shift_start = other_calendar.shift_start
-                other_shift_end = other_calendar.shift_end
-
-                login_local_time = timezone.localtime(s.login_actual).time()
-
-                # IGNORE: login i logout pre smene
-                if login_local_time < other_shift_start and current_time < other_shift_start:
-                    s.logoff_team_date = other_calendar.date
-                    s.logoff_team_time = other_shift_start
-                    s.status = "IGNORE"
-                else:
-                    s.logoff_team_date = other_calendar.date
-                    if current_time <= other_shift_end:
-                        s.logoff_team_time = current_time
-                    else:
-                        s.logoff_team_time = other_shift_end
-                    s.status = "COMPLETED"
-            else:
-                s.logoff_team_date = current_date
-                s.logoff_team_time = current_time
-                s.status = "COMPLETED"
-
+        for s in active_today:
+            close_session(s, now, get_shift(s.team_user_id, current_date))
             s.save()
 
-        if other_team_sessions.exists():
+        if active_today:
             messages.info(
                 request,
                 "Operator was logged out from another team and will be logged in to this team.",
             )
 
-        # ------------------------------------------------------------------
         # LOGIN TEAM TIME LOGIKA (sa login_grace_period)
-        # ------------------------------------------------------------------
-
-        grace_minutes = request.user.login_grace_period or 0
-
-        shift_start_dt = datetime.combine(current_date, shift_start)
-        grace_limit_dt = shift_start_dt + timedelta(minutes=grace_minutes)
-        current_dt = datetime.combine(current_date, current_time)
-
-        if current_dt <= grace_limit_dt:
-            # pre smene ili unutar grace perioda
-            team_time = shift_start
-        else:
-            # posle grace perioda
-            team_time = current_time
-
-        team_date = calendar_entry.date
+        team_time = login_team_time(
+            calendar_entry, current_date, current_time, request.user.login_grace_period
+        )
 
         LoginOperator.objects.create(
-            operator=operator,
+            operator_id=operator.id,
             team_user=request.user,
             login_actual=now,          # UTC
-            login_team_date=team_date,
+            login_team_date=calendar_entry.date,
             login_team_time=team_time, # lokalno, sa grace logikom
         )
 
@@ -298,6 +197,36 @@ class OperatorLoginView(TeamAccessMixin, TemplateView):
         return redirect("teams:operator_login")
 
 
+# ---------- BATCH LOGIN (shift start, više bedževa odjednom) ----------
+
+class OperatorBatchLoginView(OperatorLoginView):
+    """
+    Textarea with many badges (one per line / space separated).
+    Same rules as the single login; result is shown per badge.
+    """
+
+    def post(self, request, *args, **kwargs):
+        badges = request.POST.get("badges", "").split()
+        if not badges:
+            messages.error(request, "Enter at least one badge number.")
+            return redirect("teams:operator_login")
+
+        error, results = batch_login(request.user, badges)
+        if error:
+            messages.error(request, error)
+            return redirect("teams:operator_login")
+
+        logged_in = sum(1 for r in results if r["status"] in ("logged_in", "moved"))
+        if logged_in:
+            messages.success(request, f"{logged_in} operator(s) logged in.")
+        if logged_in < len(results):
+            messages.warning(request, f"{len(results) - logged_in} badge(s) not logged in, see the list below.")
+
+        context = self.get_context_data(**kwargs)
+        context["batch_results"] = results
+        return self.render_to_response(context)
+
+
 # ---------- LOGOUT PAGE ----------
 
 class OperatorLogoutView(TeamAccessMixin, TemplateView):
@@ -308,7 +237,7 @@ class OperatorLogoutView(TeamAccessMixin, TemplateView):
 
         today = timezone.localdate()
 
-        context["calendar_entry"] = Calendar.objects.filter(team_user=self.request.user, date=today).first()
+        context["calendar_entry"] = get_shift(self.request.user, today)
 
         context["active_sessions"] = (
             LoginOperator.objects.filter(team_user=self.request.user, status="ACTIVE").select_related("operator")
@@ -322,43 +251,15 @@ class OperatorLogoutView(TeamAccessMixin, TemplateView):
         now = timezone.now()
         local_now = timezone.localtime(now)
         current_date = local_now.date()
-        current_time = local_now.time()
-
-        calendar_entry = Calendar.objects.filter(team_user=request.user, date=current_date).first()
-
-        # default fallback (lokalno)
-        team_date = current_date
-        team_time = current_time
-        new_status = "COMPLETED"
 
-        if calendar_entry:
-            shift_start = calendar_entry.shift_start
-            shift_end = calendar_entry.shift_end
+        calendar_entry = get_shift(request.user, current_date)
 
-            login_local_time = timezone.localtime(session.login_actual).time()
-
-            # slučaj IGNORE: prijava i odjava pre početka smene
-            if login_local_time < shift_start and current_time < shift_start:
-                team_date = calendar_entry.date
-                team_time = shift_start
-                new_status = "IGNORE"
-            else:
-                # standardna logika:
-                # - u toku smene -> actual
-                # - posle smene -> shift_end
-                team_date = calendar_entry.date
-                if current_time <= shift_end:
-                    team_time = current_time
-                else:
-                    team_time = shift_end
-        # ako nema calendar_entry, ostaje fallback COMPLETED + actual
-
-        session.logoff_actual = now  # UTC
-        session.logoff_team_date = team_date
-        session.logoff_team_time = team_time
-        session.status = new_status
+        # IGNORE (prijava i odjava pre smene) / COMPLETED (actual ili shift_end)
+        close_session(session, now, calendar_entry)
         session.save()
 
+        new_status = session.status
+
         if new_status == "IGNORE":
             messages.info(request, f"Operator {session.operator} logged out before shift start (status IGNORE).")
         else:
@@ -366,6 +267,34 @@ class OperatorLogoutView(TeamAccessMixin, TemplateView):
         return redirect("teams:operator_logout")
 
 
+
+class OperatorBulkLogoutView(TeamAccessMixin, View):
+    """
+    Logout of selected (session_ids) or all ACTIVE sessions of this team,
+    same IGNORE / COMPLETED rules as the single logout.
+    """
+
+    def post(self, request, *args, **kwargs):
+        sessions = LoginOperator.objects.filter(team_user=request.user)
+
+        if request.POST.get("all") != "1":
+            session_ids = request.POST.getlist("session_ids")
+            if not session_ids:
+                messages.error(request, "Select at least one operator.")
+                return redirect("teams:operator_logout")
+            sessions = sessions.filter(id__in=session_ids)
+
+        closed = bulk_logout(sessions)
+
+        ignored = sum(1 for s in closed if s.status == "IGNORE")
+        if ignored:
+            messages.info(request, f"{ignored} operator(s) logged out before shift start (status IGNORE).")
+        if len(closed) - ignored:
+            messages.success(request, f"{len(closed) - ignored} operator(s) logged out.")
+        if not closed:
+            messages.warning(request, "No active operators to log out.")
+        return redirect("teams:operator_logout")
+
 # ---------- DECLARATION WIZARD (multi-step, inline forms) ----------
 
 
@@ -379,6 +308,7 @@ class _Step1ProForm(forms.Form):
             self.fields["pro"].queryset = Pro.objects.filter(
                 pro_subdepartments__subdepartment=subdepartment,
                 pro_subdepartments__active=True,
+                pro_subdepartments__done=False,
                 status=True,
             ).distinct()
         # widget attrs so Select2 / styling picks it up
@@ -404,21 +334,15 @@ class _Step2RoutingForm(forms.Form):
             self.fields["routing"].queryset = Routing.objects.none()
             return
 
-        qs = Routing.objects.filter(
-            status=True,
-            ready=True,
-            sku__iexact=pro.sku,
-        )
-
-        if subdepartment:
-            qs = qs.filter(subdepartment=subdepartment)
-
-        qs = qs.order_by("sku", "version")
-        self.fields["routing"].queryset = qs
+        # ready routings iz routing cataloga (bez upita dok se routing ne promeni)
+        entries = ready_routings(pro.sku, subdepartment)
+        self.fields["routing"].queryset = Routing.objects.filter(
+            pk__in=[e.id for e in entries]
+        ).order_by("sku", "version")
 
         # ✅ AUTO SELECT ako postoji samo jedan routing
-        if qs.count() == 1:
-            self.initial["routing"] = qs.first().id
+        if len(entries) == 1:
+            self.initial["routing"] = entries[0].id
 
 
 class _Step3RoutingOperationForm(forms.Form):
@@ -436,12 +360,14 @@ class _Step3RoutingOperationForm(forms.Form):
             self.fields["routing_operation"].queryset = RoutingOperation.objects.none()
             return
 
-        qs = routing.routing_operations.all().order_by("operation__name")
-        self.fields["routing_operation"].queryset = qs
+        ops = routing_operations(routing.pk)
+        self.fields["routing_operation"].queryset = RoutingOperation.objects.filter(
+            pk__in=[op.id for op in ops]
+        ).order_by("operation__name")
 
         # ✅ AUTO SELECT ako postoji samo jedna operacija
-        if qs.count() == 1:
-            self.initial["routing_operation"] = qs.first().id
+        if len(ops) == 1:
+            self.initial["routing_operation"] = ops[0].id
 
 
 class _Step4QtyForm(forms.Form):
@@ -678,17 +604,15 @@ class TeamDowntimeSaveView(TeamAccessMixin, View):
             messages.error(request, "No downtime in progress.")
             return redirect("teams:team_dashboard")
 
-        for lo_id in wip["login_operators"]:
-            DowntimeDeclaration.objects.create(
-                login_operator_id=lo_id,
-                downtime_id=wip["downtime"],
-                downtime_value=Decimal(wip["downtime_value"]),
-                repetition=int(wip["repetition"]),
-                downtime_total=Decimal(wip["downtime_total"]),
-            )
+        created = create_downtime_declarations(
+            wip["login_operators"],
+            wip["downtime"],
+            Decimal(wip["downtime_value"]),
+            int(wip["repetition"]),
+        )
 
         request.session.pop("team_downtime_wip", None)
-        messages.success(request, "Downtime declared.")
+        messages.success(request, f"Downtime declared for {created} operator(s).")
         return redirect("teams:team_dashboard")
 
 
@@ -727,21 +651,15 @@ def _build_wip_preview(wip):
 
     # Routing
     routing_id = wip.get("routing")
+    routing = get_routing(routing_id) if routing_id else None
     if routing_id:
-        try:
-            routing = Routing.objects.get(pk=routing_id)
-            preview["routing_label"] = f"{routing.sku} / {routing.version}"
-        except Routing.DoesNotExist:
-            preview["routing_label"] = f"ID:{routing_id}"
+        preview["routing_label"] = routing.label if routing else f"ID:{routing_id}"
 
     # RoutingOperation
     ro_id = wip.get("routing_operation")
     if ro_id:
-        try:
-            ro = RoutingOperation.objects.select_related("operation").get(pk=ro_id)
-            preview["operation_name"] = str(ro.operation)
-        except RoutingOperation.DoesNotExist:
-            preview["operation_name"] = f"ID:{ro_id}"
+        ro = get_routing_operation(routing_id, ro_id) if routing else None
+        preview["operation_name"] = str(ro) if ro else f"ID:{ro_id}"
 
     # Operators (names)
     op_ids = wip.get("operators", []) or []
@@ -950,26 +868,22 @@ class DeclarationSaveView(TeamAccessMixin, View):
             messages.error(request, "Invalid quantity.")
             return redirect(f"{reverse('teams:declare_output')}?step=4")
 
-        decl = Declaration.objects.create(
-            decl_date=timezone.localdate(),
-            teamuser=request.user,
-            subdepartment=request.user.subdepartment,
-            pro=pro,
-            routing=routing,
-            routing_operation=routing_operation,
-            qty=qty,
-            smv=(wip.get("smv") or (routing_operation.smv if routing_operation else None)),
-            smv_ita=(wip.get("smv_ita") or (routing_operation.smv_ita if routing_operation else None)),
-        )
-
         # if routing requires operators
+        operator_ids = []
         if routing.declaration_type and routing.declaration_type.strip().upper() == "OPERATOR":
             operator_ids = wip.get("operators", [])
             if not operator_ids:
-                decl.delete()
                 messages.error(request, "Declaration requires operators but none selected.")
                 return redirect(f"{reverse('teams:declare_output')}?step=5")
-            decl.operators.add(*operator_ids)
+
+        try:
+            create_team_declaration(
+                request.user, pro, routing, routing_operation, qty, operator_ids,
+                smv=wip.get("smv"), smv_ita=wip.get("smv_ita"),
+            )
+        except OverDeclarationError as e:
+            messages.error(request, str(e))
+            return redirect(f"{reverse('teams:declare_output')}?step=4")
 
         _clear_decl_session(request.session)
         messages.success(request, f"Declaration saved.")
@@ -994,6 +908,174 @@ class DeclarationWizardCancelView(TeamAccessMixin, View):
 
 
 
+
+# ---------- DECLARATION (one page: catalog JSON + single save) ----------
+
+def _declaration_catalog(team_user):
+    """
+    Everything the one-page declaration needs in one response:
+    active PROs of the team's subdepartment -> ready routings -> operations
+    (routing catalog), plus operators logged in to this team today.
+    """
+    subdep = team_user.subdepartment
+    today = timezone.localdate()
+
+    pros = list(
+        Pro.objects.filter(
+            pro_subdepartments__subdepartment=subdep,
+            pro_subdepartments__active=True,
+            pro_subdepartments__done=False,
+            status=True,
+        )
+        .distinct()
+        .order_by("pro_name")
+        .values("id", "pro_name", "sku")
+    )
+
+    def _routings(sku):
+        # routing catalog: served from memory until a routing/operation changes
+        return [
+            {
+                "id": r.id,
+                "label": r.label,
+                "declaration_type": (r.declaration_type or "").strip().upper(),
+                "operations": [
+                    {
+                        "id": op.id,
+                        "name": op.name,
+                        "smv": str(op.smv) if op.smv is not None else None,
+                        "smv_ita": str(op.smv_ita) if op.smv_ita is not None else None,
+                        "final": op.final_operation,
+                    }
+                    for op in sorted(r.operations, key=lambda op: op.name or "")
+                ],
+            }
+            for r in ready_routings(sku, subdep)
+        ]
+
+    operators = list(
+        Operator.objects
+        .filter(id__in=declarable_logins(team_user, today).values_list("operator_id", flat=True))
+        .order_by("badge_num")
+        .values("id", "badge_num", "name")
+    )
+
+    return {
+        "date": today.isoformat(),
+        "subdepartment": subdep.subdepartment if subdep else None,
+        "pros": [
+            {
+                "id": p["id"],
+                "name": p["pro_name"],
+                "sku": p["sku"],
+                "routings": _routings(p["sku"]),
+            }
+            for p in pros
+        ],
+        "operators": [
+            {"id": o["id"], "label": f"{o['badge_num']} - {o['name']}"}
+            for o in operators
+        ],
+    }
+
+
+class DeclarationQuickView(TeamAccessMixin, TemplateView):
+    """
+    One-page declaration: PRO -> routing -> operation -> qty -> operators
+    are picked client-side from the catalog and saved with one POST.
+    """
+    template_name = "teams/declaration_quick.html"
+
+
+class DeclarationCatalogView(TeamAccessMixin, View):
+    def get(self, request, *args, **kwargs):
+        return JsonResponse(_declaration_catalog(request.user))
+
+
+class DeclarationQuickSaveView(TeamAccessMixin, View):
+    """
+    Validate + persist one declaration from the one-page flow.
+    Returns {"ok": true, "id": ...} or {"ok": false, "errors": [...]} (400).
+    """
+
+    @staticmethod
+    def stored_id(team_user, client_key):
+        if not client_key:
+            return None
+        return (
+            Declaration.objects
+            .filter(teamuser=team_user, client_key=client_key)
+            .values_list("id", flat=True)
+            .first()
+        )
+
+    def post(self, request, *args, **kwargs):
+        client_key = (request.POST.get("client_key") or "").strip()[:64] or None
+
+        # resend of an already stored declaration (lost response) -> same answer
+        existing = self.stored_id(request.user, client_key)
+        if existing:
+            return JsonResponse({"ok": True, "id": existing, "message": "Declaration saved."})
+
+        validator = TeamDeclarationValidator(request.user)
+        data = request.POST.dict()
+        data["operators"] = request.POST.getlist("operators")
+        data.pop("decl_date", None)  # one-page declaration is always for today
+
+        errors, cleaned = validator.validate_declaration(data)
+        if errors:
+            return JsonResponse({"ok": False, "errors": errors}, status=400)
+
+        routing, routing_operation = validator.load_declaration_objects(cleaned)
+        try:
+            decl = create_team_declaration(
+                request.user, cleaned["pro"], routing, routing_operation, cleaned["qty"], cleaned["operator_ids"],
+                client_key=client_key,
+            )
+        except OverDeclarationError as e:
+            return JsonResponse({"ok": False, "errors": [str(e)]}, status=400)
+        except IntegrityError:
+            # concurrent resend with the same client_key stored it first -> same answer
+            existing = self.stored_id(request.user, client_key)
+            if existing is None:
+                raise
+            return JsonResponse({"ok": True, "id": existing, "message": "Declaration saved."})
+        return JsonResponse({"ok": True, "id": decl.id, "message": "Declaration saved."})
+
+
+class TeamIngestView(TeamAccessMixin, View):
+    """
+    Offline queue flush: JSON body
+      {"declarations": [{key, pro, routing, routing_operation, qty, operators, decl_date?}],
+       "downtimes":    [{key, operator, downtime, downtime_value | repetition, date?}]}
+    Idempotent per item key; returns per item status (created / duplicate / error)
+    and warnings (created over the PRO qty).
+    """
+    MAX_ITEMS = 500
+
+    def post(self, request, *args, **kwargs):
+        try:
+            payload = json.loads(request.body or b"{}")
+        except ValueError:
+            return JsonResponse({"ok": False, "errors": ["Invalid JSON."]}, status=400)
+        if not isinstance(payload, dict):
+            return JsonResponse({"ok": False, "errors": ["Invalid payload."]}, status=400)
+
+        declarations = payload.get("declarations") or []
+        downtimes = payload.get("downtimes") or []
+        if not isinstance(declarations, list) or not isinstance(downtimes, list):
+            return JsonResponse({"ok": False, "errors": ["Invalid payload."]}, status=400)
+        if len(declarations) + len(downtimes) > self.MAX_ITEMS:
+            return JsonResponse({"ok": False, "errors": [f"Max {self.MAX_ITEMS} items per request."]}, status=400)
+
+        results = ingest_team_batch(
+            request.user,
+            [d for d in declarations if isinstance(d, dict)],
+            [d for d in downtimes if isinstance(d, dict)],
+        )
+        return JsonResponse({"ok": True, "results": results})
+
+
 # ---------- DECLARE BREAK (INLINE FORMS) ----------
 
 class _BreakStep1Form(forms.Form):
@@ -1129,17 +1211,16 @@ class DeclareBreakSaveView(TeamAccessMixin, View):
         today = timezone.localdate()
         team_user = request.user
 
-        # PRAVILO 3:
-        # operator ima pauzu danas, ali za DRUGI team → ERROR
-        conflicts = OperatorBreak.objects.filter(
-            operator_id__in=wip["operators"],
-            date=today,
-        ).exclude(team_user=team_user)
+        # PRAVILO 1, 2 i 3 (core.operator_breaks):
+        # - nema pauze → CREATE
+        # - ima pauzu za isti team → OVERWRITE
+        # - ima pauzu danas, ali za DRUGI team → ERROR (nista se ne snima)
+        conflicts, created_count, updated_count = assign_breaks(
+            team_user.pk, today, wip["operators"], break_type.pk
+        )
 
-        if conflicts.exists():
-            ops = ", ".join(
-                str(ob.operator) for ob in conflicts.select_related("operator")
-            )
+        if conflicts:
+            ops = ", ".join(str(ob.operator) for ob in conflicts)
             messages.error(
                 request,
                 f"Break NOT saved. Operator(s) already have a break today for another team: {ops}"
@@ -1147,27 +1228,6 @@ class DeclareBreakSaveView(TeamAccessMixin, View):
             request.session.pop("break_wip", None)
             return redirect("teams:team_dashboard")
 
-        created_count = 0
-        updated_count = 0
-
-        # PRAVILO 1 i 2:
-        # - nema pauze → CREATE
-        # - ima pauzu za isti team → OVERWRITE
-        for op_id in wip["operators"]:
-            obj, created = OperatorBreak.objects.update_or_create(
-                date=today,
-                operator_id=op_id,
-                team_user=team_user,
-                defaults={
-                    "break_type": break_type,
-                }
-            )
-
-            if created:
-                created_count += 1
-            else:
-                updated_count += 1
-
         request.session.pop("break_wip", None)
 
         messages.success(